@@ -34,6 +34,11 @@ export async function getSounds() {
   return handleResponse(response);
 }
 
+export async function getSound(soundId) {
+  const response = await fetch(`${API_BASE_URL}/sounds/${soundId}`);
+  return handleResponse(response);
+}
+
 export async function updateSound(sound) {
   const token = getAuthToken();
   if (!token) {
@@ -68,7 +73,47 @@ export async function uploadSound(file, name) {
     },
     body: formData,
   });
-  return handleResponse(response);
+  const job = await handleResponse(response);
+  return waitForJob(job.job_id);
+}
+
+// Bulk import: audio files and/or zip/tar archives of audio files.
+// Resolves with { imported, failed, items } once every file has been processed.
+export async function importSounds(files) {
+  const token = getAuthToken();
+  if (!token) {
+    throw new Error('Authentication required');
+  }
+
+  const formData = new FormData();
+  for (const file of files) {
+    formData.append('file', file);
+  }
+
+  const response = await fetch(`${API_BASE_URL}/sounds/import`, {
+    method: 'POST',
+    headers: {
+      'Authorization': `Bearer ${token}`,
+    },
+    body: formData,
+  });
+  const job = await handleResponse(response);
+  return waitForJob(job.job_id, 1000);
+}
+
+// Poll a background job (e.g. an upload transcode) until it finishes
+export async function waitForJob(jobId, intervalMs = 500) {
+  while (true) {
+    const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+    const job = await handleResponse(response);
+    if (job.state === 'done') {
+      return job.result;
+    }
+    if (job.state === 'failed' || job.state === 'cancelled') {
+      throw new Error(job.detail || `Job ${job.state}`);
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
 }
 
 export async function uploadYouTubeSound(youtubeUrl, soundName) {
@@ -88,7 +133,8 @@ export async function uploadYouTubeSound(youtubeUrl, soundName) {
       sound_name: soundName,
     }),
   });
-  return handleResponse(response);
+  const job = await handleResponse(response);
+  return waitForJob(job.job_id);
 }
 
 export async function deleteSound(soundId) {
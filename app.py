@@ -1,26 +1,42 @@
 import os
-import json
 import uuid
-import io
-import subprocess
+import re
+import time
+import math
 import asyncio
-from typing import List, Optional
+import hashlib
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Literal, Optional
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Header, Request
+from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse, PlainTextResponse
+from starlette.concurrency import iterate_in_threadpool
 import sys
 
-# Discord imports
-import discord
-from discord.ext import commands
-from discord import FFmpegPCMAudio
-
 # Audio handling
-from pydub import AudioSegment
 from models import Sound, YouTubeBody
-from audioHandler import load_audio, trim_audio, apply_effects, play_audio
+from audioHandler import (
+    ClipStream, open_clip_stream, play_audio, ingest_audio, build_peaks, render_mp3_stream,
+)
+from renderCache import RenderCache
+import renderPool
+from renderPool import RenderPool, RenderError
+from renderScheduler import RenderScheduler
+from soundStore import SoundStore
+from contentStore import ContentStore, content_id
+from jobs import JobRegistry, FINISHED_STATES
+from uploads import receive_form
+import bulkImport
+from ingestQueue import IngestQueue
+from eventHub import EventHub
+import peaks
+from voiceAudio import SAMPLE_RATE, CHANNELS
+from bot import VoiceService, VoiceError
+from bus import BusClient, BusError
+import metrics
 
 # Load environment variables
 load_dotenv(os.path.join(os.getcwd(), ".env.local"))
@@ -36,7 +52,52 @@ ADMIN_PW = os.getenv("OPENHOWL_ADMIN_PASSWORD")
 USER_PW = os.getenv("OPENHOWL_USER_PASSWORD")
 DISCORD_BOT_TOKEN = os.getenv("DISCORD_BOT_TOKEN")
 
+# "all": API and Discord bot in this process, a single uvicorn worker (the default).
+# "api": a stateless API worker, any number of them next to the bot process (bot.py).
+# "bot": the bot process itself, set by bot.py.
+ROLE = os.getenv("OPENHOWL_ROLE", "all")
+BUS_SOCKET = os.getenv("OPENHOWL_BUS_SOCKET", "openhowl.sock")
+
+VOICE_IDLE_TIMEOUT = int(os.getenv("OPENHOWL_VOICE_IDLE_TIMEOUT", "900"))
+VOICE_PREWARM = os.getenv("OPENHOWL_VOICE_PREWARM", "1") == "1"
+# Play into this many simulated guilds instead of Discord (load tests, see fakeVoice.py)
+FAKE_VOICE_GUILDS = int(os.getenv("OPENHOWL_FAKE_VOICE_GUILDS", "0"))
+FAKE_VOICE_SPEED = float(os.getenv("OPENHOWL_FAKE_VOICE_SPEED", "1"))
+
+# Play request limits (see PlaybackScheduler). Repeats of a sound within the
+# debounce window are answered without playing it again; a rate of 0 disables that limit.
+PLAYBACK_LIMITS = {
+    "debounce": int(os.getenv("OPENHOWL_PLAY_DEBOUNCE_MS", "300")) / 1000,
+    "requester_rate": float(os.getenv("OPENHOWL_PLAY_RATE", "2")),
+    "requester_burst": int(os.getenv("OPENHOWL_PLAY_BURST", "5")),
+    "global_rate": float(os.getenv("OPENHOWL_PLAY_GLOBAL_RATE", "10")),
+    "global_burst": int(os.getenv("OPENHOWL_PLAY_GLOBAL_BURST", "20")),
+    "max_queue": int(os.getenv("OPENHOWL_PLAY_QUEUE_SIZE", "20")),
+}
+
 MAX_FILE_SIZE = int(os.getenv("OPENHOWL_MAX_FILE_SIZE_MB", "500")) * 1024 * 1024
+MAX_IMPORT_SIZE = int(os.getenv("OPENHOWL_MAX_IMPORT_SIZE_MB", "4096")) * 1024 * 1024
+INGEST_WORKERS = int(os.getenv("OPENHOWL_INGEST_WORKERS", "2"))
+TRANSCODE_WORKERS = int(os.getenv("OPENHOWL_TRANSCODE_WORKERS", str(os.cpu_count() or 1)))
+RENDER_CACHE_SIZE = int(os.getenv("OPENHOWL_RENDER_CACHE_MB", "256")) * 1024 * 1024
+# Processes rendering previews and voice PCM (separate from transcodes, so imports don't delay plays)
+RENDER_WORKERS = int(os.getenv("OPENHOWL_RENDER_WORKERS", str(os.cpu_count() or 1)))
+# Seconds after a sound's last edit to render it ahead of its next play (negative to disable),
+# and how many of the most played sounds to render or load into memory on startup
+PRERENDER_DELAY = float(os.getenv("OPENHOWL_PRERENDER_DELAY", "1"))
+PRERENDER_WARM = int(os.getenv("OPENHOWL_PRERENDER_WARM", "20"))
+# How often a request waiting for a render checks whether its client is still there
+DISCONNECT_POLL = 0.25
+# Keep a decoded PCM copy of new sounds so plays skip the mp3 decode (6x the disk space)
+CANONICAL_PCM = os.getenv("OPENHOWL_CANONICAL_PCM", "0") == "1"
+# Stream previews that aren't cached yet instead of rendering them fully first
+STREAM_PREVIEWS = os.getenv("OPENHOWL_STREAM_PREVIEWS", "1") == "1"
+# Add a Server-Timing header to every preview (otherwise only with ?timing=1)
+SERVER_TIMING = os.getenv("OPENHOWL_SERVER_TIMING", "0") == "1"
+# Seconds between garbage collection passes over the sounds folder (0 disables),
+# and how old an unreferenced or temp file must be before a pass removes it
+GC_INTERVAL = int(os.getenv("OPENHOWL_GC_INTERVAL", "3600"))
+GC_GRACE = int(os.getenv("OPENHOWL_GC_GRACE", "3600"))
 
 app = FastAPI()
 
@@ -49,10 +110,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-DATABASE_FILE = "sounds.json"
+DATABASE_FILE = "sounds.json"  # Legacy library, migrated into the store on first start
+STORE_FILE = os.getenv("OPENHOWL_DB_FILE", "sounds.db")
 SOUNDS_FOLDER = "sounds"
 os.makedirs(SOUNDS_FOLDER, exist_ok=True)
 
+def sound_changed(kind: str, data: dict, previous: Optional[dict] = None):
+    broadcast_event(data, event=f"sound.{kind}")
+    if kind == "deleted":
+        prerender.forget(data["id"])
+    elif previous is None or render_settings_changed(previous, data["sound"]):
+        prerender.touch(data["id"])
+
+# Sound library: in-memory index persisted to SQLite. Every change goes out
+# as a "sound.created" / "sound.updated" / "sound.deleted" SSE event, and new
+# settings are rendered ahead of the next play.
+store = SoundStore(STORE_FILE, legacy_json_path=DATABASE_FILE, on_change=sound_changed)
+SOUND_FIELDS = set(Sound.__fields__)
+
+# Waveform peak index for each audio file
+PEAKS_FOLDER = os.path.join(SOUNDS_FOLDER, ".peaks")
+os.makedirs(PEAKS_FOLDER, exist_ok=True)
+
+# Audio files are stored once per unique content and shared between sounds.
+# API workers can't see each other's in-flight imports, so they leave removing
+# files to the collector in the bot process.
+blobs = ContentStore(SOUNDS_FOLDER, PEAKS_FOLDER, store.references, GC_GRACE, remove_on_release=ROLE != "api")
+gc_task = None
+
+# Rendered audio cache (memory LRU + disk tier under sounds/.cache)
+render_cache = RenderCache(os.path.join(SOUNDS_FOLDER, ".cache"), RENDER_CACHE_SIZE)
+render_pool = RenderPool(RENDER_WORKERS)
+prerender = RenderScheduler(
+    lambda sound_id: prerender_sound(sound_id),
+    most_played=store.most_played,
+    record_plays=store.record_plays,
+    delay=PRERENDER_DELAY,
+    warm_count=PRERENDER_WARM,
+)
+
 # @app.get("/test-sse")
 # def test_sse(state: str = "playing", sound_id: str = "ebd8ffb5-4a20-4311-afd7-852dbc95c4fc"):
 #     broadcast_event({"sound_id": sound_id, "state": state})
@@ -64,275 +160,562 @@ def test_sse(state: str = "playing", sound_id: str = "test-sound"):
     return {"message": "Test SSE event broadcast"}
 
 
-# Discord bot setup
-description = "Discord Bot for OpenHowl Soundboard"
-intents = discord.Intents.default()
-intents.message_content = True
-
-bot = commands.Bot(command_prefix="/OpenHowl ", description=description, intents=intents)
-voice_clients = {}
-
-# Track the bot's instance
-bot_instance = None
-
-# Global list to store SSE client queues
-sse_clients: List[asyncio.Queue] = []
+# Fan-out hub for SSE clients, with replay and thread-safe publishing
+event_hub = EventHub(
+    max_pending=int(os.getenv("OPENHOWL_SSE_BUFFER", "256")),
+    replay_size=int(os.getenv("OPENHOWL_SSE_REPLAY", "1024")),
+)
 
-def broadcast_event(event_data: dict):
+def broadcast_event(event_data: dict, event: Optional[str] = None):
     """
-    Broadcast an event (as JSON string) to all connected SSE clients.
+    Broadcast an event to all connected SSE clients. Safe to call from any thread.
+    Named events (e.g. "job") are only seen by clients listening for that name.
+    With several workers the event goes through the bus, which numbers it and
+    hands it to every worker's clients (see receive_event).
     """
-    message = json.dumps(event_data)
-    for queue in sse_clients:
-        queue.put_nowait(message)
+    if bus is not None and bus.publish(event_data, event):
+        return
+    event_hub.publish(event_data, event)
+
+def receive_event(event_id: int, event: Optional[str], event_data: dict):
+    """An event relayed by the bus, published by this process or another one."""
+    if event and event.startswith("sound."):
+        # Another worker changed the library, load the change from the database
+        store.catch_up()
+    elif event == "job":
+        jobs.remember(event_data)
+    event_hub.publish(event_data, event, event_id)
+
+def receive_signal(op: str, args: dict):
+    if op == "cancel_job":
+        cancel_local_job(args["job_id"])
+
+# Discord voice lives in exactly one process. API workers reach it over the bus.
+if ROLE == "api":
+    voice = None
+    bus = BusClient(BUS_SOCKET, receive_event, receive_signal, on_connect=lambda: store.catch_up())
+else:
+    voice_pool = None
+    if FAKE_VOICE_GUILDS:
+        from fakeVoice import FakeVoicePool
+        voice_pool = FakeVoicePool(FAKE_VOICE_GUILDS, FAKE_VOICE_SPEED)
+    voice = VoiceService(
+        DISCORD_BOT_TOKEN,
+        find_sound=lambda sound_id: find_sound(sound_id),
+        render_pcm=lambda sound: render_sound_pcm(sound),
+        broadcast=broadcast_event,
+        idle_timeout=VOICE_IDLE_TIMEOUT,
+        prewarm=VOICE_PREWARM,
+        limits=PLAYBACK_LIMITS,
+        voice_pool=voice_pool,
+    )
+    bus = None  # the bot process sets its BusServer here
+
+# Background jobs (upload transcodes), progress is published over SSE
+jobs = JobRegistry(lambda job: broadcast_event(job, event="job"))
+
+# Worker processes for CPU-heavy transcoding, created on startup
+transcode_pool = None
+
+# Running bulk imports by job id, so they can be cancelled
+import_tasks = {}
+
+# YouTube imports run on a bounded queue of background workers
+ingest_queue = IngestQueue(jobs, lambda job: ingest_youtube(job), INGEST_WORKERS)
+YTDLP_PROGRESS = re.compile(r"\[download\]\s+([\d.]+)%")
+
+# Gauges and counters read from live state at scrape time
+metrics.Callback("openhowl_sse_clients", "Connected SSE clients", lambda: event_hub.client_count)
+metrics.Callback("openhowl_sse_evictions_total", "SSE clients dropped for falling behind",
+                 lambda: event_hub.evictions, kind="counter")
+metrics.Callback("openhowl_ingest_queue_depth", "YouTube imports waiting for a worker", lambda: ingest_queue.depth())
+metrics.Callback("openhowl_render_cache_lookups_total", "Render cache lookups by result",
+                 lambda: {"memory": render_cache.memory_hits, "disk": render_cache.disk_hits, "miss": render_cache.misses},
+                 kind="counter", labels=("result",))
+metrics.Callback("openhowl_render_cache_memory_bytes", "Bytes held in the in-memory render cache",
+                 lambda: render_cache.memory_bytes)
+metrics.Callback("openhowl_render_pool_renders_total", "Render requests by outcome: started in the pool, shared "
+                 "with one in progress, or dropped before starting because every requester left",
+                 lambda: {"started": render_pool.started, "coalesced": render_pool.coalesced,
+                          "cancelled": render_pool.cancelled},
+                 kind="counter", labels=("result",))
+metrics.Callback("openhowl_render_pool_in_flight", "Renders in progress", lambda: render_pool.in_flight)
+metrics.Callback("openhowl_prerender_total", "Speculative renders after edits: finished, or dropped for a newer edit",
+                 lambda: {"rendered": prerender.rendered, "superseded": prerender.superseded},
+                 kind="counter", labels=("result",))
+metrics.Callback("openhowl_prerender_pending", "Sounds waiting for a speculative render", lambda: prerender.pending)
+metrics.Callback("openhowl_sounds", "Sounds in the library", lambda: len(store))
+metrics.Callback("openhowl_audio_files", "Unique audio files referenced by the library",
+                 lambda: len(store.referenced_paths()))
+metrics.Callback("openhowl_audio_deduplicated_total", "Transcodes that matched audio already stored",
+                 lambda: blobs.deduplicated, kind="counter")
+metrics.Callback("openhowl_storage_reclaimed_bytes_total", "Bytes freed by removing unreferenced audio and temp files",
+                 lambda: blobs.reclaimed_bytes, kind="counter")
 
 # SSE Endpoint for real-time GUI updates
 @app.get("/events")
-async def events(request: Request):
+async def events(request: Request, last_event_id: Optional[str] = Header(None)):
     async def event_generator():
-        queue = asyncio.Queue()
-        sse_clients.append(queue)
+        client = event_hub.subscribe(last_event_id)
         try:
             while True:
                 # If client disconnects, break out of the loop.
                 if await request.is_disconnected():
                     break
-                try:
-                    event = await asyncio.wait_for(queue.get(), timeout=15.0)
-                    yield f"data: {event}\n\n"
-                except asyncio.TimeoutError:
+                frames = await client.next_frames(timeout=15.0)
+                if client.evicted:
+                    # Too slow to keep up, the browser will reconnect and replay
+                    break
+                if frames:
+                    yield "".join(frames)
+                else:
                     # Send a comment to keep the connection alive
                     yield ":\n\n"
         finally:
-            sse_clients.remove(queue)
+            event_hub.unsubscribe(client)
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
-# Function to initialize the discord bot in a non-blocking way
-async def init_discord_bot():
-    global bot_instance
-    bot_instance = bot
-    
-    @bot.event
-    async def on_ready():
-        print(f'Logged in as {bot.user.name}')
-        print(f'Bot ID: {bot.user.id}')
-    
-    @bot.command()
-    async def join(ctx):
-        """ Join the user's voice channel """
-        if ctx.author.voice is None or ctx.author.voice.channel is None:
-            await ctx.send("You must be in a voice channel for me to join!")
-            return
-
-        channel = ctx.author.voice.channel
-        if ctx.guild.id in voice_clients and voice_clients[ctx.guild.id].is_connected():
-            await voice_clients[ctx.guild.id].move_to(channel)
-        else:
-            voice_clients[ctx.guild.id] = await channel.connect()
-
-        await ctx.send(f"Joined {channel.name}!")
-    
-    @bot.command()
-    async def leave(ctx):
-        """ Leave the voice channel """
-        if ctx.guild.id in voice_clients and voice_clients[ctx.guild.id].is_connected():
-            await voice_clients[ctx.guild.id].disconnect()
-            del voice_clients[ctx.guild.id]
-            await ctx.send("Disconnected from voice channel.")
-        else:
-            await ctx.send("I'm not connected to any voice channel!")
-    
-    @bot.command()
-    async def play(ctx, sound_id: str):
-        """ Play a sound from the API in Discord Voice Chat """
-        if ctx.guild.id not in voice_clients or not voice_clients[ctx.guild.id].is_connected():
-            await join(ctx)  # Ensure bot is in voice channel
-
-        vc = voice_clients[ctx.guild.id]
-        sound_url = f"http://127.0.0.1:8000/sounds/preview/{sound_id}"  # API URL for sound
-
-        # Use FFmpeg to stream the sound
-        ffmpeg_options = {
-            "options": "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
-        }
-        audio_source = FFmpegPCMAudio(sound_url, **ffmpeg_options)
-
-        if not vc.is_playing():
-            vc.play(audio_source)
-            await ctx.send(f"Playing sound `{sound_id}`")
-        else:
-            # Play sound in parallel by spawning a separate FFmpeg process
-            process = subprocess.Popen(
-                ["ffmpeg", "-i", sound_url, "-f", "wav", "pipe:1"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.DEVNULL
-            )
-            audio_source_parallel = discord.PCMVolumeTransformer(discord.FFmpegPCMAudio(process.stdout))
-
-            def after_playing(err):
-                if err:
-                    print(f"Error in playback: {err}")
-                process.stdout.close()
-                process.wait()
-
-            vc.play(audio_source_parallel, after=after_playing)
-            await ctx.send(f"Queued sound `{sound_id}` for parallel playback.")
-
-    # Start the bot
-    asyncio.create_task(bot.start(DISCORD_BOT_TOKEN))
-
 # Database functions
-def load_sounds_for_preview():
-    """Load all Sound entries from the JSON database as dictionaries."""
-    try:
-        with open(DATABASE_FILE, "r") as f:
-            content = f.read().strip()
-            if not content:
-                return []
-            return json.loads(content)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
-
-def load_sounds() -> List[Sound]:
-    """Load all Sound entries from the JSON database."""
-    try:
-        with open(DATABASE_FILE, "r") as f:
-            content = f.read().strip()
-            if not content:
-                return []
-            data = json.loads(content)
-            return [Sound(**sound) for sound in data]
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
-
-
-def save_sounds(sounds: List[Sound]):
-    """Save the list of Sound objects to sounds.json."""
-    with open(DATABASE_FILE, "w") as f:
-        json.dump([sound.dict() for sound in sounds], f, indent=2)
-
-# Helper function to find a guild with connected voice client
-async def get_first_connected_voice_client():
-    for guild_id, voice_client in voice_clients.items():
-        if voice_client.is_connected():
-            return guild_id, voice_client
-    return None, None
+def find_sound(sound_id: str) -> Optional[dict]:
+    """Find a single sound entry by id."""
+    with metrics.stage("store"):
+        sound = store.get(sound_id)
+        return sound.dict() if sound else None
 
 # FastAPI endpoints
 @app.on_event("startup")
 async def startup_event():
-    if DISCORD_BOT_TOKEN:
-        asyncio.create_task(init_discord_bot())
+    global transcode_pool
+    event_hub.attach(asyncio.get_running_loop())
+    transcode_pool = ProcessPoolExecutor(max_workers=TRANSCODE_WORKERS)
+    ingest_queue.start()
+    prerender.start()
+    if bus is not None:
+        bus.start()
+    if voice is not None:
+        await start_background()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ingest_queue.stop()
+    await prerender.stop()
+    if bus is not None:
+        await bus.stop()
+    if voice is not None:
+        await stop_background()
+    if transcode_pool:
+        transcode_pool.shutdown(cancel_futures=True)
+    render_pool.shutdown()
+
+async def start_background():
+    """Work that runs in exactly one process (the only worker, or bot.py): the bot and garbage collection."""
+    global gc_task
+    if GC_INTERVAL > 0:
+        gc_task = asyncio.create_task(gc_loop())
+    if DISCORD_BOT_TOKEN or voice.simulated:
+        voice.start()
     else:
         print("WARNING: DISCORD_BOT_TOKEN missing, Discord bot will not start")
 
-# Modified endpoint to play the sound via Discord with SSE broadcast
-@app.post("/discord/play/{sound_id}")
-async def discord_play(sound_id: str):
-    if not bot_instance:
-        raise HTTPException(status_code=503, detail="Discord bot not ready")
-
-   
-    guild_id, voice_client = await get_first_connected_voice_client()
-    if not guild_id or not voice_client:
-        for guild in bot_instance.guilds:
-            for channel in guild.voice_channels:
-                if any(not m.bot for m in channel.members):
-                    voice_client = await channel.connect()
-                    voice_clients[guild.id] = voice_client
-                    break
-            if voice_client:
-                break
-        if not voice_client:
-            raise HTTPException(status_code=400,
-                                detail="No voice channel to join")
+async def stop_background():
+    if gc_task:
+        gc_task.cancel()
+    await voice.stop()
 
-   
-    if voice_client.is_playing():
-        voice_client.stop()          
+def voice_error(e) -> HTTPException:
+    """The HTTP answer for a VoiceError or BusError."""
+    headers = {"Retry-After": str(math.ceil(e.retry_after))} if getattr(e, "retry_after", None) else None
+    return HTTPException(status_code=e.status, detail=e.message, headers=headers)
 
+def requester_id(request: Request, authorization: Optional[str]) -> str:
+    """Who a play request is rate limited as: its client address and (a digest of) its token."""
+    token = hashlib.sha256(authorization.encode()).hexdigest()[:12] if authorization else "anonymous"
+    return f"{token}@{request.client.host if request.client else 'unknown'}"
 
-    sound_url = f"http://127.0.0.1:8000/sounds/preview/{sound_id}"
-    ffmpeg_opts = {
-        "options": "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
-    }
-    audio_source = FFmpegPCMAudio(sound_url, **ffmpeg_opts)
+# Modified endpoint to play the sound via Discord with SSE broadcast
+@app.post("/discord/play/{sound_id}")
+async def discord_play(
+    sound_id: str,
+    request: Request,
+    guild_id: Optional[int] = None,
+    channel_id: Optional[int] = None,
+    mode: Literal["mix", "queue", "preempt"] = "mix",
+    priority: int = 0,
+    authorization: Optional[str] = Header(None),
+):
+    """
+    Play a sound in Discord. Pass guild_id (and optionally channel_id) to target a
+    specific server; otherwise any live connection is used. `mode` "mix" plays over
+    whatever is playing, "queue" waits for the guild to go quiet, and "preempt"
+    stops what is playing unless it has a higher `priority`. Repeated clicks are
+    debounced and plays are rate limited (429 with Retry-After).
+    """
+    requested_at = time.perf_counter()
+    sound = find_sound(sound_id)
+    if not sound:
+        raise HTTPException(status_code=404, detail="Sound not found")
+    requester = requester_id(request, authorization)
 
-    def after_playback(error=None, sid=sound_id):
-        if error:
-            print(f"Playback error for {sid}: {error}")
-        broadcast_event({"sound_id": sid, "state": "stopped"})
+    try:
+        if voice is not None:
+            result = await voice.play(sound, guild_id, channel_id, requested_at, requester, mode, priority)
+        else:
+            # The bot process renders (or reads the cached render) once its scheduler takes the play
+            result = await bus.call("play", {
+                "sound": sound, "guild_id": guild_id, "channel_id": channel_id,
+                "requested_wall": time.time() - (time.perf_counter() - requested_at),
+                "requester": requester, "mode": mode, "priority": priority,
+            })
+    except (VoiceError, BusError) as e:
+        raise voice_error(e)
+    except RenderError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not result.get("debounced"):
+        prerender.played(sound_id)
+    return result
 
-    voice_client.play(audio_source, after=after_playback)
+# Modified endpoint to stop playback via Discord with SSE broadcast
+@app.post("/discord/stop")
+async def discord_stop(voice_id: Optional[int] = None, guild_id: Optional[int] = None):
+    """Stop one voice (voice_id), everything in one guild (guild_id, also emptying its queue), or everything."""
+    try:
+        if voice is not None:
+            return voice.stop_playback(voice_id, guild_id)
+        return await bus.call("stop", {"voice_id": voice_id, "guild_id": guild_id})
+    except (VoiceError, BusError) as e:
+        raise voice_error(e)
+
+@app.get("/discord/queue")
+async def discord_queue(guild_id: Optional[int] = None):
+    """What is playing and queued in each guild. Changes are also sent as "queue" SSE events."""
+    try:
+        if voice is not None:
+            return voice.queue(guild_id)
+        return await bus.call("queue", {"guild_id": guild_id})
+    except BusError as e:
+        raise voice_error(e)
+
+@app.delete("/discord/queue/{entry_id}")
+async def discord_dequeue(entry_id: int):
+    """Drop a queued play request before it starts."""
+    try:
+        if voice is not None:
+            return voice.dequeue(entry_id)
+        return await bus.call("dequeue", {"entry_id": entry_id})
+    except (VoiceError, BusError) as e:
+        raise voice_error(e)
+
+def open_sound_clip(sound: dict) -> ClipStream:
+    """Start reading the trimmed part of a sound's audio, a block at a time."""
+    try:
+        return open_clip_stream(sound["file_path"], sound.get("trim_start", 0),
+                                sound.get("trim_end", sound.get("length", 0)))
+    except Exception as e:
+        print(f"Error loading audio: {e}")
+        raise HTTPException(status_code=500, detail="Error loading audio")
 
-    # GUI feedback
-    broadcast_event({"sound_id": sound_id, "state": "playing"})
-    return {"message": f"Playing sound {sound_id}"}
+def stream_and_cache(sound: dict, key: str, clip: ClipStream, finish):
+    """
+    Yield a progressive mp3 render, caching it once the whole clip has been sent.
+    `finish` (from render_pool.begin_stream) hands the result to requests that
+    waited for this one, or None if the client went away first.
+    """
+    chunks = []
+    data = None
+    stream = render_mp3_stream(clip, sound.get("effects", {}), sound.get("volume", 100))
+    try:
+        start = time.perf_counter()
+        for chunk in stream:
+            if not chunks:
+                metrics.record("first_chunk", time.perf_counter() - start)
+            chunks.append(chunk)
+            yield chunk
+        metrics.record("stream_mp3", time.perf_counter() - start)
+        data = b"".join(chunks)
+        render_cache.put(content_id(sound["file_path"]), key, data)
+    finally:
+        stream.close()
+        clip.close()
+        finish(data)
+
+async def release_on_exit(stream, finish):
+    """
+    Iterate a streamed render in the threadpool. A client disconnect cancels this
+    right away, while the sync stream is only closed once it is garbage collected,
+    so release the requests waiting on it here (a no-op if it already finished).
+    """
+    try:
+        async for chunk in iterate_in_threadpool(stream):
+            yield chunk
+    finally:
+        finish(None)
 
+async def render_sound(sound: dict, key: str) -> bytes:
+    """
+    Render a sound as 128k mono 48kHz mp3 in the render pool and cache it by its
+    settings. Callers check the cache first; a render finishing meanwhile is still
+    in flight until it is cached, so it is shared rather than repeated.
+    """
+    content = content_id(sound["file_path"])
+    # Same encoder as the streamed previews, so cached bytes match what was streamed
+    with metrics.stage("render_pool"):
+        return await render_pool.render(
+            key, renderPool.render_mp3, sound, store=lambda result: render_cache.put(content, key, result)
+        )
 
+async def render_sound_pcm(sound: dict) -> bytes:
+    """
+    Render a sound as raw 16-bit stereo 48kHz PCM, the format Discord voice consumes.
+    Cached alongside the mp3 render.
+    """
+    key = render_cache.make_key(sound, fmt="pcm")
+    data = await asyncio.to_thread(render_cache.get, content_id(sound["file_path"]), key)
+    if data is not None:
+        return data
+    return await render_voice_pcm(sound, key)
+
+async def render_voice_pcm(sound: dict, key: str) -> bytes:
+    """The render pool half of render_sound_pcm."""
+    content = content_id(sound["file_path"])
+    with metrics.stage("render_pool"):
+        return await render_pool.render(
+            key, renderPool.render_pcm, sound, SAMPLE_RATE, CHANNELS,
+            store=lambda result: render_cache.put(content, key, result),
+        )
 
-# Modified endpoint to stop playback via Discord with SSE broadcast
-@app.post("/discord/stop")
-async def discord_stop():
-    if not bot_instance:
-        raise HTTPException(status_code=503, detail="Discord bot is not initialized")
-    
-    stopped = False
-    for guild_id, voice_client in voice_clients.items():
-        if voice_client.is_playing():
-            voice_client.stop()
-            stopped = True
-    if stopped:
-        broadcast_event({"state": "stopped"})
-        return {"message": "Stopped all Discord audio playback"}
-    else:
-        return {"message": "No active playback to stop"}
+async def prerender_sound(sound_id: str):
+    """
+    Make sure a sound's current settings are rendered and in memory: the mp3
+    preview and, when there is a bot, the voice PCM.
+    """
+    sound = find_sound(sound_id)
+    if not sound or not sound.get("file_path"):
+        return
+    content = content_id(sound["file_path"])
+    key = render_cache.make_key(sound)
+    if not await asyncio.to_thread(render_cache.load, content, key):
+        await render_sound(sound, key)
+    if DISCORD_BOT_TOKEN or FAKE_VOICE_GUILDS:
+        key = render_cache.make_key(sound, fmt="pcm")
+        if not await asyncio.to_thread(render_cache.load, content, key):
+            await render_voice_pcm(sound, key)
+
+async def unless_disconnected(request: Request, render):
+    """
+    Await a render, polling the client like /events does. If it disconnects first,
+    stop waiting, so a render nobody else wants is dropped before it starts.
+    """
+    task = asyncio.ensure_future(render)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL)
+        if done:
+            return task.result()
+        if await request.is_disconnected():
+            task.cancel()
+            return None
+
+def parse_range(range_header: str, size: int):
+    """
+    Parse a single "bytes=start-end" Range header into an inclusive (start, end).
+    Returns None for anything we don't serve partially (multiple ranges, other units),
+    raises 416 when the range lies outside the content.
+    """
+    units, _, spec = range_header.partition("=")
+    if units.strip() != "bytes" or "," in spec:
+        return None
+    start_s, _, end_s = spec.strip().partition("-")
+    try:
+        if start_s:
+            start = int(start_s)
+            end = int(end_s) if end_s else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(size - int(end_s), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
 
 @app.get("/sounds/preview/{sound_id}")
-def preview_sound(sound_id: str):
-    """ Generate processed audio and stream it to the browser. """
-    sounds = load_sounds_for_preview()
-    sound = next((s for s in sounds if s["id"] == sound_id), None)
-    
+async def preview_sound(sound_id: str, request: Request, timing: bool = False):
+    """
+    Serve the processed audio to the browser.
+    The ETag is derived from the sound's render settings, so unchanged sounds
+    revalidate with a 304 and Range requests let the trim editor seek.
+    With ?timing=1 the response carries a Server-Timing header with the render stages,
+    only those before the first byte for a streamed render (the rest go to /metrics).
+    """
+    if timing or SERVER_TIMING:
+        metrics.start_server_timing()
+    sound = find_sound(sound_id)
     if not sound:
         raise HTTPException(status_code=404, detail="Sound not found")
-    
-    file_path = sound["file_path"]
-    trim_start = sound.get("trim_start", 0)
-    trim_end = sound.get("trim_end", sound.get("length", 0))
-    effects = sound.get("effects", {})
-    volume = sound.get("volume", 100)  # Default to 100% volume
-
-    # Load and process the audio
-    audio = load_audio(file_path)
-    if audio is None:
-        raise HTTPException(status_code=500, detail="Error loading audio")
-    
-    audio = trim_audio(audio, trim_start, trim_end)
-    audio = apply_effects(audio, effects, volume)  # Apply effects + volume
-    
-    # Standardize format for streaming - mono, 48kHz
-    audio = audio.set_channels(1).set_frame_rate(48000)
 
-    # Export to in-memory file with consistent bitrate (128k)
-    buffer = io.BytesIO()
-    audio.export(buffer, format="mp3", bitrate="128k")
-    buffer.seek(0)  # Reset buffer position
+    key = render_cache.make_key(sound)
+    etag = f'"{key}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",  # always revalidate, the URL stays the same across edits
+        "Accept-Ranges": "bytes",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
 
-    return StreamingResponse(buffer, media_type="audio/mpeg")
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
 
-@app.get("/sounds", response_model=List[Sound])
-def get_sounds():
-    return load_sounds()
+    data = await asyncio.to_thread(render_cache.get, content_id(sound["file_path"]), key)
+    if data is None and STREAM_PREVIEWS and not range_header and not render_pool.busy(key):
+        # Not rendered yet: start sending mp3 while the rest of the clip is still
+        # being processed. Decode errors still surface as a 500 before the first byte.
+        finish = render_pool.begin_stream(key)
+        try:
+            clip = await asyncio.to_thread(open_sound_clip, sound)
+        except Exception:
+            finish(None)
+            raise
+        if timing or SERVER_TIMING:
+            headers["Server-Timing"] = metrics.server_timing_header()
+        body = release_on_exit(stream_and_cache(sound, key, clip, finish), finish)
+        # A generator that never started doesn't run its finally, release the waiters and decoder anyway
+        weakref.finalize(body, finish, None)
+        weakref.finalize(body, clip.close)
+        return StreamingResponse(body, headers=headers, media_type="audio/mpeg")
+    if data is None:
+        # Shares the render with any other request for the same sound and settings
+        try:
+            data = await unless_disconnected(request, render_sound(sound, key))
+        except RenderError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        if data is None:
+            return Response(status_code=499)  # client closed the request
+    if timing or SERVER_TIMING:
+        headers["Server-Timing"] = metrics.server_timing_header()
+
+    if range_header and (not if_range or if_range == etag):
+        byte_range = parse_range(range_header, len(data))
+        if byte_range:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            return Response(data[start:end + 1], status_code=206, headers=headers, media_type="audio/mpeg")
+
+    return Response(data, headers=headers, media_type="audio/mpeg")
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint. With several workers, each one reports its own."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/bot")
+async def get_bot_metrics():
+    """Metrics of the bot process (voice connections, playback latency) when it runs separately."""
+    if voice is not None:
+        raise HTTPException(status_code=404, detail="The bot runs in this process, see /metrics")
+    try:
+        result = await bus.call("metrics", {})
+    except BusError as e:
+        raise HTTPException(status_code=e.status, detail=e.message)
+    return PlainTextResponse(result["text"], media_type="text/plain; version=0.0.4")
+
+@app.get("/sounds/{sound_id}/peaks")
+def get_peaks(sound_id: str, zoom: int = 0, start: int = 0, end: Optional[int] = None):
+    """
+    Waveform min/max peaks for the trim editor.
+    `zoom` picks a level (0 is finest, each level is 4x coarser) and `start`/`end`
+    limit the range in milliseconds. The body is a 16-byte little-endian header
+    (sample rate, samples per peak, first peak index, peak count) followed by
+    int8 min/max pairs. Sounds imported before peaks existed are indexed on first request.
+    """
+    sound = find_sound(sound_id)
+    if not sound:
+        raise HTTPException(status_code=404, detail="Sound not found")
+
+    path = blobs.peaks_path(sound["file_path"])
+    for attempt in range(2):
+        if not os.path.exists(path):
+            try:
+                build_peaks(sound["file_path"], path)
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Error building peaks: {str(e)}")
+        try:
+            data = peaks.read_slice(path, zoom, start, end)
+            break
+        except ValueError as e:
+            # Corrupt or truncated (e.g. written by a crashed build): remove it and build it again once
+            print(f"Removing unreadable peaks: {e}")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    else:
+        raise HTTPException(status_code=500, detail="Error building peaks: the peaks file is unreadable")
+    return Response(data, media_type="application/octet-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/sounds")
+def get_sounds(
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[int] = None,
+    fields: Optional[str] = None,
+    since: Optional[int] = None,
+):
+    """
+    Without parameters, the whole library as a list.
+    With limit/cursor, one page in library order: pass next_cursor back to get the next.
+    With since=<revision>, only sounds changed after that revision plus the ids
+    deleted since (410 if that is too far back; refetch everything instead).
+    fields=id,name,... limits each sound to those fields.
+    The library revision is in the X-Library-Revision header and in paged/delta bodies;
+    sound.* events on /events carry the revision of each later change.
+    """
+    if limit is None and cursor is None and fields is None and since is None:
+        revision, body = store.all_json()
+        return Response(body, media_type="application/json", headers={"X-Library-Revision": str(revision)})
+
+    include = None
+    if fields:
+        include = {f.strip() for f in fields.split(",") if f.strip()} | {"id"}
+        unknown = include - SOUND_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    if since is not None:
+        changes = store.changes_since(since)
+        if changes is None:
+            raise HTTPException(status_code=410, detail="Revision too old, refetch the library")
+        revision, sounds, deleted = changes
+        body = {"revision": revision, "sounds": [s.dict(include=include) for s in sounds], "deleted": deleted}
+    else:
+        limit = min(max(limit or 100, 1), 1000)
+        revision, sounds, next_cursor = store.page(cursor, limit)
+        body = {"revision": revision, "sounds": [s.dict(include=include) for s in sounds], "next_cursor": next_cursor}
+    response.headers["X-Library-Revision"] = str(revision)
+    return body
+
+@app.get("/sounds/{sound_id}", response_model=Sound)
+def get_sound(sound_id: str):
+    sound = store.get(sound_id)
+    if not sound:
+        raise HTTPException(status_code=404, detail="Sound not found")
+    return sound
 
 @app.post("/sounds", response_model=Sound)
 def create_sound(sound: Sound):
-    sounds = load_sounds()
     sound.id = str(uuid.uuid4())
     if sound.trim_end == 0:
         sound.trim_end = sound.length
-    sounds.append(sound)
-    save_sounds(sounds)
+    store.add(sound)
     return sound
 
 @app.put("/sounds/{sound_id}", response_model=Sound)
@@ -345,16 +728,18 @@ def update_sound(
     if authorization not in [f"Bearer {ADMIN_TOKEN}", f"Bearer {USER_TOKEN}"]:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    sounds = load_sounds()
-    for idx, existing_sound in enumerate(sounds):
-        if existing_sound.id == sound_id:
-            # ensure ID doesn't change
-            updated_sound.id = sound_id
-            sounds[idx] = updated_sound
-            save_sounds(sounds)
-            return updated_sound
+    # ensure ID doesn't change
+    updated_sound.id = sound_id
+    previous = store.get(sound_id)
+    if not previous or not store.update(updated_sound):
+        raise HTTPException(status_code=404, detail="Sound not found")
 
-    raise HTTPException(status_code=404, detail="Sound not found")
+    # Most edits (e.g. the playing toggle) leave the audio and its renders alone
+    if updated_sound.file_path != previous.file_path:
+        release_content(previous.file_path)
+    elif render_settings_changed(previous.dict(), updated_sound.dict()):
+        drop_stale_renders(previous.file_path)
+    return updated_sound
 
 @app.delete("/sounds/{sound_id}")
 def delete_sound(
@@ -364,65 +749,143 @@ def delete_sound(
     if authorization not in [f"Bearer {ADMIN_TOKEN}", f"Bearer {USER_TOKEN}"]:
         raise HTTPException(status_code=401, detail="Unauthorized")
         
-    sounds = load_sounds()
-    # Find the sound to delete using attribute access
-    sound_to_delete = next((s for s in sounds if s.id == sound_id), None)
+    # Remove the sound from the library
+    sound_to_delete = store.delete(sound_id)
     if not sound_to_delete:
         raise HTTPException(status_code=404, detail="Sound not found")
-    
-    # Attempt to remove the sound file from disk
-    file_path = sound_to_delete.file_path
-    if file_path and os.path.exists(file_path):
-        try:
-            os.remove(file_path)
-        except Exception as e:
-            print(f"Error deleting file {file_path}: {e}")
 
-    # Remove the sound from the JSON database
-    new_sounds = [s for s in sounds if s.id != sound_id]
-    save_sounds(new_sounds)
+    # Remove its audio from disk unless another sound shares it
+    release_content(sound_to_delete.file_path)
     return {"detail": "Sound deleted"}
 
-@app.post("/sounds/upload", response_model=Sound)
+def render_keys(sounds: List[Sound]) -> set:
+    """Cache keys of every render the given sounds can currently produce."""
+    return {render_cache.make_key(s.dict(), fmt) for s in sounds for fmt in ("mp3", "pcm")}
+
+def render_settings_changed(old: dict, new: dict) -> bool:
+    """Whether two versions of a sound render differently (trim, effects, volume or audio)."""
+    return render_cache.make_key(old) != render_cache.make_key(new)
+
+def drop_stale_renders(file_path: str):
+    """Remove the cached renders of file_path that none of the sounds using it can produce any more."""
+    render_cache.retain(render_keys(store.referencing(file_path)), content_id(file_path))
+
+def release_content(file_path: str):
+    """
+    Called when a sound stops using file_path (deleted or moved to other audio).
+    Removes the file and everything derived from it once no sound uses it,
+    otherwise just the cached renders none of the remaining sounds can produce.
+    """
+    if not file_path:
+        return
+    if blobs.release(file_path):
+        render_cache.invalidate(content_id(file_path))
+    else:
+        drop_stale_renders(file_path)
+
+def staging_paths(staging: str):
+    """Where a transcode writes its mp3, peaks and canonical PCM before they are placed in storage."""
+    return f"{staging}.mp3", f"{staging}.peaks", f"{staging}.pcm" if CANONICAL_PCM else None
+
+def remove_staging(staging: str):
+    for path in staging_paths(staging):
+        if path and os.path.exists(path):
+            os.remove(path)
+
+def place_transcoded(digest: str, staging: str) -> str:
+    """
+    Move a finished transcode into content storage and return its file_path.
+    The file is pinned: unpin it once its sound is in the library.
+    """
+    try:
+        return blobs.place(digest, *staging_paths(staging))
+    finally:
+        remove_staging(staging)
+
+@app.post("/sounds/upload", status_code=202)
 async def upload_sound(
-    file: UploadFile = File(...),
-    name: str = Form(...),
+    request: Request,
     authorization: Optional[str] = Header(None)
 ):
+    """
+    Stream an upload to disk and transcode it in the background.
+    Returns a job handle; progress and the finished Sound arrive as "job" SSE events
+    and from GET /jobs/{job_id}.
+    """
     # Admin check
     if authorization != f"Bearer {ADMIN_TOKEN}":
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    # Generate unique ID
-    sound_id = str(uuid.uuid4())
-    original_filename = file.filename
-    _, ext = os.path.splitext(original_filename)
-    
-    # Always save as mp3 with consistent settings
-    file_path = os.path.join(SOUNDS_FOLDER, f"{sound_id}.mp3")
-
-    file_contents = await file.read()
-    if len(file_contents) > MAX_FILE_SIZE:
+    # Reject obviously oversized uploads before reading a byte (allow some form overhead)
+    content_length = int(request.headers.get("content-length", 0) or 0)
+    if content_length > MAX_FILE_SIZE + 1024 * 1024:
         raise HTTPException(status_code=413, detail="File too large")
 
-    # Save the temporary file
-    temp_path = os.path.join(SOUNDS_FOLDER, f"temp_{sound_id}{ext}")
-    with open(temp_path, "wb") as f:
-        f.write(file_contents)
+    # Generate unique ID
+    sound_id = str(uuid.uuid4())
+    job = jobs.create("upload", sound_id=sound_id)
 
     try:
-        # Convert to standardized mp3 format
-        audio = AudioSegment.from_file(temp_path)
-        audio = audio.set_channels(1).set_frame_rate(48000)
-        audio.export(file_path, format="mp3", bitrate="128k")
-        length_ms = len(audio)
-        os.remove(temp_path)
+        form = await receive_form(
+            request, SOUNDS_FOLDER, f"temp_{sound_id}", MAX_FILE_SIZE,
+            on_progress=lambda fraction: jobs.update(job, state="uploading", progress=fraction * 0.5),
+        )
+    except HTTPException as e:
+        jobs.update(job, state="failed", detail=e.detail)
+        raise
+
+    upload = next((f for f in form.files if f.field == "file"), None)
+    if upload is None:
+        form.cleanup()
+        jobs.update(job, state="failed", detail="No file uploaded")
+        raise HTTPException(status_code=400, detail="No file uploaded")
+
+    name = form.fields.get("name", "").strip() or "Untitled"
+    asyncio.create_task(transcode_upload(job, upload.path, name, sound_id))
+    return job.to_dict()
+
+async def gc_loop():
+    """Periodically reclaim unreferenced audio, stale renders and leftover temp files."""
+    while True:
+        await asyncio.sleep(GC_INTERVAL)
+        try:
+            await asyncio.to_thread(collect_garbage)
+        except Exception as e:
+            print(f"Garbage collection failed: {e}")
+
+def collect_garbage() -> dict:
+    """One pass over the sounds folder and render cache. Returns the number of files removed by kind."""
+    store.catch_up()
+    removed = blobs.collect(store.referenced_paths)
+    removed["renders"] = render_cache.retain(render_keys(store.all()))
+    if any(removed.values()):
+        print(f"Garbage collection removed {removed}")
+    return removed
+
+async def transcode_upload(job, temp_path: str, name: str, sound_id: str):
+    """Convert an uploaded file to the library format in the worker pool and add it."""
+    jobs.update(job, state="transcoding", progress=0.5)
+
+    # Always save as mp3 with consistent settings, stored by content
+    staging = os.path.join(SOUNDS_FOLDER, f"temp_{sound_id}.out")
+    loop = asyncio.get_running_loop()
+    try:
+        mp3_path, peaks_file, pcm_file = staging_paths(staging)
+        length_ms, digest = await loop.run_in_executor(
+            transcode_pool, ingest_audio, temp_path, mp3_path, None, peaks_file, pcm_file
+        )
+        file_path = place_transcoded(digest, staging)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing audio: {str(e)}")
+        jobs.update(job, state="failed", detail=f"Error processing audio: {str(e)}")
+        return
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        remove_staging(staging)
 
     new_sound = Sound(
         id=sound_id,
-        name=name.strip() if name else "Untitled",
+        name=name,
         length=length_ms,
         volume=80,
         playing=False,
@@ -432,11 +895,186 @@ async def upload_sound(
         file_format="mp3"
     )
 
-    sounds = load_sounds()
-    sounds.append(new_sound)
-    save_sounds(sounds)
+    try:
+        store.add(new_sound)
+    except Exception as e:
+        jobs.update(job, state="failed", detail=f"Error saving sound: {e}")
+        return
+    finally:
+        # A file that didn't make it into the library is removed unless something else uses it
+        blobs.unpin(file_path)
+        if not store.references(file_path):
+            release_content(file_path)
+    jobs.update(job, state="done", progress=1.0, result=new_sound.dict())
+
+@app.post("/sounds/import", status_code=202)
+async def import_sounds(
+    request: Request,
+    authorization: Optional[str] = Header(None)
+):
+    """
+    Bulk import. Send any number of "file" parts, each an audio file or a zip/tar
+    of audio files. Returns a job handle; the finished job's result lists what
+    happened to every file.
+    """
+    if authorization != f"Bearer {ADMIN_TOKEN}":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    content_length = int(request.headers.get("content-length", 0) or 0)
+    if content_length > MAX_IMPORT_SIZE + 1024 * 1024:
+        raise HTTPException(status_code=413, detail="Import too large")
+
+    temp_prefix = f"temp_import_{uuid.uuid4()}"
+    job = jobs.create("import")
+    try:
+        form = await receive_form(
+            request, SOUNDS_FOLDER, temp_prefix, MAX_IMPORT_SIZE,
+            on_progress=lambda fraction: jobs.update(job, state="uploading", progress=fraction * 0.2),
+        )
+    except HTTPException as e:
+        jobs.update(job, state="failed", detail=e.detail)
+        raise
+
+    if not form.files:
+        jobs.update(job, state="failed", detail="No files uploaded")
+        raise HTTPException(status_code=400, detail="No files uploaded")
+
+    task = asyncio.create_task(run_import(job, form, temp_prefix))
+    import_tasks[job.id] = task
+    task.add_done_callback(lambda _: import_tasks.pop(job.id, None))
+    return job.to_dict()
 
-    return new_sound
+async def run_import(job, form, temp_prefix: str):
+    """
+    Transcode every entry of a bulk import on the worker pool, as soon as it is
+    extracted, then add all new sounds to the library in one transaction.
+    Entries with identical audio (within the import or with the library) share one file.
+    """
+    entries = bulkImport.iter_entries(form.files, SOUNDS_FOLDER, temp_prefix, MAX_FILE_SIZE)
+    items = []  # per-entry results, in upload order
+    work = []  # (item, staging path, pool future)
+    placed = []  # pinned file paths of the transcodes moved into storage
+    finished = 0
+    all_extracted = False
+
+    def report():
+        total = len(work)
+        fraction = finished / total if total else 0.0
+        if not all_extracted:
+            fraction = min(fraction, 0.5)
+        more = "" if all_extracted else "+"
+        jobs.update(job, progress=0.2 + 0.8 * fraction, detail=f"{finished}/{total}{more} transcoded")
+
+    def on_transcoded():
+        nonlocal finished
+        finished += 1
+        report()
+
+    loop = asyncio.get_running_loop()
+    jobs.update(job, state="transcoding", progress=0.2)
+    try:
+        while True:
+            entry = await asyncio.to_thread(next, entries, None)
+            if entry is None:
+                break
+            item = {"name": entry.name, "source": entry.source}
+            items.append(item)
+            if entry.error:
+                item.update(status="failed", error=entry.error)
+                continue
+
+            # Staged under the import's temp prefix, so leftovers go with the other temp files
+            staging = os.path.join(SOUNDS_FOLDER, f"{temp_prefix}_t{len(work)}")
+            mp3_path, peaks_file, pcm_file = staging_paths(staging)
+            future = transcode_pool.submit(ingest_audio, entry.path, mp3_path, None, peaks_file, pcm_file)
+            future.add_done_callback(lambda _: loop.call_soon_threadsafe(on_transcoded))
+            work.append((item, staging, future))
+        all_extracted = True
+        report()
+
+        results = await asyncio.gather(*(asyncio.wrap_future(f) for *_, f in work), return_exceptions=True)
+
+        new_sounds = []
+        for (item, staging, _), result in zip(work, results):
+            if isinstance(result, BaseException):
+                item.update(status="failed", error=f"Error processing audio: {result}")
+                remove_staging(staging)
+                continue
+            length_ms, digest = result
+            output_path = place_transcoded(digest, staging)
+            placed.append(output_path)
+            sound_id = str(uuid.uuid4())
+            new_sounds.append(Sound(
+                id=sound_id,
+                name=item["name"],
+                length=length_ms,
+                volume=80,
+                playing=False,
+                trim_start=0,
+                trim_end=length_ms,
+                file_path=output_path,
+                file_format="mp3"
+            ))
+            item.update(status="imported", sound_id=sound_id)
+
+        if not items:
+            jobs.update(job, state="failed", detail="No audio files found")
+            return
+
+        try:
+            store.add_many(new_sounds)
+        except Exception as e:
+            jobs.update(job, state="failed", detail=f"Error saving sounds: {e}")
+            return
+
+        failed = len(items) - len(new_sounds)
+        jobs.update(job, state="done", progress=1.0,
+                    detail=f"Imported {len(new_sounds)} sounds" + (f", {failed} failed" if failed else ""),
+                    result={"imported": len(new_sounds), "failed": failed, "items": items})
+    except asyncio.CancelledError:
+        # Drop queued transcodes and wait out the running ones so their files can be removed
+        running = [f for *_, f in work if not f.cancel()]
+        await asyncio.gather(*(asyncio.wrap_future(f) for f in running), return_exceptions=True)
+        jobs.update(job, state="cancelled")
+        raise
+    except Exception as e:
+        jobs.update(job, state="failed", detail=f"Import failed: {e}")
+    finally:
+        # Files that didn't make it into the library are removed unless something else uses them
+        for file_path in placed:
+            blobs.unpin(file_path)
+            if not store.references(file_path):
+                release_content(file_path)
+        try:
+            entries.close()
+        except ValueError:
+            pass  # Still extracting in a worker thread; its temp file is removed below
+        form.cleanup()
+        bulkImport.remove_temp_files(SOUNDS_FOLDER, temp_prefix)
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = jobs.describe(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, authorization: Optional[str] = Header(None)):
+    if authorization != f"Bearer {ADMIN_TOKEN}":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    if not cancel_local_job(job_id):
+        # Maybe another worker runs it, ask them all
+        job = jobs.describe(job_id)
+        if bus is None or not job or job["state"] in FINISHED_STATES or not bus.signal("cancel_job", {"job_id": job_id}):
+            raise HTTPException(status_code=404, detail="No cancellable job with that id")
+    return {"detail": "Job cancelled"}
+
+def cancel_local_job(job_id: str) -> bool:
+    if job_id in import_tasks:
+        import_tasks[job_id].cancel()
+        return True
+    return ingest_queue.cancel(job_id)
 
 class LoginRequest(BaseModel):
     password: str
@@ -450,59 +1088,91 @@ def login(req: LoginRequest):
     else:
         raise HTTPException(status_code=401, detail="Invalid password")
 
-@app.post("/sounds/youtube", response_model=Sound)
-def create_sound_from_youtube(
+@app.post("/sounds/youtube", status_code=202)
+async def create_sound_from_youtube(
     data: YouTubeBody,
     authorization: Optional[str] = Header(None)
 ):
+    """
+    Queue a YouTube import. Returns a job handle; progress and the finished Sound
+    arrive as "job" SSE events. Importing a URL that is already in flight returns
+    the existing job.
+    """
     if authorization != f"Bearer {ADMIN_TOKEN}":
         raise HTTPException(status_code=401, detail="Unauthorized")
 
     youtube_url = data.youtube_url
     sound_name = data.sound_name or "YouTube Audio"
-    print("Current working directory:", os.getcwd())
     if not youtube_url.startswith("http"):
         raise HTTPException(status_code=400, detail="Invalid YouTube URL.")
 
-    sound_id = str(uuid.uuid4())
-    temp_filename = f"temp_{sound_id}.mp3"
-    output_filename = f"{sound_id}.mp3"
-    temp_path = os.path.join(SOUNDS_FOLDER, temp_filename)
-    output_path = os.path.join(SOUNDS_FOLDER, output_filename)
+    job = ingest_queue.submit(youtube_url, sound_id=str(uuid.uuid4()), name=sound_name.strip())
+    return job.to_dict()
 
-    # Using sys.executable and -m to run yt_dlp as a module
+async def ingest_youtube(job):
+    """Download a YouTube video's audio and add it to the library. Runs on the ingest queue."""
+    sound_id = job.meta["sound_id"]
+    temp_prefix = f"temp_{sound_id}."
+
+    # Keep the source audio codec: the standardize step below is the only decode/encode
     command = [
         sys.executable, "-m", "yt_dlp",
         "--cookies", "./cookies.txt",
+        "--format", "bestaudio/best",
         "--extract-audio",
-        "--audio-format", "mp3",
-        "--audio-quality", "0",
-        "--output", f"{SOUNDS_FOLDER}/temp_{sound_id}.%(ext)s",
-        youtube_url
+        "--newline",
+        "--output", f"{SOUNDS_FOLDER}/{temp_prefix}%(ext)s",
+        job.meta["url"]
     ]
-    try:
-        subprocess.run(command, check=True)
-    except subprocess.CalledProcessError as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to download from YouTube: {e}"
+    jobs.update(job, state="downloading")
+    with metrics.spawn("yt-dlp"):
+        process = await asyncio.create_subprocess_exec(
+            *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
         )
-
+    temp_path = None
     try:
-        audio = AudioSegment.from_file(temp_path, format="mp3")
-        audio = audio.set_channels(1).set_frame_rate(48000)
-        audio.export(output_path, format="mp3", bitrate="128k")
-        length_ms = len(audio)
-        os.remove(temp_path)
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Error standardizing audio: {str(e)}"
+        async for line in process.stdout:
+            match = YTDLP_PROGRESS.search(line.decode("utf-8", "replace"))
+            if match:
+                jobs.update(job, progress=float(match.group(1)) / 100 * 0.8)
+        if await process.wait() != 0:
+            raise RuntimeError(f"Failed to download from YouTube (yt-dlp exit code {process.returncode})")
+
+        temp_path = next(
+            (os.path.join(SOUNDS_FOLDER, f) for f in os.listdir(SOUNDS_FOLDER) if f.startswith(temp_prefix)),
+            None
         )
+        if not temp_path:
+            raise RuntimeError("Failed to download from YouTube: no audio file produced")
+
+        jobs.update(job, state="transcoding", progress=0.8)
+        # Staged under the temp prefix too, so it is removed with the download below
+        staging = os.path.join(SOUNDS_FOLDER, f"{temp_prefix}out")
+        mp3_path, peaks_file, pcm_file = staging_paths(staging)
+        transcode = transcode_pool.submit(ingest_audio, temp_path, mp3_path, None, peaks_file, pcm_file)
+        try:
+            length_ms, digest = await asyncio.wrap_future(transcode)
+        except asyncio.CancelledError:
+            # A running transcode can't be stopped: wait it out, so the cleanup below
+            # runs after it has written its last staging file
+            if not transcode.cancel():
+                await asyncio.wait([asyncio.wrap_future(transcode)])
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Error standardizing audio: {str(e)}")
+        output_path = place_transcoded(digest, staging)
+    finally:
+        # Kill the download if the job was cancelled mid-way
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        for f in os.listdir(SOUNDS_FOLDER):
+            if f.startswith(temp_prefix):
+                os.remove(os.path.join(SOUNDS_FOLDER, f))
 
     new_sound = Sound(
         id=sound_id,
-        name=sound_name.strip(),
+        name=job.meta["name"],
         length=length_ms,
         volume=80,
         playing=False,
@@ -512,7 +1182,10 @@ def create_sound_from_youtube(
         file_format="mp3"
     )
 
-    sounds = load_sounds()
-    sounds.append(new_sound)
-    save_sounds(sounds)
-    return new_sound
\ No newline at end of file
+    try:
+        store.add(new_sound)
+    finally:
+        blobs.unpin(output_path)
+        if not store.references(output_path):
+            release_content(output_path)
+    jobs.update(job, state="done", progress=1.0, result=new_sound.dict())
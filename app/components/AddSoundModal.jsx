@@ -1,6 +1,7 @@
 "use client";
 import React, { useState } from "react";
 import { FaYoutube, FaFolderOpen } from "react-icons/fa";
+import { waitForJob } from "../../api";
 
 function AddSoundModal(props) {
   var isOpen = props.isOpen;
@@ -59,7 +60,9 @@ function AddSoundModal(props) {
         if (!response.ok) {
           throw new Error("Upload failed: " + response.statusText);
         }
-        var newSound = await response.json();
+        // The server transcodes in the background and hands back a job to follow
+        var job = await response.json();
+        var newSound = await waitForJob(job.job_id);
         onSoundAdded(newSound);
       } catch (err) {
         console.error("Error uploading file:", err);
@@ -90,7 +93,8 @@ function AddSoundModal(props) {
         if (!response.ok) {
           throw new Error("YouTube download failed: " + response.statusText);
         }
-        var newSound = await response.json();
+        var job = await response.json();
+        var newSound = await waitForJob(job.job_id);
         onSoundAdded(newSound);
       } catch (err) {
         console.error("Error downloading from YouTube:", err);
@@ -16,7 +16,32 @@ function SoundBoard() {
   const [isAdmin, setIsAdmin] = useState(false);
   const [deleteMode, setDeleteMode] = useState(false);
 
-  const sseEvent = useSSE(process.env.NEXT_PUBLIC_OPENHOWL_API_URL + "/events");
+  // Library changes arrive as events, so the list stays current without refetching it
+  function upsertSound(data) {
+    setSounds(function (prev) {
+      var found = false;
+      var next = prev.map(function (sound) {
+        if (sound.id !== data.id) return sound;
+        found = true;
+        return data.sound;
+      });
+      return found ? next : next.concat(data.sound);
+    });
+  }
+
+  const sseEvent = useSSE(process.env.NEXT_PUBLIC_OPENHOWL_API_URL + "/events", {
+    "sound.created": upsertSound,
+    "sound.updated": upsertSound,
+    "sound.deleted": function (data) {
+      handleSoundDeleted(data.id);
+    },
+    // Missed events the server no longer has, start over from the full list
+    resync: function () {
+      getSounds().then(setSounds).catch(function (err) {
+        console.error("Error refetching sounds:", err);
+      });
+    },
+  });
 
   useEffect(function () {
     if (sseEvent) {
@@ -101,9 +126,8 @@ function SoundBoard() {
           <>
             <AddSound
               onSoundAdded={function (newSound) {
-                setSounds(function (prev) {
-                  return prev.concat(newSound);
-                });
+                // The sound.created event may already have added it
+                upsertSound({ id: newSound.id, sound: newSound });
               }}
             />
             <DeleteSound deleteMode={deleteMode} setDeleteMode={setDeleteMode} />
@@ -2,7 +2,7 @@
   import React, { useState, useEffect, useRef } from "react";
   import SoundEffectsModal from "./SoundEffectsModal";
   import { useLongPress } from "../hooks/useLongPress";
-  import { updateSound } from "../../api";
+  import { getSound, updateSound } from "../../api";
   import { FaTrashAlt, FaRegStopCircle } from "react-icons/fa";
   import { MdOutlinePlayCircle } from "react-icons/md";
 
@@ -76,14 +76,8 @@
       () => {
         (async function () {
           try {
-            const response = await fetch(`${API_URL}/sounds`);
-            const allSounds = await response.json();
-            const latestSoundData = allSounds.find((s) => s.id === soundData.id);
-            if (latestSoundData) {
-              setCurrentSoundData(latestSoundData);
-            } else {
-              console.error("Sound not found in backend");
-            }
+            const latestSoundData = await getSound(soundData.id);
+            setCurrentSoundData(latestSoundData);
           } catch (error) {
             console.error("Error fetching latest sound data:", error);
           }
@@ -116,12 +110,8 @@
       setIsPlaying(true);
 
       try {
-        const response = await fetch(`${API_URL}/sounds`);
-        const allSounds = await response.json();
-        const currentSound = allSounds.find((s) => s.id === soundData.id);
-        if (currentSound) {
-          await updateSound({ ...currentSound, playing: true });
-        }
+        const currentSound = await getSound(soundData.id);
+        await updateSound({ ...currentSound, playing: true });
       } catch (error) {
         console.error("Error updating playing status:", error);
       }
@@ -150,12 +140,8 @@
       onStopPlaying?.();
 
       try {
-        const response = await fetch(`${API_URL}/sounds`);
-        const allSounds = await response.json();
-        const currentSound = allSounds.find((s) => s.id === soundData.id);
-        if (currentSound) {
-          await updateSound({ ...currentSound, playing: false });
-        }
+        const currentSound = await getSound(soundData.id);
+        await updateSound({ ...currentSound, playing: false });
       } catch (error) {
         console.error("Error updating playing status:", error);
       }
@@ -1,8 +1,12 @@
 // hooks/useSSE.js
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 
-export default function useSSE(url) {
+// handlers maps named events (e.g. "sound.updated") to callbacks taking the parsed data.
+// Unnamed messages are returned as state, like before.
+export default function useSSE(url, handlers) {
   const [eventData, setEventData] = useState(null);
+  const handlersRef = useRef(handlers);
+  handlersRef.current = handlers;
 
   useEffect(() => {
     console.log("Connecting to SSE URL:", url);
@@ -22,9 +26,19 @@ export default function useSSE(url) {
       }
     };
 
+    Object.keys(handlersRef.current || {}).forEach(function (name) {
+      eventSource.addEventListener(name, function (e) {
+        try {
+          handlersRef.current[name]?.(JSON.parse(e.data));
+        } catch (err) {
+          console.error(`Error handling SSE ${name} event:`, err);
+        }
+      });
+    });
+
     eventSource.onerror = (err) => {
+      // Let EventSource reconnect on its own; it resumes with Last-Event-ID
       console.error("SSE connection error:", err);
-      eventSource.close();
     };
 
     return () => {
@@ -1,88 +1,336 @@
+import os
+import time
+import tempfile
+import itertools
 import threading
 import subprocess
-import os
-from pydub import AudioSegment
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+import numpy as np
 from pydub import AudioSegment
-from pydub.effects import  low_pass_filter, high_pass_filter
 
-def load_audio(file_path: str) -> AudioSegment:
+import contentStore
+import effectsEngine
+import metrics
+import peaks
+import pcmStore
+
+# numpy dtype for each pydub sample width
+SAMPLE_TYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+
+# Block size for progressive (streamed) renders
+STREAM_BLOCK_MS = 250
+
+# The library format (see standardize_audio), which streamed decodes are read in
+LIBRARY_FRAME_RATE = 48000
+LIBRARY_CHANNELS = 1
+
+# Windowed loads start decoding this far before the requested start and cut the
+# extra off afterwards, so the mp3 bit reservoir and decoder delay settle first
+DECODE_PREROLL_MS = 100
+
+class ClipStream:
+    """
+    The trimmed part of a library file as float32 blocks of shape (frames, channels)
+    scaled to [-1, 1], produced as they are read. Iterate it once; close() stops
+    the decoder if the stream isn't read to the end.
+    """
+
+    def __init__(self, blocks: Iterator[np.ndarray], frame_rate: int, channels: int,
+                 close: Optional[Callable[[], None]] = None):
+        self.blocks = blocks
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self._close = close
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return self.blocks
+
+    def close(self):
+        if self._close:
+            self._close()
+
+def open_clip_stream(file_path: str, trim_start: int, trim_end: int,
+                     block_ms: int = STREAM_BLOCK_MS) -> ClipStream:
+    """
+    Stream the trimmed part of a library file: slices of its canonical PCM if it
+    has one, otherwise a piped decode of just that window from the mp3. Effects run
+    on the trimmed clip and keep its length, so nothing past trim_end is needed
+    (e.g. for the echo tail). The first block is decoded before returning, so an
+    unreadable file raises here (RuntimeError or OSError) rather than mid-stream.
+    """
+    canonical = pcmStore.pcm_path(file_path)
+    if os.path.exists(canonical):
+        with metrics.stage("map_pcm"):
+            try:
+                clip = pcmStore.open_clip(canonical, trim_start, trim_end)
+                return ClipStream(segment_blocks(clip, block_ms), clip.frame_rate, clip.channels)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable PCM {canonical}: {e}")
+
+    blocks = _decode_blocks(file_path, trim_start, trim_end, block_ms)
+    first = next(blocks, None)
+    if first is None:
+        return ClipStream(iter(()), LIBRARY_FRAME_RATE, LIBRARY_CHANNELS)
+    return ClipStream(itertools.chain((first,), blocks), LIBRARY_FRAME_RATE, LIBRARY_CHANNELS, blocks.close)
+
+def _decode_blocks(file_path: str, start_ms: int, end_ms: Optional[int], block_ms: int) -> Iterator[np.ndarray]:
+    """The [start_ms, end_ms) window of a file, decoded by ffmpeg into a pipe and read a block at a time."""
+    start_ms = max(start_ms, 0)
+    if end_ms is not None and end_ms <= start_ms:
+        return
+    frame_width = LIBRARY_CHANNELS * 2
+    preroll = min(start_ms, DECODE_PREROLL_MS)
+    # Same millisecond-to-frame rounding as slicing an AudioSegment
+    skip = int(preroll * LIBRARY_FRAME_RATE / 1000) * frame_width
+    remaining = None
+    if end_ms is not None:
+        remaining = int((preroll + end_ms - start_ms) * LIBRARY_FRAME_RATE / 1000) * frame_width - skip
+    block_bytes = max(1, LIBRARY_FRAME_RATE * block_ms // 1000) * frame_width
 
+    # -ss before -i seeks the input instead of decoding up to the start
+    command = [AudioSegment.converter, "-nostdin", "-v", "error", "-ss", f"{(start_ms - preroll) / 1000:.3f}"]
+    if end_ms is not None:
+        command += ["-t", f"{(end_ms - start_ms + preroll) / 1000:.3f}"]
+    command += [
+        "-i", file_path, "-vn", "-f", "s16le", "-acodec", "pcm_s16le",
+        "-ac", str(LIBRARY_CHANNELS), "-ar", str(LIBRARY_FRAME_RATE), "pipe:1",
+    ]
+    # stderr goes to a file: a pipe nobody reads until the end could fill up and stall ffmpeg
+    errors = tempfile.TemporaryFile()
+    with metrics.spawn("ffmpeg"):
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errors)
+    elapsed = 0.0
     try:
-        return AudioSegment.from_file(file_path)
-    except Exception as e:
-        print(f"Error loading audio: {e}")
-        return None
+        while skip > 0:
+            data = process.stdout.read(min(skip, block_bytes))
+            if not data:
+                break
+            skip -= len(data)
+        while remaining is None or remaining > 0:
+            start = time.perf_counter()
+            data = process.stdout.read(block_bytes if remaining is None else min(block_bytes, remaining))
+            data = data[:len(data) - len(data) % frame_width]
+            elapsed += time.perf_counter() - start
+            if not data:
+                break
+            if remaining is not None:
+                remaining -= len(data)
+            samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+            samples /= 32768.0
+            yield samples.reshape(-1, LIBRARY_CHANNELS)
+        if remaining is None or remaining > 0:
+            # Stopped at the end of the output: make sure it was the end of the file, not an error
+            if process.wait() != 0:
+                errors.seek(0)
+                message = errors.read().decode("utf-8", "replace").strip()
+                raise RuntimeError(message or f"ffmpeg exited with {process.returncode}")
+        metrics.record("decode", elapsed)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        errors.close()
 
-def trim_audio(audio: AudioSegment, trim_start: int, trim_end: int) -> AudioSegment:
+def standardize_audio(src_path: str, dst_path: str, src_format: str = None, peaks_path: str = None,
+                      pcm_path: str = None) -> int:
+    """
+    Convert any input file to the library format (mono, 48kHz, 128k mp3).
+    If `peaks_path` is given, the waveform peak index is built from the same decode,
+    and if `pcm_path` is given the decoded source is also kept as canonical PCM.
+    Runs in a worker process, so it only takes and returns plain values.
+    Returns the length in milliseconds.
+    """
+    audio = AudioSegment.from_file(src_path, format=src_format)
+    audio = audio.set_channels(1).set_frame_rate(48000)
+    audio.export(dst_path, format="mp3", bitrate="128k")
+    if peaks_path:
+        _write_peaks(audio, peaks_path)
+    if pcm_path:
+        _write_canonical_pcm(audio, pcm_path)
+    return len(audio)
 
-    return audio[trim_start:trim_end]
+def ingest_audio(src_path: str, dst_path: str, src_format: str = None, peaks_path: str = None,
+                 pcm_path: str = None) -> Tuple[int, str]:
+    """
+    standardize_audio, also returning the SHA-256 of the mp3 it wrote, which is
+    the id the library stores that content under. Runs in a worker process.
+    Returns (length in milliseconds, digest).
+    """
+    length_ms = standardize_audio(src_path, dst_path, src_format, peaks_path, pcm_path)
+    return length_ms, contentStore.file_digest(dst_path)
 
-def apply_effects(audio: AudioSegment, effects: dict, volume: int = 100) -> AudioSegment:
+def convert_to_pcm(file_path: str, pcm_path: str) -> int:
+    """Decode a library file into canonical PCM. Used by the migration command. Returns the length in ms."""
+    audio = AudioSegment.from_file(file_path).set_channels(1).set_frame_rate(48000)
+    _write_canonical_pcm(audio, pcm_path)
+    return len(audio)
 
+def _write_canonical_pcm(audio: AudioSegment, pcm_path: str):
+    samples = np.frombuffer(audio.set_sample_width(2).raw_data, dtype=np.int16)
+    pcmStore.write_pcm(pcm_path, samples, audio.frame_rate, audio.channels)
 
-    volume_db = (volume / 100) * 60 - 60  # Scale volume to decibels
-    print(f"Applying volume: {volume}% ({volume_db:.2f} dB)")
-    audio = audio + volume_db  # Adjust volume
+def build_peaks(file_path: str, peaks_path: str):
+    """Decode a library file and write its waveform peak index."""
+    audio = AudioSegment.from_file(file_path).set_channels(1)
+    _write_peaks(audio, peaks_path)
 
-    if effects.get("echo", False):
-        echo_delay = 150  # milliseconds
-        echo_repeats = 5  # More repeats for a chaotic sound
-        print("Applying EXTREME echo !")
-        
-        for _ in range(echo_repeats):
-            delayed = audio - 10  # Reduce volume slightly each repeat
-            delayed = delayed.overlay(audio, position=echo_delay)
-            audio = delayed
+def _write_peaks(audio: AudioSegment, peaks_path: str):
+    samples = np.frombuffer(audio.set_sample_width(2).raw_data, dtype=np.int16)
+    peaks.write_peaks(peaks_path, samples, audio.frame_rate)
 
+def trim_audio(audio: AudioSegment, trim_start: int, trim_end: int) -> AudioSegment:
 
-    # if effects.get("reverb", False):
-    #     print("Applying reverse effect!")
-    #     audio = audio.reverse() + 5  # Slight volume boost
+    return audio[trim_start:trim_end]
 
-    if effects.get("reverse", False):
-        print("Applying reverse effect!")
-        audio = audio.reverse() + 5  # Slight volume boost
+def segment_to_samples(audio: AudioSegment) -> np.ndarray:
+    """Convert an AudioSegment to a float32 array of shape (frames, channels) in [-1, 1]."""
+    if audio.sample_width not in SAMPLE_TYPES:
+        audio = audio.set_sample_width(2)
+    full_scale = float(1 << (8 * audio.sample_width - 1))
+    samples = np.frombuffer(audio.raw_data, dtype=SAMPLE_TYPES[audio.sample_width])
+    samples = samples.astype(np.float32)
+    samples /= full_scale
+    return samples.reshape(-1, audio.channels)
 
-    if effects.get("lowpass", False):
-        print("Applying  lowpass filter")
-        audio = low_pass_filter(audio, 300)  # Lower cutoff for a muffled effect
+def samples_to_segment(samples: np.ndarray, like: AudioSegment) -> AudioSegment:
+    """Convert a float32 sample array back into an AudioSegment shaped like `like`."""
+    sample_width = like.sample_width if like.sample_width in SAMPLE_TYPES else 2
+    full_scale = float(1 << (8 * sample_width - 1))
+    samples = samples * full_scale
+    np.clip(samples, -full_scale, full_scale - 1, out=samples)
+    raw = samples.astype(SAMPLE_TYPES[sample_width]).tobytes()
+    return AudioSegment(
+        data=raw,
+        sample_width=sample_width,
+        frame_rate=like.frame_rate,
+        channels=like.channels,
+    )
 
-    if effects.get("highpass", False):
-        print("Applying  highpass filter")
-        audio = high_pass_filter(audio, 3000)  # Higher cutoff for more extreme effect
+def apply_effects(audio: AudioSegment, effects: dict, volume: int = 100) -> AudioSegment:
+    """Apply volume and effects using the NumPy effects engine."""
+    samples = segment_to_samples(audio)
+    samples = effectsEngine.process(samples, effects, volume, audio.frame_rate)
+    return samples_to_segment(samples, audio)
 
-    if effects.get("distort", False):
-        print("Applying distort")
+def segment_blocks(audio, block_ms: int = STREAM_BLOCK_MS) -> Iterator[np.ndarray]:
+    """Slice an in-memory clip (an AudioSegment or PCMClip) into float32 blocks without copying it whole."""
+    if audio.sample_width not in SAMPLE_TYPES:
+        audio = audio.set_sample_width(2)
+    dtype = SAMPLE_TYPES[audio.sample_width]
+    full_scale = float(1 << (8 * audio.sample_width - 1))
+    block_bytes = max(1, audio.frame_rate * block_ms // 1000) * audio.frame_width
+    raw = memoryview(audio.raw_data)
+    for offset in range(0, len(raw), block_bytes):
+        samples = np.frombuffer(raw[offset:offset + block_bytes], dtype=dtype).astype(np.float32)
+        samples /= full_scale
+        yield samples.reshape(-1, audio.channels)
 
-        boosted = audio + 50 
+def render_pcm_blocks(clip: ClipStream, effects: dict, volume: int = 100) -> Iterator[np.ndarray]:
+    """
+    Apply volume and effects a block at a time, yielding 16-bit PCM blocks of shape
+    (frames, channels), in the clip's frame rate and channel layout, as soon as each
+    is done. Only the reverse effect holds more than a block.
+    """
+    for block in effectsEngine.process_blocks(clip, effects, volume, clip.frame_rate, clip.channels):
+        block = block * 32768.0
+        np.clip(block, -32768, 32767, out=block)
+        yield block.astype(np.int16)
 
-        blown_out = boosted + 50 
-        distorted = boosted.overlay(blown_out, gain_during_overlay=--0)  
+def encode_mp3_stream(pcm_blocks: Iterable[bytes], frame_rate: int, channels: int,
+                      bitrate: str = "128k", chunk_size: int = 16384) -> Iterator[bytes]:
+    """
+    Encode a stream of 16-bit PCM blocks to mono 48kHz mp3 through a piped ffmpeg,
+    yielding mp3 data as soon as the encoder produces it.
+    A feeder thread pulls (and so renders) the PCM. Both pipes are bounded by the
+    OS, so a slow reader stalls the render instead of piling up buffered audio.
+    """
+    command = [
+        AudioSegment.converter, "-nostdin", "-v", "error",
+        "-f", "s16le", "-ar", str(frame_rate), "-ac", str(channels), "-i", "pipe:0",
+        "-ac", "1", "-ar", "48000", "-b:a", bitrate, "-f", "mp3", "pipe:1",
+    ]
+    with metrics.spawn("ffmpeg"):
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    errors = []
 
-        distorted = distorted - 10 
+    def feed():
+        try:
+            for block in pcm_blocks:
+                process.stdin.write(block)
+        except (BrokenPipeError, ValueError):
+            pass  # Encoder was stopped, e.g. the client went away
+        except Exception as e:
+            errors.append(e)
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
 
-        audio = distorted  
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        while True:
+            chunk = process.stdout.read1(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+        feeder.join()
+        if errors:
+            raise errors[0]
+        if process.wait() != 0:
+            raise RuntimeError(f"mp3 encoder exited with code {process.returncode}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        feeder.join()
+        process.stdout.close()
 
-    return audio
+def render_mp3_stream(clip: ClipStream, effects: dict, volume: int = 100) -> Iterator[bytes]:
+    """Apply effects to a clip block by block and yield 128k mono 48kHz mp3 as it is encoded."""
+    pcm = (block.tobytes() for block in render_pcm_blocks(clip, effects, volume))
+    return encode_mp3_stream(pcm, clip.frame_rate, clip.channels)
+
+def render_voice_pcm(clip: ClipStream, effects: dict, volume: int, frame_rate: int, channels: int) -> bytearray:
+    """
+    Apply effects to a clip block by block and collect it as 16-bit PCM in the
+    given format (Discord voice's). The output buffer is the only allocation that
+    grows with the clip, except for a reversed one.
+    """
+    out = bytearray()
+    for block in render_pcm_blocks(clip, effects, volume):
+        data = block.tobytes()
+        if clip.channels != channels:
+            data = AudioSegment(data, sample_width=2, frame_rate=clip.frame_rate,
+                                channels=clip.channels).set_channels(channels).raw_data
+        out += data
+    if clip.frame_rate != frame_rate:
+        # Resampling carries state across the whole clip, so do it in one go (not the library rate, so rare)
+        out = bytearray(AudioSegment(bytes(out), sample_width=2, frame_rate=clip.frame_rate,
+                                     channels=channels).set_frame_rate(frame_rate).raw_data)
+    return out
 
 def _play_audio_thread(audio: AudioSegment):
     """
     Runs in a separate thread to allow overlapping playback.
+    The audio is piped to ffplay as wav, so nothing is written to disk.
     """
-    temp_path = f"temp_{threading.get_ident()}.mp3"  # Unique temp file for each thread
-    audio.export(temp_path, format="mp3")
-
+    data = audio.export(format="wav").read()
     try:
-        subprocess.Popen(
-            ["ffplay", "-nodisp", "-autoexit", temp_path],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
+        with metrics.spawn("ffplay"):
+            process = subprocess.Popen(
+                ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet", "-f", "wav", "-i", "pipe:0"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        with process.stdin:
+            process.stdin.write(data)
     except Exception as e:
         print(f"Error playing audio: {e}")
 
-    threading.Timer(5, lambda: os.remove(temp_path) if os.path.exists(temp_path) else None).start()
-
 def play_audio(audio: AudioSegment):
     """
     Plays the audio in a new thread, allowing multiple sounds to mix together.
@@ -0,0 +1,95 @@
+"""
+Benchmark the NumPy effects engine against the original pydub effect chain.
+
+    python benchmarks/bench_effects.py --minutes 1 3
+
+Clips are synthetic (a few tones plus noise at 48kHz mono), so no audio files
+or ffmpeg are needed. For each effect the script prints the time taken by both
+implementations and the signal-to-difference ratio between their outputs, as a
+sanity check that the new engine still sounds the same.
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from pydub import AudioSegment
+from pydub.effects import low_pass_filter, high_pass_filter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, BENCH_DIR)
+from audioHandler import apply_effects, segment_to_samples  # noqa: E402
+from suite import synthetic_clip  # noqa: E402
+
+EFFECTS = ["none", "echo", "reverse", "lowpass", "highpass", "distort"]
+
+
+def legacy_apply_effects(audio: AudioSegment, effects: dict, volume: int = 100) -> AudioSegment:
+    """The pydub effect chain apply_effects used before the NumPy engine."""
+    volume_db = (volume / 100) * 60 - 60
+    audio = audio + volume_db
+
+    if effects.get("echo", False):
+        for _ in range(5):
+            delayed = audio - 10
+            delayed = delayed.overlay(audio, position=150)
+            audio = delayed
+
+    if effects.get("reverse", False):
+        audio = audio.reverse() + 5
+
+    if effects.get("lowpass", False):
+        audio = low_pass_filter(audio, 300)
+
+    if effects.get("highpass", False):
+        audio = high_pass_filter(audio, 3000)
+
+    if effects.get("distort", False):
+        boosted = audio + 50
+        blown_out = boosted + 50
+        distorted = boosted.overlay(blown_out, gain_during_overlay=0)
+        audio = distorted - 10
+
+    return audio
+
+
+def difference_db(reference: AudioSegment, candidate: AudioSegment) -> float:
+    """Signal-to-difference ratio in dB, higher means closer."""
+    ref = segment_to_samples(reference).ravel()
+    cand = segment_to_samples(candidate).ravel()
+    n = min(len(ref), len(cand))
+    noise = np.mean((ref[:n] - cand[:n]) ** 2)
+    signal = np.mean(ref[:n] ** 2)
+    if noise == 0:
+        return float("inf")
+    return 10 * np.log10(signal / noise)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 3])
+    parser.add_argument("--volume", type=int, default=80)
+    args = parser.parse_args()
+
+    print(f"{'clip':>6} {'effect':>9} {'pydub s':>9} {'numpy s':>9} {'speedup':>8} {'SDR dB':>8}")
+    for minutes in args.minutes:
+        clip = synthetic_clip(minutes * 60)
+        for effect in EFFECTS:
+            effects = {} if effect == "none" else {effect: True}
+            legacy, legacy_time = timed(legacy_apply_effects, clip, effects, args.volume)
+            new, new_time = timed(apply_effects, clip, effects, args.volume)
+            print(
+                f"{minutes:>5g}m {effect:>9} {legacy_time:>9.3f} {new_time:>9.3f} "
+                f"{legacy_time / new_time:>7.1f}x {difference_db(legacy, new):>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Offline load test for Discord playback: concurrent play and stop requests against
+the API, with the voice service playing into simulated guilds (fakeVoice.py)
+instead of Discord.
+
+    python benchmarks/load_playback.py --guilds 20 --clicks 400 --concurrency 32
+    python benchmarks/load_playback.py --speed 0 --clicks 2000   # faster than real time
+    python benchmarks/load_playback.py --limits                  # with the configured play limits
+
+Reports click-to-first-frame latency (from sending the request to the voice's
+first 20ms frame leaving the simulated connection), underruns, CPU per stream and
+the playing/stopped events sent per click, and checks that every voice that
+played to the end was announced as stopped. Latency only covers plays that start
+right away, as a queued play has no voice id yet when it is answered.
+
+Sounds are synthetic and stored as canonical PCM, so ffmpeg isn't needed. By
+default the play limits and the debounce are off so every click plays; --limits
+keeps them as configured.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCH_DIR, "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from suite import summarize, synthetic_clip  # noqa: E402
+
+
+def cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def configure(args):
+    """Environment for the app, set before it is imported."""
+    os.environ.pop("DISCORD_BOT_TOKEN", None)
+    os.environ.update({
+        "OPENHOWL_FAKE_VOICE_GUILDS": str(args.guilds),
+        "OPENHOWL_FAKE_VOICE_SPEED": str(args.speed),
+        "OPENHOWL_PRERENDER_WARM": "0",
+        "OPENHOWL_GC_INTERVAL": "0",
+    })
+    if not args.limits:
+        os.environ.update({
+            "OPENHOWL_PLAY_DEBOUNCE_MS": "0",
+            "OPENHOWL_PLAY_RATE": "0",
+            "OPENHOWL_PLAY_GLOBAL_RATE": "0",
+            "OPENHOWL_PLAY_QUEUE_SIZE": str(args.clicks),
+        })
+    if args.render_workers:
+        os.environ["OPENHOWL_RENDER_WORKERS"] = str(args.render_workers)
+
+
+def write_sounds(count: int, seconds: float) -> list:
+    import pcmStore
+    import numpy as np
+    paths = []
+    os.makedirs("sounds", exist_ok=True)
+    for i in range(count):
+        path = os.path.abspath(os.path.join("sounds", f"load_{i}.mp3"))
+        clip = synthetic_clip(seconds + i * 0.1)
+        pcmStore.write_pcm(pcmStore.pcm_path(path), np.frombuffer(clip.raw_data, dtype=np.int16), clip.frame_rate)
+        paths.append((path, len(clip)))
+    return paths
+
+
+def run(args) -> dict:
+    from fastapi.testclient import TestClient
+    from fakeVoice import FakeContext
+    import app as openhowl
+
+    voice = openhowl.voice
+    pool = voice.voice_pool
+    events = []
+    publish = voice.broadcast
+
+    def counting_broadcast(data, event=None):
+        events.append((event, data))
+        publish(data, event)
+
+    voice.broadcast = counting_broadcast
+    rng = random.Random(args.seed)
+
+    with TestClient(openhowl.app) as client:
+        sounds = []
+        for path, length in write_sounds(args.sounds, args.sound_seconds):
+            sound = client.post("/sounds", json={
+                "name": os.path.basename(path), "file_path": path, "length": length, "trim_end": length,
+                "effects": {"echo": True}, "volume": 80,
+            }).json()
+            sounds.append(sound)
+            if not args.cold:
+                client.portal.call(openhowl.render_sound_pcm, openhowl.find_sound(sound["id"]))
+
+        clicks = []
+        played = []
+        lock = threading.Lock()
+        # Decided up front so runs with the same seed send the same requests
+        plan = [(rng.randint(1, args.guilds), rng.choice(sounds), rng.random() < args.stop_ratio, rng.random())
+                for _ in range(args.clicks)]
+
+        def click(step: tuple):
+            guild_id, sound, stop, pick = step
+            with lock:
+                stop_voice = played[int(pick * len(played))] if stop and played else None
+            if stop_voice is not None:
+                response = client.post(f"/discord/stop?voice_id={stop_voice}")
+                clicks.append({"kind": "stop", "status": response.status_code})
+                return
+            sent = time.perf_counter()
+            response = client.post(f"/discord/play/{sound['id']}?guild_id={guild_id}&mode={args.mode}")
+            answer = response.json()
+            clicks.append({"kind": "play", "status": response.status_code, "sent": sent,
+                           "voice_id": answer.get("voice_id"), "debounced": answer.get("debounced", False)})
+            if answer.get("voice_id") is not None and not answer.get("debounced"):
+                with lock:
+                    played.append(answer["voice_id"])
+
+        cpu_start, wall_start = cpu_time(), time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            list(executor.map(click, plan))
+
+        # The bot's own play command, from simulated Discord users
+        command = voice.bot.get_command("play")
+        replies = Counter()
+        for i in range(args.commands):
+            ctx = FakeContext(rng.randint(1, args.guilds), user_id=i)
+            client.portal.call(command.callback, ctx, rng.choice(sounds)["id"])
+            replies.update(reply.split("`")[0].strip() for reply in ctx.replies)
+
+        # Let everything that was started play out
+        deadline = time.perf_counter() + args.timeout
+        while time.perf_counter() < deadline:
+            busy = any(vc.is_playing() for vc in list(pool.clients.values())) or voice.playback.queued
+            if not busy:
+                break
+            time.sleep(0.05)
+        time.sleep(0.1)  # after-callbacks and events
+        wall = time.perf_counter() - wall_start
+        cpu = cpu_time() - cpu_start
+
+        first_frames = pool.first_frames()
+        sinks = [vc.stats() for vc in pool.clients.values()]
+
+    plays = [c for c in clicks if c["kind"] == "play"]
+    latencies = [first_frames[c["voice_id"]] - c["sent"] for c in plays
+                 if c["voice_id"] in first_frames and not c["debounced"]]
+    streams = len(first_frames)
+    audio_seconds = sum(s["frames"] for s in sinks) * 0.02
+    read_cpu = sum(s["read_cpu"] for s in sinks)
+    playing = sum(1 for event, data in events if event is None and data.get("state") == "playing")
+    stopped = sum(1 for event, data in events if event is None and data.get("state") == "stopped")
+
+    return {
+        "params": vars(args),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "wall_s": wall,
+        "statuses": dict(Counter(f"{c['kind']} {c['status']}" for c in clicks)),
+        "commands": dict(replies),
+        "streams": streams,
+        "never_played": sum(1 for c in plays if c["voice_id"] is not None and c["voice_id"] not in first_frames),
+        "first_frame_latency": summarize(latencies) if latencies else None,
+        "underruns": sum(s["underruns"] for s in sinks),
+        "max_lateness_s": max((s["max_lateness"] for s in sinks), default=0.0),
+        "cpu_s": cpu,
+        "cpu_per_stream_s": cpu / streams if streams else None,
+        "mixer_cpu_per_audio_s": read_cpu / audio_seconds if audio_seconds else None,
+        "events": {"playing": playing, "stopped": stopped, "per_click": (playing + stopped) / max(len(clicks), 1)},
+        "unannounced_stops": max(playing - stopped, 0),
+        "playback": dict(voice.playback.counts),
+    }
+
+
+def report(result: dict):
+    print(f"{result['params']['clicks']} clicks into {result['params']['guilds']} guilds "
+          f"at speed {result['params']['speed']} in {result['wall_s']:.2f}s")
+    print(f"  responses        {result['statuses']}")
+    if result["commands"]:
+        print(f"  bot commands     {result['commands']}")
+    print(f"  scheduler        {result['playback']}")
+    latency = result["first_frame_latency"]
+    if latency:
+        print(f"  first frame      median {latency['median'] * 1000:.1f} ms  p95 {latency['p95'] * 1000:.1f} ms  "
+              f"over {latency['n']} plays")
+    print(f"  streams          {result['streams']} played, {result['never_played']} stopped before their first frame")
+    print(f"  underruns        {result['underruns']} (worst frame {result['max_lateness_s'] * 1000:.1f} ms late)")
+    if result["cpu_per_stream_s"] is not None:
+        print(f"  cpu              {result['cpu_s']:.2f}s total, {result['cpu_per_stream_s'] * 1000:.1f} ms per stream, "
+              f"mixer {result['mixer_cpu_per_audio_s'] * 100:.2f}% of a core per second of audio")
+    events = result["events"]
+    print(f"  events           {events['playing']} playing, {events['stopped']} stopped, "
+          f"{events['per_click']:.2f} per click, {result['unannounced_stops']} voices never announced stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guilds", type=int, default=10, help="Simulated guilds")
+    parser.add_argument("--clicks", type=int, default=200, help="Play and stop requests to send")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once")
+    parser.add_argument("--stop-ratio", type=float, default=0.1, help="Share of requests that stop a playing voice")
+    parser.add_argument("--mode", choices=["mix", "queue", "preempt"], default="mix")
+    parser.add_argument("--commands", type=int, default=0, help="Also run the bot's play command this many times")
+    parser.add_argument("--sounds", type=int, default=5)
+    parser.add_argument("--sound-seconds", type=float, default=1.0)
+    parser.add_argument("--speed", type=float, default=1.0, help="1 plays in real time, 0 as fast as possible")
+    parser.add_argument("--cold", action="store_true", help="Don't render the sounds before the first click")
+    parser.add_argument("--limits", action="store_true", help="Keep the configured debounce and rate limits")
+    parser.add_argument("--render-workers", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait for playback to finish")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    configure(args)
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="openhowl-load-")
+    os.chdir(workdir)
+    try:
+        result = run(args)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    report(result)
+    if output:
+        with open(output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,467 @@
+"""
+Offline benchmark suite for the render, store, upload and event paths.
+
+    python benchmarks/suite.py --quick --output before.json
+    python benchmarks/suite.py --quick --output after.json
+    python benchmarks/suite.py --compare before.json after.json
+
+Everything runs against synthetic fixtures in a scratch directory: tone+noise
+clips from a 1s SFX up to an hour-long track, and sound libraries of 10 to 10k
+entries. Discord and the network are never touched (the bot is not started).
+Cases that need ffmpeg (mp3 preview, upload transcode) are recorded as skipped
+when it isn't installed.
+
+Results are written as JSON, one entry per case with its raw timings and summary
+stats, plus enough metadata (commit, Python, CPU count) to tell runs apart.
+--compare prints the change in median time for every case both runs have and
+exits non-zero if anything got slower than --threshold.
+
+Groups (select with --only): preview, effects, store, transcode, events.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import itertools
+import statistics
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from pydub import AudioSegment
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+GROUPS = ["preview", "effects", "store", "transcode", "events"]
+EFFECT_NAMES = ["echo", "reverse", "lowpass", "highpass", "distort"]
+
+PROFILES = {
+    # clip seconds, library sizes, SSE client counts
+    "quick": {"clips": [1, 30], "libraries": [10, 1000], "clients": [10, 100]},
+    "full": {"clips": [1, 30, 180, 3600], "libraries": [10, 100, 1000, 10000], "clients": [1, 10, 100, 1000]},
+}
+
+
+# Fixtures
+
+def synthetic_clip(seconds: float, frame_rate: int = 48000) -> AudioSegment:
+    """A few tones plus noise, deterministic so runs are comparable."""
+    rng = np.random.default_rng(1234)
+    t = np.arange(int(seconds * frame_rate)) / frame_rate
+    signal = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.2 * np.sin(2 * np.pi * 1800 * t)
+    signal += 0.05 * rng.standard_normal(len(t))
+    pcm = (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+    return AudioSegment(data=pcm.tobytes(), sample_width=2, frame_rate=frame_rate, channels=1)
+
+
+def write_clip(folder: str, seconds: float) -> str:
+    path = os.path.join(folder, f"clip_{seconds:g}s.wav")
+    if not os.path.exists(path):
+        synthetic_clip(seconds).export(path, format="wav")
+    return path
+
+
+def synthetic_library(count: int, file_path: str = "sounds/missing.mp3") -> list:
+    from models import Sound
+    rng = random.Random(count)
+    sounds = []
+    for i in range(count):
+        length = rng.randint(500, 600_000)
+        sounds.append(Sound(
+            id=f"bench-{i}",
+            name=f"Sound {i}",
+            length=length,
+            volume=rng.randint(0, 100),
+            effects={name: rng.random() < 0.2 for name in EFFECT_NAMES},
+            trim_start=0,
+            trim_end=length,
+            file_path=file_path,
+            file_format="mp3",
+        ))
+    return sounds
+
+
+def effect_combinations():
+    for r in range(len(EFFECT_NAMES) + 1):
+        for combo in itertools.combinations(EFFECT_NAMES, r):
+            yield combo
+
+
+# Measurement
+
+def summarize(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "n": len(samples),
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "mean": statistics.fmean(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        "stdev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+    }
+
+
+def case_id(name: str, params: dict) -> str:
+    if not params:
+        return name
+    return name + "[" + ",".join(f"{k}={v}" for k, v in sorted(params.items())) + "]"
+
+
+class Results:
+    def __init__(self):
+        self.cases = []
+
+    def record(self, name: str, params: dict, samples: list, **extra):
+        entry = {"id": case_id(name, params), "name": name, "params": params, "unit": "s",
+                 "samples": samples, **summarize(samples), **extra}
+        self.cases.append(entry)
+        extras = " ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in extra.items())
+        print(f"  {entry['id']:<60} median {entry['median'] * 1000:>10.2f} ms  p95 {entry['p95'] * 1000:>10.2f} ms  {extras}")
+
+    def skip(self, name: str, params: dict, reason: str):
+        self.cases.append({"id": case_id(name, params), "name": name, "params": params, "skipped": reason})
+        print(f"  {case_id(name, params):<60} skipped: {reason}")
+
+
+def repeat(fn, repeats: int, setup=None) -> list:
+    samples = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def repeats_for(seconds: float, base: int) -> int:
+    """Fewer repeats for long fixtures so the full profile finishes in reasonable time."""
+    if seconds >= 600:
+        return max(1, base // 5)
+    if seconds >= 120:
+        return max(2, base // 2)
+    return base
+
+
+# Benchmarks
+
+def bench_preview(results: Results, profile: dict, workdir: str, repeats: int, concurrent: int):
+    """
+    GET /sounds/preview end to end: cold render, warm cache hit and 304 revalidation,
+    plus `concurrent` simultaneous cold requests for one sound (rendered once, shared).
+    """
+    name = "preview"
+    if not shutil.which("ffmpeg"):
+        for seconds in profile["clips"]:
+            results.skip(name, {"clip_s": seconds}, "ffmpeg not installed")
+        return
+
+    from fastapi.testclient import TestClient
+    import app as openhowl
+
+    # Started once, so every request shares one event loop (and render pool) as in the server
+    with TestClient(openhowl.app) as client:
+        for seconds in profile["clips"]:
+            path = write_clip(os.path.join(workdir, "fixtures"), seconds)
+            sound = client.post("/sounds", json={
+                "name": f"bench {seconds}s", "file_path": path, "length": int(seconds * 1000),
+                "effects": {"echo": True, "lowpass": True}, "volume": 80,
+            }).json()
+            url = f"/sounds/preview/{sound['id']}"
+            n = repeats_for(seconds, repeats)
+
+            def cold():
+                assert client.get(url).status_code == 200
+
+            def invalidate():
+                openhowl.render_cache.invalidate(openhowl.content_id(sound["file_path"]))
+
+            results.record(name, {"clip_s": seconds, "cache": "cold"}, repeat(cold, n, setup=invalidate))
+
+            def burst():
+                with ThreadPoolExecutor(concurrent) as pool:
+                    codes = list(pool.map(lambda _: client.get(url).status_code, range(concurrent)))
+                assert codes == [200] * concurrent
+
+            results.record(name, {"clip_s": seconds, "cache": "cold", "concurrent": concurrent},
+                           repeat(burst, n, setup=invalidate))
+            results.record(name, {"clip_s": seconds, "cache": "warm"}, repeat(cold, repeats))
+
+            etag = client.get(url).headers["etag"]
+            results.record(name, {"clip_s": seconds, "cache": "304"},
+                           repeat(lambda: client.get(url, headers={"If-None-Match": etag}), repeats))
+
+
+def bench_effects(results: Results, profile: dict, effect_seconds: float, repeats: int):
+    """apply_effects for every combination of effect flags."""
+    from audioHandler import apply_effects
+
+    clip = synthetic_clip(effect_seconds)
+    for combo in effect_combinations():
+        effects = {name: True for name in combo}
+        label = "+".join(combo) or "none"
+        results.record("effects", {"clip_s": effect_seconds, "chain": label},
+                       repeat(lambda: apply_effects(clip, effects, 80), repeats))
+
+    # Single full chain across every fixture length, to see how it scales
+    everything = {name: True for name in EFFECT_NAMES}
+    for seconds in profile["clips"]:
+        clip = synthetic_clip(seconds)
+        results.record("effects_scaling", {"clip_s": seconds},
+                       repeat(lambda: apply_effects(clip, everything, 80), repeats_for(seconds, repeats)))
+
+
+def bench_store(results: Results, profile: dict, workdir: str, repeats: int, threads: int):
+    """SoundStore load, bulk insert, and updates/reads under concurrent mutation."""
+    from soundStore import SoundStore
+
+    for count in profile["libraries"]:
+        sounds = synthetic_library(count)
+        db_path = os.path.join(workdir, f"store_{count}.db")
+
+        def fresh():
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+
+        def bulk_insert():
+            store = SoundStore(db_path)
+            store.add_many(sounds)
+            store._conn.close()
+
+        results.record("store_add_many", {"sounds": count}, repeat(bulk_insert, repeats, setup=fresh))
+
+        def load():
+            store = SoundStore(db_path)
+            assert len(store) == count
+            store._conn.close()
+
+        results.record("store_load", {"sounds": count}, repeat(load, repeats))
+
+        # Writers update random sounds while readers list the library, like
+        # several admins editing while every browser polls /sounds
+        store = SoundStore(db_path)
+        updates_per_thread = 50
+        update_latency = []
+        read_latency = []
+        stop = threading.Event()
+        lock = threading.Lock()
+
+        def writer(seed):
+            rng = random.Random(seed)
+            local = []
+            for _ in range(updates_per_thread):
+                sound = sounds[rng.randrange(count)].copy()
+                sound.volume = rng.randint(0, 100)
+                start = time.perf_counter()
+                store.update(sound)
+                local.append(time.perf_counter() - start)
+            with lock:
+                update_latency.extend(local)
+
+        def reader():
+            local = []
+            while not stop.is_set():
+                start = time.perf_counter()
+                [s.dict() for s in store.all()]
+                local.append(time.perf_counter() - start)
+            with lock:
+                read_latency.extend(local)
+
+        readers = [threading.Thread(target=reader) for _ in range(max(1, threads // 2))]
+        writers = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for t in readers + writers:
+            t.start()
+        for t in writers:
+            t.join()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        for t in readers:
+            t.join()
+        store._conn.close()
+
+        params = {"sounds": count, "threads": threads}
+        results.record("store_update_concurrent", params, update_latency,
+                       updates_per_s=len(update_latency) / elapsed)
+        results.record("store_read_concurrent", params, read_latency or [0.0])
+
+
+def bench_transcode(results: Results, profile: dict, workdir: str, workers: int, files: int):
+    """standardize_audio over a batch of uploads on a process pool, like POST /sounds/upload."""
+    from audioHandler import standardize_audio
+
+    for seconds in [s for s in profile["clips"] if s <= 180]:
+        params = {"clip_s": seconds, "files": files, "workers": workers}
+        if not shutil.which("ffmpeg"):
+            results.skip("transcode", params, "ffmpeg not installed")
+            continue
+
+        src = write_clip(os.path.join(workdir, "fixtures"), seconds)
+        out_dir = os.path.join(workdir, "transcode")
+        os.makedirs(out_dir, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            start = time.perf_counter()
+            futures = [
+                pool.submit(standardize_audio, src, os.path.join(out_dir, f"{i}.mp3"), "wav",
+                            os.path.join(out_dir, f"{i}.peaks"))
+                for i in range(files)
+            ]
+            per_file = []
+            for future in futures:
+                future.result()
+                per_file.append(time.perf_counter() - start)
+            elapsed = time.perf_counter() - start
+        results.record("transcode", params, per_file,
+                       files_per_s=files / elapsed, audio_x_realtime=files * seconds / elapsed)
+
+
+def bench_events(results: Results, profile: dict, events: int, repeats: int):
+    """broadcast_event fan-out through the EventHub to N simulated SSE clients."""
+    from eventHub import EventHub
+
+    async def run(clients: int):
+        hub = EventHub(max_pending=max(256, events))
+        hub.attach(asyncio.get_running_loop())
+        subscribers = [hub.subscribe() for _ in range(clients)]
+        received = [0] * clients
+
+        async def consume(i, client):
+            while received[i] < events:
+                frames = await client.next_frames(5.0)
+                received[i] += len(frames)
+
+        # Distinct sounds so nothing is coalesced away; the count checks delivery
+        consumers = [asyncio.create_task(consume(i, c)) for i, c in enumerate(subscribers)]
+        start = time.perf_counter()
+        for i in range(events):
+            hub.publish({"sound_id": f"sound-{i}", "state": "playing" if i % 2 else "stopped"})
+            if i % 16 == 0:
+                await asyncio.sleep(0)
+        publish_time = time.perf_counter() - start
+        await asyncio.gather(*consumers)
+        return publish_time, time.perf_counter() - start
+
+    for clients in profile["clients"]:
+        publish_times, delivery_times = [], []
+        for _ in range(repeats):
+            publish_time, delivery_time = asyncio.run(run(clients))
+            publish_times.append(publish_time / events)
+            delivery_times.append(delivery_time)
+        params = {"clients": clients, "events": events}
+        results.record("events_publish_per_event", params, publish_times)
+        results.record("events_delivery", params, delivery_times,
+                       frames_per_s=clients * events / statistics.median(delivery_times))
+
+
+# Compare
+
+def compare(base_path: str, head_path: str, threshold: float) -> int:
+    with open(base_path) as f:
+        base = {c["id"]: c for c in json.load(f)["cases"] if "median" in c}
+    with open(head_path) as f:
+        head = {c["id"]: c for c in json.load(f)["cases"] if "median" in c}
+
+    regressions = 0
+    print(f"{'case':<62} {'base ms':>10} {'head ms':>10} {'change':>8}")
+    for case in sorted(base.keys() & head.keys()):
+        before, after = base[case]["median"], head[case]["median"]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  SLOWER"
+            regressions += 1
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{case:<62} {before * 1000:>10.2f} {after * 1000:>10.2f} {change:>+7.1%}{flag}")
+
+    for case in sorted(base.keys() - head.keys()):
+        print(f"{case:<62} only in {base_path}")
+    for case in sorted(head.keys() - base.keys()):
+        print(f"{case:<62} only in {head_path}")
+    print(f"\n{regressions} case(s) slower by more than {threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def run_metadata() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "ffmpeg": bool(shutil.which("ffmpeg")),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="Small fixtures only (no hour-long track or 10k library)")
+    parser.add_argument("--only", nargs="+", choices=GROUPS, default=GROUPS)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--effect-seconds", type=float, default=30, help="Clip length for the effect combinations")
+    parser.add_argument("--preview-concurrency", type=int, default=8, help="Simultaneous requests in the burst case")
+    parser.add_argument("--store-threads", type=int, default=4)
+    parser.add_argument("--transcode-files", type=int, default=8)
+    parser.add_argument("--transcode-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--events", type=int, default=200, help="Events published per fan-out run")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"), help="Compare two result files and exit")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown --compare reports as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+
+    profile = PROFILES["quick" if args.quick else "full"]
+    results = Results()
+    output = os.path.abspath(args.output) if args.output else None
+
+    # app.py keeps its library, sounds and caches relative to the working directory
+    workdir = tempfile.mkdtemp(prefix="openhowl-bench-")
+    os.makedirs(os.path.join(workdir, "fixtures"))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        if "preview" in args.only:
+            print("preview")
+            bench_preview(results, profile, workdir, args.repeats, args.preview_concurrency)
+        if "effects" in args.only:
+            print("effects")
+            bench_effects(results, profile, args.effect_seconds, args.repeats)
+        if "store" in args.only:
+            print("store")
+            bench_store(results, profile, workdir, args.repeats, args.store_threads)
+        if "transcode" in args.only:
+            print("transcode")
+            bench_transcode(results, profile, workdir, args.transcode_workers, args.transcode_files)
+        if "events" in args.only:
+            print("events")
+            bench_events(results, profile, args.events, args.repeats)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"meta": {**run_metadata(), "profile": "quick" if args.quick else "full",
+                                "args": vars(args)}, "cases": results.cases}, f, indent=2)
+        print(f"Wrote {len(results.cases)} cases to {output}")
+
+
+if __name__ == "__main__":
+    main()
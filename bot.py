@@ -0,0 +1,371 @@
+"""
+The Discord bot process. With OPENHOWL_ROLE=api the API runs as several stateless
+uvicorn workers and this process owns the bot and every voice connection:
+
+    python bot.py
+    OPENHOWL_ROLE=api uvicorn app:app --workers 4
+
+Workers send play/stop to it over the bus socket (OPENHOWL_BUS_SOCKET) and get
+playback and library events back from it. Without OPENHOWL_ROLE the API runs the
+bot itself, as a single worker.
+"""
+import os
+import time
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+
+import discord
+from discord.ext import commands
+
+import metrics
+from voiceAudio import CHANNELS, SAMPLE_RATE, MixerSource
+from voicePool import VoicePool
+from playbackScheduler import PlaybackEntry, PlaybackRejected, PlaybackScheduler
+
+
+class VoiceError(Exception):
+    """A play/stop request that can't be served, with the HTTP status to answer with (and when to retry)."""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+class VoiceService:
+    """
+    The Discord side of OpenHowl: the bot, its warm voice connections, one
+    mixer per guild so sounds can overlap, and the playback scheduler every play
+    goes through (`limits` are its options). Lives in exactly one process.
+    `find_sound(id)` and `render_pcm(sound)` come from the library, and
+    `broadcast(data, event)` publishes playing/stopped and queue events.
+    Given a `voice_pool` (a FakeVoicePool) it plays into that instead of logging in.
+    """
+
+    def __init__(self, token: str, find_sound: Callable[[str], Optional[dict]],
+                 render_pcm: Callable[[dict], Awaitable[bytes]], broadcast: Callable[..., None],
+                 idle_timeout: float = 900, prewarm: bool = True, limits: Optional[dict] = None,
+                 voice_pool=None):
+        self.token = token
+        self.find_sound = find_sound
+        self.render_pcm = render_pcm
+        self.broadcast = broadcast
+        self.prewarm = prewarm
+        self.ready = False
+
+        intents = discord.Intents.default()
+        intents.message_content = True
+        self.bot = commands.Bot(command_prefix="/OpenHowl ", description="Discord Bot for OpenHowl Soundboard",
+                                intents=intents)
+        self.mixers = {}
+        # Warm voice connections, one per guild
+        self.simulated = voice_pool is not None
+        self.voice_pool = voice_pool or VoicePool(
+            self.bot,
+            idle_timeout=idle_timeout,
+            is_busy=lambda guild_id: guild_id in self.mixers and self.mixers[guild_id].has_voices(),
+        )
+        self.voice_clients = self.voice_pool.clients
+        self.playback = PlaybackScheduler(self._resolve_guild, self._start_voice, self._stop_voices,
+                                          on_queue_change=self._queue_changed, **(limits or {}))
+        self._register_events()
+
+        metrics.Callback("openhowl_voice_connections", "Connected voice clients",
+                         lambda: sum(1 for vc in self.voice_clients.values() if vc.is_connected()))
+        metrics.Callback("openhowl_active_voices", "Sounds currently playing across all guilds",
+                         lambda: sum(len(m.active_voices()) for m in list(self.mixers.values())))
+        metrics.Callback("openhowl_playback_requests_total", "Play requests by outcome: started, queued, "
+                         "answered by an identical recent request, or refused", lambda: dict(self.playback.counts),
+                         kind="counter", labels=("result",))
+        metrics.Callback("openhowl_playback_queued", "Play requests waiting in guild queues",
+                         lambda: self.playback.queued)
+
+    def start(self):
+        """Log the bot in, in the background."""
+        self.ready = True
+        self.playback.attach(asyncio.get_running_loop())
+        if self.simulated:
+            self.voice_pool.start()
+            return
+        asyncio.create_task(self.bot.start(self.token))
+
+    async def stop(self):
+        if self.ready:
+            await self.voice_pool.stop()
+
+    def get_mixer(self, guild_id: int) -> MixerSource:
+        if guild_id not in self.mixers:
+            self.mixers[guild_id] = MixerSource(on_first_frame=metrics.PLAY_FIRST_FRAME.observe)
+        return self.mixers[guild_id]
+
+    def start_mixer(self, voice_client, mixer: MixerSource):
+        """
+        Make sure the guild's mixer is the voice client's running source.
+        The mixer ends itself when it runs out of voices; if a voice slipped in
+        while it was shutting down, the after hook starts it again.
+        """
+        if voice_client.is_playing() or not voice_client.is_connected():
+            return
+
+        def after_mixer(error=None):
+            if error:
+                print(f"Mixer playback error: {error}")
+            if mixer.has_voices():
+                voice_client.loop.call_soon_threadsafe(self.start_mixer, voice_client, mixer)
+
+        try:
+            voice_client.play(mixer, after=after_mixer)
+        except discord.ClientException:
+            # The previous run hasn't finished tearing down, its after hook restarts us
+            pass
+
+    async def play(self, sound: dict, guild_id: Optional[int] = None, channel_id: Optional[int] = None,
+                   requested_at: Optional[float] = None, requester: str = "anonymous", mode: str = "mix",
+                   priority: int = 0) -> dict:
+        """
+        Ask the playback scheduler to play a sound in a guild's voice channel (see
+        PlaybackScheduler for debouncing, rate limits and modes). Pass guild_id (and
+        optionally channel_id) to target a specific server; otherwise any live
+        connection is used. `requester` identifies the client for rate limiting.
+        """
+        if not self.ready:
+            raise VoiceError(503, "Discord bot not ready")
+        try:
+            return await self.playback.submit(sound, guild_id, channel_id, requester, mode, priority, requested_at)
+        except PlaybackRejected as e:
+            raise VoiceError(e.status, e.message, e.retry_after)
+
+    async def _connect(self, guild_id: Optional[int], channel_id: Optional[int]):
+        try:
+            return await self.voice_pool.get(guild_id, channel_id)
+        except LookupError as e:
+            raise VoiceError(400, str(e))
+        except ConnectionError as e:
+            raise VoiceError(503, str(e))
+
+    async def _resolve_guild(self, guild_id: Optional[int], channel_id: Optional[int]) -> int:
+        return (await self._connect(guild_id, channel_id))[0]
+
+    async def _start_voice(self, entry: PlaybackEntry):
+        """Mix a scheduled sound into its guild's voice channel. Returns its voice id and length in seconds."""
+        guild_id, voice_client = await self._connect(entry.guild_id, entry.channel_id)
+
+        # Render (or fetch from cache) as 48kHz PCM and hand it to the voice client directly
+        pcm = await self.render_pcm(entry.sound)
+        if entry.state != "starting":
+            return None, 0.0  # Stopped while connecting or rendering
+        sound_id = entry.sound["id"]
+
+        def after_playback(sid=sound_id):
+            self.broadcast({"sound_id": sid, "state": "stopped"})
+            self.playback.finished(entry)
+
+        # Mix into the guild's running mixer instead of replacing the current sound
+        mixer = self.get_mixer(guild_id)
+        voice_id = mixer.add(pcm, sound_id=sound_id, after=after_playback, requested_at=entry.requested_at)
+        self.start_mixer(voice_client, mixer)
+
+        # GUI feedback
+        self.broadcast({"sound_id": sound_id, "state": "playing"})
+        return voice_id, len(pcm) / (SAMPLE_RATE * CHANNELS * 2)
+
+    def _stop_voices(self, guild_id: int, voice_ids: List[int]):
+        """Stop voices the scheduler preempted."""
+        mixer = self.mixers.get(guild_id)
+        for voice_id in voice_ids:
+            sound_id = mixer.stop_voice(voice_id) if mixer else None
+            if sound_id is not None:
+                self.broadcast({"sound_id": sound_id, "state": "stopped"})
+
+    def _queue_changed(self, guild_id: int):
+        self.broadcast({"guild_id": guild_id, "queue": self.playback.snapshot(guild_id)[0]["queued"]}, "queue")
+
+    def queue(self, guild_id: Optional[int] = None) -> dict:
+        """What is playing and queued, per guild."""
+        return {"guilds": self.playback.snapshot(guild_id)}
+
+    def dequeue(self, entry_id: int) -> dict:
+        """Drop a queued request before it plays."""
+        if not self.playback.remove(entry_id):
+            raise VoiceError(404, f"No queued request {entry_id}")
+        return {"message": f"Removed request {entry_id} from the queue"}
+
+    def stop_playback(self, voice_id: Optional[int] = None, guild_id: Optional[int] = None) -> dict:
+        """
+        Stop one voice (voice_id), everything in one guild (guild_id), or everything.
+        Stopping everything in a guild also empties its queue.
+        """
+        if not self.ready:
+            raise VoiceError(503, "Discord bot is not initialized")
+
+        mixers = self.mixers
+        targets = [mixers[guild_id]] if guild_id in mixers else [] if guild_id is not None else list(mixers.values())
+
+        # Stop a single voice
+        if voice_id is not None:
+            for mixer in targets:
+                sound_id = mixer.stop_voice(voice_id)
+                if sound_id is not None:
+                    self.playback.stopped([voice_id])
+                    self.broadcast({"sound_id": sound_id, "state": "stopped"})
+                    return {"message": f"Stopped voice {voice_id}"}
+            return {"message": "No active playback to stop"}
+
+        # Stop everything in the targeted guilds, without starting what was queued behind it
+        dropped = self.playback.clear(guild_id)
+        stopped = False
+        for mixer in targets:
+            voices = mixer.stop_all()
+            if voices:
+                self.playback.stopped(voices)
+                stopped = True
+        if stopped:
+            self.broadcast({"state": "stopped"})
+            return {"message": "Stopped all Discord audio playback"}
+        if dropped:
+            return {"message": f"Cleared {dropped} queued sounds"}
+        return {"message": "No active playback to stop"}
+
+    def _register_events(self):
+        bot = self.bot
+        voice_pool = self.voice_pool
+
+        @bot.event
+        async def on_ready():
+            print(f'Logged in as {bot.user.name}')
+            print(f'Bot ID: {bot.user.id}')
+            # on_ready fires again after gateway reconnects, only start the pool once
+            if voice_pool._watchdog is None:
+                voice_pool.start()
+            if self.prewarm:
+                await voice_pool.prewarm()
+
+        @bot.event
+        async def on_voice_state_update(member, before, after):
+            # Someone joined voice: connect now so their first click doesn't pay for the handshake
+            if self.prewarm and not member.bot and after.channel and not before.channel:
+                await voice_pool.prewarm(member.guild)
+
+        @bot.command()
+        async def join(ctx):
+            """ Join the user's voice channel """
+            if ctx.author.voice is None or ctx.author.voice.channel is None:
+                await ctx.send("You must be in a voice channel for me to join!")
+                return
+
+            channel = ctx.author.voice.channel
+            try:
+                await voice_pool.connect(ctx.guild.id, channel.id)
+            except (LookupError, ConnectionError) as e:
+                await ctx.send(f"Could not join {channel.name}: {e}")
+                return
+
+            await ctx.send(f"Joined {channel.name}!")
+
+        @bot.command()
+        async def leave(ctx):
+            """ Leave the voice channel """
+            if ctx.guild.id in self.voice_clients and self.voice_clients[ctx.guild.id].is_connected():
+                await voice_pool.disconnect(ctx.guild.id)
+                self.playback.clear(ctx.guild.id)
+                if ctx.guild.id in self.mixers:
+                    self.playback.stopped(self.mixers.pop(ctx.guild.id).stop_all())
+                await ctx.send("Disconnected from voice channel.")
+            else:
+                await ctx.send("I'm not connected to any voice channel!")
+
+        @bot.command()
+        async def play(ctx, sound_id: str):
+            """ Play a sound from the API in Discord Voice Chat """
+            # Ensure bot is in voice channel, preferring the caller's
+            channel_id = ctx.author.voice.channel.id if ctx.author.voice and ctx.author.voice.channel else None
+            try:
+                await voice_pool.connect(ctx.guild.id, channel_id)
+            except (LookupError, ConnectionError) as e:
+                await ctx.send(f"Could not join voice: {e}")
+                return
+
+            sound = self.find_sound(sound_id)
+            if not sound:
+                await ctx.send(f"Sound `{sound_id}` not found.")
+                return
+
+            # Through the scheduler like web plays, rate limited per Discord user
+            try:
+                result = await self.play(sound, ctx.guild.id, channel_id, requester=f"discord:{ctx.author.id}")
+            except Exception as e:
+                await ctx.send(f"Could not play sound `{sound_id}`: {getattr(e, 'message', None) or getattr(e, 'detail', e)}")
+                return
+            if not result.get("debounced"):
+                await ctx.send(f"Playing sound `{sound_id}`")
+
+
+async def serve(api):
+    """Run the bot and the bus API workers connect to, until cancelled."""
+    from bus import BusError, BusServer
+
+    async def call_play(args: dict) -> dict:
+        # Rendered here once the scheduler takes the play (see VoiceService._start_voice).
+        # The worker's perf_counter means nothing here, so it sends how long ago the request came in.
+        requested_at = time.perf_counter() - max(time.time() - args.get("requested_wall", time.time()), 0)
+        try:
+            return await api.voice.play(args["sound"], args.get("guild_id"), args.get("channel_id"), requested_at,
+                                        args.get("requester", "anonymous"), args.get("mode", "mix"),
+                                        args.get("priority", 0))
+        except VoiceError as e:
+            raise BusError(e.status, e.message, e.retry_after)
+
+    async def call_stop(args: dict) -> dict:
+        try:
+            return api.voice.stop_playback(args.get("voice_id"), args.get("guild_id"))
+        except VoiceError as e:
+            raise BusError(e.status, e.message)
+
+    async def call_queue(args: dict) -> dict:
+        return api.voice.queue(args.get("guild_id"))
+
+    async def call_dequeue(args: dict) -> dict:
+        try:
+            return api.voice.dequeue(args["entry_id"])
+        except VoiceError as e:
+            raise BusError(e.status, e.message)
+
+    async def call_metrics(args: dict) -> dict:
+        return {"text": metrics.render()}
+
+    server = BusServer(
+        api.BUS_SOCKET,
+        {"play": call_play, "stop": call_stop, "queue": call_queue, "dequeue": call_dequeue,
+         "metrics": call_metrics},
+        on_event=api.receive_event,
+        on_signal=api.receive_signal,
+    )
+    api.bus = server
+    await server.start()
+    print(f"Bot process listening on {api.BUS_SOCKET}")
+    await api.start_background()
+    api.prerender.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.prerender.stop()
+        await api.stop_background()
+        await server.stop()
+        api.render_pool.shutdown()
+
+
+def main():
+    os.environ["OPENHOWL_ROLE"] = "bot"
+    # The library, render pipeline and voice service, without serving HTTP
+    import app as api
+    try:
+        asyncio.run(serve(api))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    # Run as the "bot" module app.py imports rather than a second copy named __main__
+    import bot
+    bot.main()
@@ -0,0 +1,114 @@
+import os
+import tarfile
+import zipfile
+from typing import Iterator, List, Optional
+
+from uploads import ReceivedFile
+
+# Entries with these extensions are imported from archives, everything else is skipped
+AUDIO_EXTENSIONS = {
+    ".mp3", ".wav", ".ogg", ".oga", ".opus", ".flac", ".m4a", ".aac", ".mp4",
+    ".webm", ".wma", ".aif", ".aiff",
+}
+COPY_CHUNK = 1024 * 1024
+
+
+class ImportEntry:
+    """One audio file to import: a direct upload or an archive member extracted to a temp file."""
+
+    def __init__(self, name: str, source: str, path: Optional[str] = None, error: Optional[str] = None):
+        self.name = name
+        self.source = source
+        self.path = path
+        self.error = error
+
+
+def _sound_name(filename: str) -> str:
+    return os.path.splitext(os.path.basename(filename))[0].strip() or "Untitled"
+
+
+def _is_audio_member(filename: str) -> bool:
+    base = os.path.basename(filename)
+    # Skip macOS resource forks and other hidden files archives tend to carry
+    if not base or base.startswith(".") or "__MACOSX/" in filename:
+        return False
+    return os.path.splitext(base)[1].lower() in AUDIO_EXTENSIONS
+
+
+def _copy_limited(src, dst_path: str, max_bytes: int):
+    """Copy a member stream to disk, giving up once it passes max_bytes (zip bombs, bogus headers)."""
+    written = 0
+    with open(dst_path, "wb") as dst:
+        while True:
+            chunk = src.read(COPY_CHUNK)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > max_bytes:
+                raise ValueError("File too large")
+            dst.write(chunk)
+
+
+def iter_entries(files: List[ReceivedFile], dest_dir: str, prefix: str, max_entry_bytes: int) -> Iterator[ImportEntry]:
+    """
+    Yield an entry per audio file in the uploaded files. Zip and tar archives are
+    read member by member, each extracted to its own temp file just before it is
+    yielded, so transcoding can start while the rest of the archive is unpacked.
+    Member names are only used for sound names, never as paths.
+    """
+    extracted = 0
+
+    def extract(src, member_name: str, source: str) -> ImportEntry:
+        nonlocal extracted
+        ext = os.path.splitext(member_name)[1].lower()
+        path = os.path.join(dest_dir, f"{prefix}_x{extracted}{ext}")
+        extracted += 1
+        try:
+            _copy_limited(src, path, max_entry_bytes)
+        except (OSError, ValueError, zipfile.BadZipFile, tarfile.TarError) as e:
+            if os.path.exists(path):
+                os.remove(path)
+            return ImportEntry(_sound_name(member_name), source, error=str(e))
+        return ImportEntry(_sound_name(member_name), source, path=path)
+
+    for received in files:
+        ext = os.path.splitext(received.filename)[1].lower()
+        if ext in AUDIO_EXTENSIONS:
+            yield ImportEntry(_sound_name(received.filename), received.filename, path=received.path)
+            continue
+
+        try:
+            if zipfile.is_zipfile(received.path):
+                with zipfile.ZipFile(received.path) as archive:
+                    for info in archive.infolist():
+                        if info.is_dir() or not _is_audio_member(info.filename):
+                            continue
+                        source = f"{received.filename}/{info.filename}"
+                        if info.file_size > max_entry_bytes:
+                            yield ImportEntry(_sound_name(info.filename), source, error="File too large")
+                            continue
+                        with archive.open(info) as member:
+                            yield extract(member, info.filename, source)
+            elif tarfile.is_tarfile(received.path):
+                # Stream mode reads compressed tars front to back without seeking
+                with tarfile.open(received.path, "r|*") as archive:
+                    for info in archive:
+                        if not info.isfile() or not _is_audio_member(info.name):
+                            continue
+                        source = f"{received.filename}/{info.name}"
+                        if info.size > max_entry_bytes:
+                            yield ImportEntry(_sound_name(info.name), source, error="File too large")
+                            continue
+                        yield extract(archive.extractfile(info), info.name, source)
+            else:
+                # Unknown extension: let ffmpeg decide whether it's audio
+                yield ImportEntry(_sound_name(received.filename), received.filename, path=received.path)
+        except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+            yield ImportEntry(_sound_name(received.filename), received.filename, error=f"Could not read archive: {e}")
+
+
+def remove_temp_files(dest_dir: str, prefix: str):
+    """Remove anything left behind by an import with this temp prefix."""
+    for name in os.listdir(dest_dir):
+        if name.startswith(f"{prefix}_"):
+            os.remove(os.path.join(dest_dir, name))
@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import asyncio
+import itertools
+import threading
+from typing import Awaitable, Callable, Dict, Optional
+
+# Messages are JSON, one per line:
+#   {"type": "event", "event": name or null, "data": {...}, "id": n}
+#       Published by anyone. The server numbers it and relays it to every client,
+#       so all workers see the same events under the same ids (SSE Last-Event-ID).
+#   {"type": "signal", "op": "...", "args": {...}}
+#       Relayed to every client like an event, but internal (e.g. "cancel this job").
+#   {"type": "call", "call": n, "op": "...", "args": {...}}
+#       A client asking the server process to do something (play, stop).
+#   {"type": "reply", "call": n, "ok": true, "result": {...}}
+#   {"type": "reply", "call": n, "ok": false, "status": 503, "error": "..."}
+
+# Messages queued for a client before it is considered stuck and disconnected
+CLIENT_BUFFER = 4096
+MAX_LINE = 16 * 1024 * 1024
+
+
+class BusError(Exception):
+    """A failed call, with the HTTP status the API should answer with (and when to retry)."""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+def _encode(message: dict) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+class _Peer:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.queue: asyncio.Queue = asyncio.Queue(CLIENT_BUFFER)
+        self.task: Optional[asyncio.Task] = None
+
+    def send(self, line: bytes) -> bool:
+        try:
+            self.queue.put_nowait(line)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def drain(self):
+        while True:
+            line = await self.queue.get()
+            self.writer.write(line)
+            await self.writer.drain()
+
+
+class BusServer:
+    """
+    The bus end in the bot process. Numbers and relays events and signals to every
+    connected API worker and answers their calls with `handlers[op](args)`.
+    Events and signals are also handed to `on_event(id, event, data)` and
+    `on_signal(op, args)` in this process. publish() is safe from any thread.
+    """
+
+    def __init__(self, path: str, handlers: Dict[str, Callable[[dict], Awaitable[dict]]],
+                 on_event: Callable[[int, Optional[str], dict], None] = None,
+                 on_signal: Callable[[str, dict], None] = None):
+        self.path = path
+        self.handlers = handlers
+        self.on_event = on_event
+        self.on_signal = on_signal
+        # Ids continue above anything a previous run handed out, so clients resuming
+        # with an old Last-Event-ID see a gap and resync instead of missing events
+        self._ids = itertools.count(int(time.time() * 1000))
+        self._peers = []
+        self._server = None
+        self._loop = None
+        self._loop_thread = None
+
+    @property
+    def client_count(self) -> int:
+        return len(self._peers)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        if os.path.exists(self.path):
+            os.remove(self.path)  # left over from a previous run
+        self._server = await asyncio.start_unix_server(self._serve, self.path, limit=MAX_LINE)
+        os.chmod(self.path, 0o600)
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for peer in list(self._peers):
+            peer.writer.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def publish(self, data: dict, event: Optional[str] = None) -> bool:
+        if self._loop is None:
+            return False
+        if threading.get_ident() != self._loop_thread:
+            self._loop.call_soon_threadsafe(self._relay, {"type": "event", "event": event, "data": data})
+        else:
+            self._relay({"type": "event", "event": event, "data": data})
+        return True
+
+    def signal(self, op: str, args: dict) -> bool:
+        self._relay({"type": "signal", "op": op, "args": args})
+        return True
+
+    def _relay(self, message: dict):
+        if message["type"] == "event":
+            message["id"] = next(self._ids)
+            if self.on_event:
+                self.on_event(message["id"], message["event"], message["data"])
+        elif self.on_signal:
+            self.on_signal(message["op"], message["args"])
+
+        line = _encode(message)
+        for peer in list(self._peers):
+            if not peer.send(line):
+                # Stuck worker: drop it, it reconnects and its SSE clients resync
+                print("Bus client fell behind, disconnecting it")
+                peer.writer.close()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = _Peer(writer)
+        peer.task = asyncio.create_task(peer.drain())
+        self._peers.append(peer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                kind = message.get("type")
+                if kind in ("event", "signal"):
+                    self._relay(message)
+                elif kind == "call":
+                    asyncio.create_task(self._answer(peer, message))
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError) as e:
+            print(f"Bus client error: {e}")
+        except asyncio.CancelledError:
+            pass  # shutting down
+        finally:
+            self._peers.remove(peer)
+            peer.task.cancel()
+            writer.close()
+
+    async def _answer(self, peer: _Peer, message: dict):
+        reply = {"type": "reply", "call": message.get("call")}
+        handler = self.handlers.get(message.get("op"))
+        try:
+            if handler is None:
+                raise BusError(400, f"Unknown bus call {message.get('op')}")
+            reply.update(ok=True, result=await handler(message.get("args") or {}))
+        except BusError as e:
+            reply.update(ok=False, status=e.status, error=e.message, retry_after=e.retry_after)
+        except Exception as e:
+            reply.update(ok=False, status=500, error=str(e))
+        peer.send(_encode(reply))
+
+
+class BusClient:
+    """
+    The bus end in an API worker. Connects to the bot process's socket (and keeps
+    reconnecting with backoff), delivers relayed events and signals to
+    `on_event` / `on_signal`, and sends calls. `on_connect` runs after every
+    (re)connect, to catch up on whatever was missed while disconnected.
+    """
+
+    def __init__(self, path: str, on_event: Callable[[int, Optional[str], dict], None],
+                 on_signal: Callable[[str, dict], None], on_connect: Callable[[], None] = None,
+                 max_backoff: float = 10):
+        self.path = path
+        self.on_event = on_event
+        self.on_signal = on_signal
+        self.on_connect = on_connect
+        self.max_backoff = max_backoff
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._calls = itertools.count(1)
+        self._task = None
+        self._loop = None
+        self._loop_thread = None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        if self._writer:
+            self._writer.close()
+
+    async def _run(self):
+        backoff = 0.1
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_LINE)
+            except OSError:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+
+            backoff = 0.1
+            self._writer = writer
+            print(f"Connected to bot process at {self.path}")
+            if self.on_connect:
+                self.on_connect()
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    self._dispatch(json.loads(line))
+            except (ConnectionError, ValueError) as e:
+                print(f"Bus connection error: {e}")
+            finally:
+                self._writer = None
+                writer.close()
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(BusError(503, "Lost connection to the bot process"))
+                self._pending.clear()
+            print("Disconnected from bot process, reconnecting")
+
+    def _dispatch(self, message: dict):
+        kind = message.get("type")
+        if kind == "event":
+            self.on_event(message["id"], message.get("event"), message["data"])
+        elif kind == "signal":
+            self.on_signal(message["op"], message.get("args") or {})
+        elif kind == "reply":
+            future = self._pending.pop(message.get("call"), None)
+            if future and not future.done():
+                if message.get("ok"):
+                    future.set_result(message.get("result"))
+                else:
+                    future.set_exception(BusError(message.get("status", 500), message.get("error", "Bus call failed"),
+                                                  message.get("retry_after")))
+
+    def _send(self, message: dict) -> bool:
+        if self._writer is None:
+            return False
+        self._writer.write(_encode(message))
+        return True
+
+    def publish(self, data: dict, event: Optional[str] = None) -> bool:
+        """Send an event to every worker (this one included). False if the bus is down. Safe from any thread."""
+        if self._writer is None:
+            return False
+        message = {"type": "event", "event": event, "data": data}
+        if threading.get_ident() != self._loop_thread:
+            self._loop.call_soon_threadsafe(self._send, message)
+            return True
+        return self._send(message)
+
+    def signal(self, op: str, args: dict) -> bool:
+        return self._send({"type": "signal", "op": op, "args": args})
+
+    async def call(self, op: str, args: dict, timeout: float = 30) -> dict:
+        """Ask the bot process to do something. Raises BusError with the status to answer with."""
+        call_id = next(self._calls)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[call_id] = future
+        if not self._send({"type": "call", "call": call_id, "op": op, "args": args}):
+            self._pending.pop(call_id, None)
+            raise BusError(503, "Bot process is not connected")
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise BusError(504, f"Bot process did not answer {op} in time")
+        finally:
+            self._pending.pop(call_id, None)
@@ -0,0 +1,162 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pcmStore
+
+# Names of content-addressed blobs; older libraries also have <uuid>.mp3 files
+DIGEST_NAME = re.compile(r"^[0-9a-f]{64}$")
+HASH_CHUNK = 1024 * 1024
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's bytes, the id its content is stored under."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_id(file_path: str) -> str:
+    """The id derived files (peaks, renders) of a library file are stored under: its file name stem."""
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+
+class ContentStore:
+    """
+    Library audio stored once per unique content, as <sha256>.mp3 in the sounds folder.
+    Sounds reference blobs by file_path and `references(file_path)` counts them.
+    A blob and the files derived from it (canonical PCM, peaks) are removed once
+    no sound references it.
+
+    Transcodes write to temp_* files, and `place` moves them into storage and pins
+    the blob until its sound is in the library. Placing, pinning and releasing all
+    happen under one lock, so a blob can't be released while an import is adopting it.
+    When several processes share the folder, their pins and reference counts are
+    only part of the picture: with `remove_on_release=False` releases leave files
+    to `collect`, which only removes files older than the grace period.
+    """
+
+    def __init__(self, folder: str, peaks_folder: str, references: Callable[[str], int],
+                 grace_seconds: float = 3600, remove_on_release: bool = True):
+        self.folder = folder
+        self.peaks_folder = peaks_folder
+        self.references = references
+        self.grace_seconds = grace_seconds
+        self.remove_on_release = remove_on_release
+        self._pins: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.deduplicated = 0
+        self.reclaimed_bytes = 0
+
+    def path_for(self, digest: str) -> str:
+        return os.path.normpath(os.path.join(self.folder, f"{digest}.mp3"))
+
+    def peaks_path(self, file_path: str) -> str:
+        return os.path.join(self.peaks_folder, f"{content_id(file_path)}.peaks")
+
+    def place(self, digest: str, mp3_path: str, peaks_path: Optional[str] = None,
+              pcm_path: Optional[str] = None) -> str:
+        """
+        Move a freshly transcoded mp3 (and its peaks and canonical PCM) into storage
+        under its digest and pin it. If the content is already stored, the existing
+        blob is shared and the new files are left for the caller to delete.
+        Returns the blob's file_path.
+        """
+        file_path = self.path_for(digest)
+        with self._lock:
+            self._pins[file_path] = self._pins.get(file_path, 0) + 1
+            for src, dst in ((peaks_path, self.peaks_path(file_path)), (pcm_path, pcmStore.pcm_path(file_path))):
+                if src and os.path.exists(src) and not os.path.exists(dst):
+                    os.replace(src, dst)
+            if os.path.exists(file_path):
+                self.deduplicated += 1
+                # Freshly adopted: keep other processes' collectors off it until it is referenced
+                os.utime(file_path)
+            else:
+                os.replace(mp3_path, file_path)
+        return file_path
+
+    def unpin(self, file_path: str):
+        file_path = os.path.normpath(file_path)
+        with self._lock:
+            count = self._pins.get(file_path, 0) - 1
+            if count > 0:
+                self._pins[file_path] = count
+            else:
+                self._pins.pop(file_path, None)
+
+    def release(self, file_path: str) -> bool:
+        """Remove a blob and its derived files if nothing references or pins it. Returns True if removed."""
+        return self.remove_on_release and self._release(file_path)
+
+    def _release(self, file_path: str) -> bool:
+        file_path = os.path.normpath(file_path)
+        with self._lock:
+            if self.references(file_path) or self._pins.get(file_path):
+                return False
+            for path in (file_path, pcmStore.pcm_path(file_path), self.peaks_path(file_path)):
+                self._remove(path)
+            return True
+
+    def _remove(self, path: str) -> bool:
+        """Delete a file, returning whether this call removed it."""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            print(f"Error removing {path}: {e}")
+            return False
+        self.reclaimed_bytes += size
+        return True
+
+    def _expired(self, path: str, now: float) -> bool:
+        try:
+            return now - os.path.getmtime(path) > self.grace_seconds
+        except OSError:
+            return False
+
+    def collect(self, referenced: Callable[[], Iterable[str]]) -> Dict[str, int]:
+        """
+        One garbage collection pass: remove unreferenced blobs, derived files whose
+        blob is gone, and temp files left by failed or interrupted transcodes.
+        `referenced()` returns every file_path in the library. Only files untouched for
+        the grace period are considered, so work in progress (and a server running
+        next to `manage.py gc`) is left alone. Returns the number of files removed by kind.
+        """
+        now = time.time()
+        removed = {"blobs": 0, "derived": 0, "temp": 0}
+
+        def names(folder: str) -> List[str]:
+            try:
+                return os.listdir(folder)
+            except OSError:
+                return []
+
+        for name in names(self.folder):
+            path = os.path.join(self.folder, name)
+            if name.endswith(".mp3") and not name.startswith("temp_") and self._expired(path, now):
+                if self._release(path) and not os.path.exists(path):
+                    removed["blobs"] += 1
+
+        with self._lock:
+            live = {content_id(p) for p in referenced()} | {content_id(p) for p in self._pins}
+        for folder, derived_ext in ((self.folder, ".pcm"), (self.peaks_folder, ".peaks")):
+            for name in names(folder):
+                path = os.path.join(folder, name)
+                if not os.path.isfile(path) or not self._expired(path, now):
+                    continue
+                stem, ext = os.path.splitext(name)
+                if name.startswith("temp_") or ext == ".tmp":
+                    if self._remove(path):
+                        removed["temp"] += 1
+                elif ext == derived_ext and stem not in live:
+                    if self._remove(path):
+                        removed["derived"] += 1
+        return removed
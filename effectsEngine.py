@@ -0,0 +1,222 @@
+import math
+import time
+from typing import Iterable, Iterator
+
+import numpy as np
+from scipy.signal import sosfilt, sosfilt_zi
+
+import metrics
+
+# Effect settings, tuned to match the original pydub effect chain
+ECHO_DELAY_MS = 150
+ECHO_REPEATS = 5
+ECHO_DECAY_DB = -10
+REVERSE_BOOST_DB = 5
+LOWPASS_CUTOFF = 300
+HIGHPASS_CUTOFF = 3000
+DISTORT_DRIVE_DB = 50
+DISTORT_OUTPUT_DB = -10
+
+
+def db_to_gain(db: float) -> float:
+    return 10 ** (db / 20)
+
+
+def volume_to_db(volume: int) -> float:
+    """Map the 0-100 volume slider onto -60..0 dB."""
+    return (volume / 100) * 60 - 60
+
+
+def _clip(samples: np.ndarray) -> np.ndarray:
+    """Clip to full scale in place, like pydub does when a step overflows the sample width."""
+    return np.clip(samples, -1.0, 1.0, out=samples)
+
+
+class GainStage:
+    name = "gain"
+
+    def __init__(self, db: float):
+        self.gain = db_to_gain(db)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        samples *= self.gain
+        return _clip(samples) if self.gain > 1 else samples
+
+
+class EchoStage:
+    """
+    Feed-forward delay line. The original effect was five rounds of
+    "attenuate by 10 dB, then overlay the input 150ms later", which expands to
+    (a + z^-D)^5, so it is applied here as one six-tap delay line.
+    History from the previous block is kept so the taps work across block boundaries.
+    """
+    name = "echo"
+
+    def __init__(self, frame_rate: int, channels: int):
+        self.delay = int(frame_rate * ECHO_DELAY_MS / 1000)
+        decay = db_to_gain(ECHO_DECAY_DB)
+        self.taps = [
+            math.comb(ECHO_REPEATS, k) * decay ** (ECHO_REPEATS - k)
+            for k in range(ECHO_REPEATS + 1)
+        ]
+        self.history = np.zeros((self.delay * ECHO_REPEATS, channels), dtype=np.float32)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        n = len(samples)
+        span = len(self.history)
+        padded = np.concatenate((self.history, samples))
+
+        out = samples * self.taps[0]
+        for k in range(1, len(self.taps)):
+            start = span - k * self.delay
+            out += self.taps[k] * padded[start:start + n]
+
+        self.history = padded[-span:] if span else self.history
+        return _clip(out)
+
+
+class ReverseStage:
+    """Reverse plus a small boost. Needs the whole clip, so it only works on a single block."""
+    name = "reverse"
+
+    def __init__(self):
+        self.gain = db_to_gain(REVERSE_BOOST_DB)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        samples = samples[::-1]
+        samples *= self.gain
+        return _clip(samples)
+
+
+class BiquadStage:
+    """
+    IIR filter run as second-order sections, with per-channel state carried
+    between blocks. The sections reproduce pydub's one-pole RC filters exactly
+    (b2 = a2 = 0) so the effect sounds the same, just without the Python loop.
+    """
+    name = "filter"
+
+    def __init__(self, sos: np.ndarray, channels: int, prime_with_first_sample: bool):
+        self.sos = sos
+        self.channels = channels
+        self.prime = prime_with_first_sample
+        self.zi = None
+
+    @classmethod
+    def lowpass(cls, cutoff: float, frame_rate: int, channels: int) -> "BiquadStage":
+        rc = 1.0 / (cutoff * 2 * math.pi)
+        dt = 1.0 / frame_rate
+        alpha = dt / (rc + dt)
+        sos = np.array([[alpha, 0.0, 0.0, 1.0, -(1 - alpha), 0.0]])
+        # pydub seeds the filter with the first sample, i.e. starts at steady state
+        stage = cls(sos, channels, prime_with_first_sample=True)
+        stage.name = "lowpass"
+        return stage
+
+    @classmethod
+    def highpass(cls, cutoff: float, frame_rate: int, channels: int) -> "BiquadStage":
+        rc = 1.0 / (cutoff * 2 * math.pi)
+        dt = 1.0 / frame_rate
+        alpha = rc / (rc + dt)
+        sos = np.array([[alpha, -alpha, 0.0, 1.0, -alpha, 0.0]])
+        stage = cls(sos, channels, prime_with_first_sample=False)
+        stage.name = "highpass"
+        return stage
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        if self.zi is None:
+            # zi shape: (sections, 2, channels)
+            base = sosfilt_zi(self.sos)[:, :, np.newaxis]
+            if self.prime and len(samples):
+                self.zi = base * samples[0][np.newaxis, np.newaxis, :]
+            else:
+                self.zi = np.zeros(base.shape[:2] + (self.channels,))
+        out, self.zi = sosfilt(self.sos, samples, axis=0, zi=self.zi)
+        return out.astype(np.float32, copy=False)
+
+
+class DistortStage:
+    """
+    Hard-clipping waveshaper. Equivalent to the old chain of boosting by 50 dB twice,
+    overlaying the two clipped copies and dropping 10 dB.
+    """
+    name = "distort"
+
+    def __init__(self):
+        self.drive = db_to_gain(DISTORT_DRIVE_DB)
+        self.output = db_to_gain(DISTORT_OUTPUT_DB)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        samples *= self.drive
+        _clip(samples)
+        blown_out = samples * self.drive
+        _clip(blown_out)
+        samples += blown_out
+        _clip(samples)
+        samples *= self.output
+        return samples
+
+
+def build_chain(effects: dict, volume: int, frame_rate: int, channels: int) -> list:
+    """Build the ordered list of stages for a sound's effect flags and volume."""
+    stages = [GainStage(volume_to_db(volume))]
+    if effects.get("echo", False):
+        stages.append(EchoStage(frame_rate, channels))
+    if effects.get("reverse", False):
+        stages.append(ReverseStage())
+    if effects.get("lowpass", False):
+        stages.append(BiquadStage.lowpass(LOWPASS_CUTOFF, frame_rate, channels))
+    if effects.get("highpass", False):
+        stages.append(BiquadStage.highpass(HIGHPASS_CUTOFF, frame_rate, channels))
+    if effects.get("distort", False):
+        stages.append(DistortStage())
+    return stages
+
+
+def process(samples: np.ndarray, effects: dict, volume: int, frame_rate: int) -> np.ndarray:
+    """
+    Run the effect chain over a float32 array of shape (frames, channels)
+    scaled to [-1, 1]. The input array may be modified in place.
+    """
+    for stage in build_chain(effects, volume, frame_rate, samples.shape[1]):
+        with metrics.stage(f"effect:{stage.name}"):
+            samples = stage.process(samples)
+    return samples
+
+
+def process_blocks(blocks: Iterable[np.ndarray], effects: dict, volume: int, frame_rate: int,
+                   channels: int) -> Iterator[np.ndarray]:
+    """
+    Run the effect chain over a stream of float32 blocks of shape (frames, channels),
+    yielding processed blocks as soon as they are ready. Stage state (echo history,
+    filter memory) carries across blocks. Reverse is the only stage that has to
+    collect the whole stream before it can emit anything.
+    """
+    stream = iter(blocks)
+    for stage in build_chain(effects, volume, frame_rate, channels):
+        stream = _run_stage(stage, stream)
+    return stream
+
+
+def _run_stage(stage, blocks: Iterator[np.ndarray]) -> Iterator[np.ndarray]:
+    elapsed = 0.0
+    if isinstance(stage, ReverseStage):
+        # Emit in the same block sizes we were fed, in reverse order
+        buffered = list(blocks)
+        if not buffered:
+            return
+        sizes = [len(b) for b in buffered]
+        start = time.perf_counter()
+        whole = stage.process(np.concatenate(buffered))
+        elapsed = time.perf_counter() - start
+        offset = 0
+        for size in reversed(sizes):
+            yield whole[offset:offset + size]
+            offset += size
+    else:
+        for block in blocks:
+            start = time.perf_counter()
+            block = stage.process(block)
+            elapsed += time.perf_counter() - start
+            yield block
+    metrics.record(f"effect:{stage.name}", elapsed)
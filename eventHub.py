@@ -0,0 +1,178 @@
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+
+def coalesce_key(event_data: dict, event: Optional[str]) -> Optional[Tuple]:
+    """
+    Events with the same key supersede each other: a client that hasn't read
+    "sound X playing" yet only needs the later "sound X stopped".
+    """
+    if event is None and event_data.get("state") in ("playing", "stopped"):
+        return ("state", event_data.get("sound_id"))
+    if event == "job" and "job_id" in event_data:
+        return ("job", event_data["job_id"])
+    if event and event.startswith("sound.") and "id" in event_data:
+        # Library changes carry the full sound, so the latest one is all a client needs
+        return ("sound", event_data["id"])
+    return None
+
+
+class _Event:
+    __slots__ = ("id", "key", "frame")
+
+    def __init__(self, event_id: int, key: Optional[Tuple], frame: str):
+        self.id = event_id
+        self.key = key
+        self.frame = frame
+
+
+class EventClient:
+    """One SSE connection: a bounded buffer of pending events and a wake-up flag."""
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self.evicted = False
+        self._pending = deque()
+        self._live = 0  # pending events that haven't been superseded
+        self._latest: Dict[Tuple, int] = {}  # coalesce key -> newest event id
+        self._wakeup = asyncio.Event()
+
+    def _is_current(self, event: _Event) -> bool:
+        return event.key is None or self._latest.get(event.key) == event.id
+
+    def push(self, event: _Event):
+        if self.evicted:
+            return
+        if event.key is None or event.key not in self._latest:
+            self._live += 1
+        if event.key is not None:
+            self._latest[event.key] = event.id
+
+        if self._live > self.max_pending:
+            # Slow consumer: drop it rather than buffer without bound.
+            # The browser reconnects with Last-Event-ID and catches up from the replay log.
+            self.evicted = True
+            self._pending.clear()
+            self._wakeup.set()
+            return
+
+        self._pending.append(event)
+        if len(self._pending) > 2 * self.max_pending:
+            # Lots of superseded entries (e.g. job progress), drop them now
+            self._pending = deque(e for e in self._pending if self._is_current(e))
+        self._wakeup.set()
+
+    async def next_frames(self, timeout: float) -> List[str]:
+        """Wait for pending events and return their SSE frames, skipping superseded ones."""
+        if not self._pending and not self.evicted:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return []
+        self._wakeup.clear()
+
+        frames = []
+        while self._pending:
+            event = self._pending.popleft()
+            if not self._is_current(event):
+                continue
+            if event.key is not None:
+                del self._latest[event.key]
+            self._live -= 1
+            frames.append(event.frame)
+        return frames
+
+
+class EventHub:
+    """
+    Fans events out to SSE clients.
+    Each event is serialized once and gets a monotonically increasing id. Recent
+    events are kept in a replay log so reconnecting clients can resume from
+    Last-Event-ID. publish() is safe to call from any thread (e.g. Discord voice
+    callbacks); work is always handed to the event loop.
+    Events relayed by the bus arrive with an id already assigned, the same in
+    every worker, so a client can resume on whichever worker it reconnects to.
+    """
+
+    def __init__(self, max_pending: int = 256, replay_size: int = 1024):
+        self.max_pending = max_pending
+        self._replay = deque(maxlen=replay_size)
+        self._clients: List[EventClient] = []
+        # Ids continue above anything a previous run handed out, like the bus's do,
+        # so a client resuming with an old Last-Event-ID sees a gap and resyncs
+        self._next_id = int(time.time() * 1000)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread = None
+        self.evictions = 0
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Bind to the loop that serves SSE; call from that loop on startup."""
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    @property
+    def last_event_id(self) -> int:
+        return self._next_id - 1
+
+    def publish(self, event_data: dict, event: Optional[str] = None, event_id: Optional[int] = None):
+        if self._loop is not None and threading.get_ident() != self._loop_thread:
+            self._loop.call_soon_threadsafe(self._publish, event_data, event, event_id)
+        else:
+            self._publish(event_data, event, event_id)
+
+    def _publish(self, event_data: dict, event: Optional[str], event_id: Optional[int] = None):
+        if event_id is None:
+            event_id = self._next_id
+        self._next_id = max(self._next_id, event_id + 1)
+
+        frame = f"id: {event_id}\n"
+        if event:
+            frame += f"event: {event}\n"
+        frame += f"data: {json.dumps(event_data)}\n\n"
+
+        item = _Event(event_id, coalesce_key(event_data, event), frame)
+        self._replay.append(item)
+        for client in self._clients:
+            client.push(item)
+
+        # Forget clients that were evicted; their generators are already closing
+        if any(c.evicted for c in self._clients):
+            evicted = [c for c in self._clients if c.evicted]
+            self.evictions += len(evicted)
+            self._clients = [c for c in self._clients if not c.evicted]
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> EventClient:
+        client = EventClient(self.max_pending)
+        try:
+            resume_after = int(last_event_id) if last_event_id else None
+        except ValueError:
+            resume_after = None
+        if resume_after is not None and resume_after > self.last_event_id:
+            # An id we never handed out (e.g. from before the clock went back), its state can't be trusted
+            self._push_resync(client)
+        elif resume_after is not None and resume_after < self.last_event_id:
+            missed = [item for item in self._replay if item.id > resume_after]
+            complete = bool(missed) and missed[0].id == resume_after + 1
+            if complete and len(missed) <= self.max_pending:
+                for item in missed:
+                    client.push(item)
+            else:
+                # Too far behind to replay, tell the client to refetch its state
+                self._push_resync(client)
+        self._clients.append(client)
+        return client
+
+    def _push_resync(self, client: EventClient):
+        client.push(_Event(self.last_event_id, None, f"id: {self.last_event_id}\nevent: resync\ndata: {{}}\n\n"))
+
+    def unsubscribe(self, client: EventClient):
+        if client in self._clients:
+            self._clients.remove(client)
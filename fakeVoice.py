@@ -0,0 +1,203 @@
+"""
+An offline stand-in for Discord voice, for load tests and for working on playback
+without a bot token. With OPENHOWL_FAKE_VOICE_GUILDS=N the voice service skips the
+Discord login and plays into N simulated guilds instead (see benchmarks/load_playback.py).
+"""
+import time
+import asyncio
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import discord
+
+FRAME_SECONDS = 0.02
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, name: str):
+        self.id = channel_id
+        self.name = name
+
+
+class FakeVoiceClient:
+    """
+    Plays an AudioSource like discord.py's player thread does: reads a 20ms frame
+    at a time until it returns nothing, then calls `after`. At `speed` 1 frames are
+    read on the real-time cadence, at 0 as fast as the source delivers them.
+
+    Records when each frame went out, the frames that were late enough to leave a
+    gap on a real connection (underruns), the CPU time spent in read() and, for
+    a MixerSource, when each voice's first frame went out. The PCM itself is kept
+    only with `record_pcm`.
+    """
+
+    def __init__(self, guild_id: int, channel: FakeChannel, loop: asyncio.AbstractEventLoop,
+                 speed: float = 1.0, record_pcm: bool = False):
+        self.guild_id = guild_id
+        self.channel = channel
+        self.loop = loop
+        self.speed = speed
+        self.record_pcm = record_pcm
+        self.pcm = bytearray()
+        self.frame_times: List[float] = []
+        self.first_frames: Dict[int, float] = {}  # voice_id -> when its first frame went out
+        self.underruns = 0
+        self.max_lateness = 0.0
+        self.read_cpu = 0.0
+        self._connected = True
+        self._source = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def is_playing(self) -> bool:
+        return self._source is not None
+
+    def play(self, source: discord.AudioSource, *, after=None):
+        if self._source is not None:
+            raise discord.ClientException("Already playing audio.")
+        self._source = source
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, args=(source, after), daemon=True,
+                                        name=f"fake-voice-{self.guild_id}")
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    async def move_to(self, channel: FakeChannel):
+        self.channel = channel
+
+    async def disconnect(self, force: bool = False):
+        self.stop()
+        self._connected = False
+
+    def _run(self, source: discord.AudioSource, after):
+        interval = FRAME_SECONDS / self.speed if self.speed > 0 else 0
+        start = time.perf_counter()
+        frames = 0
+        error = None
+        try:
+            while not self._stopping.is_set():
+                voices = source.active_voices() if hasattr(source, "active_voices") else ()
+                cpu = time.thread_time()
+                data = source.read()
+                self.read_cpu += time.thread_time() - cpu
+                if not data:
+                    break
+                now = time.perf_counter()
+                for voice_id in voices:
+                    self.first_frames.setdefault(voice_id, now)
+                self.frame_times.append(now)
+                if self.record_pcm:
+                    self.pcm += data
+
+                frames += 1
+                if interval:
+                    # A frame later than its slot plus one frame of jitter buffer is a gap on a real connection
+                    lateness = now - (start + (frames - 1) * interval)
+                    self.max_lateness = max(self.max_lateness, lateness)
+                    if lateness > interval:
+                        self.underruns += 1
+                        start = now - (frames - 1) * interval  # resync, like discord.py's player does
+                    delay = start + frames * interval - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+        except Exception as e:
+            error = e
+        finally:
+            self._source = None
+            if after:
+                try:
+                    after(error)
+                except Exception as e:
+                    print(f"Error in fake voice after callback: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "frames": len(self.frame_times),
+            "underruns": self.underruns,
+            "max_lateness": self.max_lateness,
+            "read_cpu": self.read_cpu,
+        }
+
+
+class FakeVoicePool:
+    """
+    Stands in for VoicePool with `guilds` simulated guilds (ids 1..guilds, one voice
+    channel each) that connect instantly, or after `connect_delay` seconds.
+    """
+
+    def __init__(self, guilds: int, speed: float = 1.0, connect_delay: float = 0.0, record_pcm: bool = False):
+        self.guilds = guilds
+        self.speed = speed
+        self.connect_delay = connect_delay
+        self.record_pcm = record_pcm
+        self.clients: Dict[int, FakeVoiceClient] = {}
+        self._watchdog = None
+
+    def start(self):
+        pass
+
+    async def stop(self):
+        for guild_id in list(self.clients):
+            await self.disconnect(guild_id)
+
+    def touch(self, guild_id: int):
+        pass
+
+    async def connect(self, guild_id: int, channel_id: Optional[int] = None, attempts: int = 3) -> FakeVoiceClient:
+        if not 1 <= guild_id <= self.guilds:
+            raise LookupError(f"Bot is not in guild {guild_id}")
+        channel = FakeChannel(channel_id or guild_id * 1000, f"voice-{guild_id}")
+        voice_client = self.clients.get(guild_id)
+        if voice_client and voice_client.is_connected():
+            if voice_client.channel.id != channel.id and channel_id is not None:
+                await voice_client.move_to(channel)
+            return voice_client
+        if self.connect_delay:
+            await asyncio.sleep(self.connect_delay)
+        voice_client = FakeVoiceClient(guild_id, channel, asyncio.get_running_loop(), self.speed, self.record_pcm)
+        self.clients[guild_id] = voice_client
+        return voice_client
+
+    async def get(self, guild_id: Optional[int] = None, channel_id: Optional[int] = None) -> Tuple[int, FakeVoiceClient]:
+        if guild_id is None:
+            connected = [gid for gid, vc in self.clients.items() if vc.is_connected()]
+            guild_id = connected[0] if connected else 1
+        return guild_id, await self.connect(guild_id, channel_id)
+
+    async def disconnect(self, guild_id: int):
+        voice_client = self.clients.pop(guild_id, None)
+        if voice_client:
+            await voice_client.disconnect()
+
+    async def prewarm(self, guild=None):
+        pass
+
+    def first_frames(self) -> Dict[int, float]:
+        """voice_id -> when its first frame went out, across every guild."""
+        merged = {}
+        for voice_client in list(self.clients.values()):
+            merged.update(voice_client.first_frames)
+        return merged
+
+
+class FakeContext:
+    """Just enough of a command context to run the bot's commands (play, join) against a simulated guild."""
+
+    class _Named:
+        def __init__(self, id: int, **attrs):
+            self.id = id
+            self.__dict__.update(attrs)
+
+    def __init__(self, guild_id: int, user_id: int = 1, channel_id: Optional[int] = None):
+        channel = FakeChannel(channel_id or guild_id * 1000, f"voice-{guild_id}")
+        self.guild = self._Named(guild_id)
+        self.author = self._Named(user_id, voice=self._Named(0, channel=channel))
+        self.replies: List[str] = []
+
+    async def send(self, message: str):
+        self.replies.append(message)
@@ -0,0 +1,83 @@
+import asyncio
+from typing import Awaitable, Callable, Dict
+
+from jobs import Job, JobRegistry
+
+
+class IngestQueue:
+    """
+    Background queue for slow imports (YouTube downloads).
+    A fixed number of worker tasks run jobs one at a time each, repeated requests
+    for a URL that is already queued or running get the existing job back, and
+    jobs can be cancelled whether they are still queued or already running.
+    """
+
+    def __init__(self, jobs: JobRegistry, run_job: Callable[[Job], Awaitable[None]], workers: int = 2):
+        self.jobs = jobs
+        self.run_job = run_job
+        self.workers = max(1, workers)
+        self._queue: asyncio.Queue = None
+        self._tasks = []
+        self._active_by_url: Dict[str, Job] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._stopping = False
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        self._stopping = True
+        for task in list(self._running.values()) + self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def submit(self, url: str, **meta) -> Job:
+        """Queue a URL, or return the job already handling it."""
+        url = url.strip()
+        existing = self._active_by_url.get(url)
+        if existing and not existing.finished:
+            return existing
+
+        job = self.jobs.create("youtube", url=url, **meta)
+        self._active_by_url[url] = job
+        self._queue.put_nowait(job)
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if not job or job.finished:
+            return False
+        task = self._running.get(job_id)
+        if task:
+            # The job's own cleanup kills the download and marks it cancelled
+            task.cancel()
+        else:
+            self.jobs.update(job, state="cancelled")
+        return True
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.finished:  # cancelled while queued
+                    continue
+                task = asyncio.create_task(self.run_job(job))
+                self._running[job.id] = task
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    self.jobs.update(job, state="cancelled")
+                    if self._stopping:
+                        raise
+                except Exception as e:
+                    self.jobs.update(job, state="failed", detail=str(e))
+            finally:
+                self._running.pop(job.id, None)
+                url = job.meta.get("url")
+                if self._active_by_url.get(url) is job:
+                    del self._active_by_url[url]
+                self._queue.task_done()
@@ -0,0 +1,109 @@
+import time
+import uuid
+from typing import Callable, Dict, Optional, Tuple
+
+import metrics
+
+# How long finished jobs stay queryable
+FINISHED_JOB_TTL = 60 * 60
+
+FINISHED_STATES = ("done", "failed", "cancelled")
+
+
+class Job:
+    """A background task (upload transcode, YouTube ingest, ...) clients can follow over SSE."""
+
+    def __init__(self, kind: str, **meta):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.state = "queued"
+        self.progress = 0.0
+        self.detail = None
+        self.result = None
+        self.meta = meta
+        self.created = time.time()
+        self.updated = self.created
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "state": self.state,
+            "progress": round(self.progress, 3),
+            "detail": self.detail,
+            "result": self.result,
+            **self.meta,
+        }
+
+
+class JobRegistry:
+    """
+    Tracks jobs and publishes every change through `publish`.
+    Must be used from the event loop thread.
+    With several API workers, each also remembers the published state of jobs
+    the others run, so any worker can answer GET /jobs/{id}.
+    """
+
+    def __init__(self, publish: Callable[[dict], None]):
+        self._jobs: Dict[str, Job] = {}
+        self._remote: Dict[str, Tuple[float, dict]] = {}  # job id -> (last update, published state)
+        self._publish = publish
+
+    def create(self, kind: str, **meta) -> Job:
+        self._prune()
+        job = Job(kind, **meta)
+        self._jobs[job.id] = job
+        self._publish(job.to_dict())
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def describe(self, job_id: str) -> Optional[dict]:
+        """The job's current state, whichever worker runs it."""
+        job = self._jobs.get(job_id)
+        if job:
+            return job.to_dict()
+        remote = self._remote.get(job_id)
+        return remote[1] if remote else None
+
+    def remember(self, data: dict):
+        """Record a published job state, unless it's one of ours."""
+        if data["job_id"] not in self._jobs:
+            if data["job_id"] not in self._remote:
+                self._prune()
+            self._remote[data["job_id"]] = (time.time(), data)
+
+    def update(self, job: Job, state: Optional[str] = None, progress: Optional[float] = None,
+               detail: Optional[str] = None, result: Optional[dict] = None):
+        if job.finished:
+            return
+        # Only publish progress in whole percent steps so big uploads don't flood SSE
+        changed = state is not None or detail is not None or result is not None
+        if progress is not None and int(progress * 100) != int(job.progress * 100):
+            changed = True
+        if state is not None:
+            job.state = state
+        if progress is not None:
+            job.progress = progress
+        if detail is not None:
+            job.detail = detail
+        if result is not None:
+            job.result = result
+        job.updated = time.time()
+        if job.finished:
+            metrics.JOB_DURATION.observe(job.updated - job.created, kind=job.kind, state=job.state)
+        if changed:
+            self._publish(job.to_dict())
+
+    def _prune(self):
+        cutoff = time.time() - FINISHED_JOB_TTL
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.updated < cutoff]:
+            del self._jobs[job_id]
+        for job_id in [i for i, (updated, data) in self._remote.items()
+                       if data["state"] in FINISHED_STATES and updated < cutoff]:
+            del self._remote[job_id]
@@ -0,0 +1,155 @@
+"""
+Maintenance commands for the sound library. Run from the OpenHowl directory.
+
+    python manage.py migrate-pcm [--workers N] [--force]
+        Write canonical PCM (sounds/<id>.pcm) for every sound that doesn't have
+        one, so plays map it instead of decoding the mp3. Existing sounds can only
+        be converted from their mp3, new uploads keep the decoded source when
+        OPENHOWL_CANONICAL_PCM=1.
+
+    python manage.py drop-pcm
+        Delete all canonical PCM files; plays fall back to decoding the mp3.
+
+    python manage.py dedupe
+        Move audio stored under per-sound names (sounds/<sound id>.mp3, from before
+        content-addressed storage) to sounds/<sha256>.mp3, so byte-identical files
+        are stored once. Stop the server first, it keeps the library in memory.
+
+    python manage.py gc [--grace SECONDS]
+        Remove unreferenced audio, renders no sound uses any more and leftover
+        temp files. The server runs the same pass every OPENHOWL_GC_INTERVAL seconds.
+"""
+import os
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+import pcmStore
+from audioHandler import convert_to_pcm
+from contentStore import ContentStore, DIGEST_NAME, content_id, file_digest
+from renderCache import RenderCache
+from soundStore import SoundStore
+
+load_dotenv(os.path.join(os.getcwd(), ".env.local"))
+
+DATABASE_FILE = "sounds.json"
+STORE_FILE = os.getenv("OPENHOWL_DB_FILE", "sounds.db")
+SOUNDS_FOLDER = "sounds"
+PEAKS_FOLDER = os.path.join(SOUNDS_FOLDER, ".peaks")
+CACHE_FOLDER = os.path.join(SOUNDS_FOLDER, ".cache")
+
+
+def migrate_pcm(store: SoundStore, workers: int, force: bool) -> int:
+    todo = []
+    for sound in store.all():
+        if not sound.file_path or not os.path.exists(sound.file_path):
+            print(f"Skipping {sound.name} ({sound.id}): file missing")
+            continue
+        if force or not os.path.exists(pcmStore.pcm_path(sound.file_path)):
+            todo.append(sound)
+
+    print(f"Converting {len(todo)} of {len(store)} sounds to canonical PCM")
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(convert_to_pcm, sound.file_path, pcmStore.pcm_path(sound.file_path)): sound
+            for sound in todo
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            sound = futures[future]
+            try:
+                length_ms = future.result()
+                print(f"[{done}/{len(todo)}] {sound.name}: {length_ms / 1000:.1f}s")
+            except Exception as e:
+                failed += 1
+                print(f"[{done}/{len(todo)}] {sound.name}: failed ({e})")
+    print(f"Done, {len(todo) - failed} converted, {failed} failed")
+    return 1 if failed else 0
+
+
+def drop_pcm(store: SoundStore) -> int:
+    removed = 0
+    for sound in store.all():
+        path = pcmStore.pcm_path(sound.file_path) if sound.file_path else None
+        if path and os.path.exists(path):
+            os.remove(path)
+            removed += 1
+    print(f"Removed {removed} canonical PCM files")
+    return 0
+
+
+def _link(src: str, dst: str):
+    """Hard link src to dst (a copy across filesystems), unless dst exists."""
+    if os.path.exists(dst) or not os.path.exists(src):
+        return
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def dedupe(store: SoundStore, blobs: ContentStore) -> int:
+    folder = os.path.normpath(SOUNDS_FOLDER)
+    moved = shared = 0
+    for file_path in store.referenced_paths():
+        if os.path.dirname(file_path) != folder or DIGEST_NAME.match(content_id(file_path)):
+            continue
+        if not os.path.exists(file_path):
+            print(f"Skipping {file_path}: file missing")
+            continue
+
+        # Link the content name in first, so the library never points at a missing file
+        target = blobs.path_for(file_digest(file_path))
+        if os.path.exists(target):
+            shared += 1
+        else:
+            moved += 1
+        _link(file_path, target)
+        _link(pcmStore.pcm_path(file_path), pcmStore.pcm_path(target))
+        _link(blobs.peaks_path(file_path), blobs.peaks_path(target))
+        for sound in store.referencing(file_path):
+            store.update(sound.copy(update={"file_path": target}))
+        blobs.release(file_path)
+    print(f"Renamed {moved} files, {shared} were duplicates of a stored file. "
+          f"Run `python manage.py gc --grace 0` to drop renders of the old names.")
+    return 0
+
+
+def gc(store: SoundStore, blobs: ContentStore) -> int:
+    removed = blobs.collect(store.referenced_paths)
+    cache = RenderCache(CACHE_FOLDER, 0)
+    removed["renders"] = cache.retain(
+        cache.make_key(s.dict(), fmt) for s in store.all() for fmt in ("mp3", "pcm")
+    )
+    print(f"Removed {removed}, {blobs.reclaimed_bytes / 1024 / 1024:.1f} MB freed")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser("migrate-pcm", help="Write canonical PCM for the existing library")
+    migrate.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    migrate.add_argument("--force", action="store_true", help="Rewrite PCM that already exists")
+    commands.add_parser("drop-pcm", help="Delete all canonical PCM files")
+    commands.add_parser("dedupe", help="Store audio under content hashes, sharing identical files")
+    collect = commands.add_parser("gc", help="Remove unreferenced audio, stale renders and temp files")
+    collect.add_argument("--grace", type=int, default=int(os.getenv("OPENHOWL_GC_GRACE", "3600")),
+                         help="Only remove files untouched for this many seconds")
+    args = parser.parse_args()
+
+    store = SoundStore(STORE_FILE, legacy_json_path=DATABASE_FILE)
+    blobs = ContentStore(SOUNDS_FOLDER, PEAKS_FOLDER, store.references, getattr(args, "grace", 3600))
+    if args.command == "migrate-pcm":
+        return migrate_pcm(store, args.workers, args.force)
+    if args.command == "dedupe":
+        return dedupe(store, blobs)
+    if args.command == "gc":
+        return gc(store, blobs)
+    return drop_pcm(store)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
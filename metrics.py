@@ -0,0 +1,214 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+JOB_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+_registry: List["_Metric"] = []
+
+# Per-request stage timings for the Server-Timing header, when a request asks for them
+_server_timings: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("server_timings", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], le: Optional[str] = None) -> str:
+    pairs = list(zip(names, values))
+    if le is not None:
+        pairs.append(("le", le))
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = []
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, str(bound))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, '+Inf')} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+
+class Callback(_Metric):
+    """A gauge or counter whose value is read from application state at scrape time."""
+
+    def __init__(self, name: str, help: str, fn: Callable[[], object], kind: str = "gauge", labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self.fn = fn
+
+    def _samples(self) -> List[str]:
+        value = self.fn()
+        if not self.labels:
+            return [f"{self.name} {_format_value(value)}"]
+        # Labelled callbacks return {label value(s): number}
+        return [
+            f"{self.name}{_format_labels(self.labels, k if isinstance(k, tuple) else (k,))} {_format_value(v)}"
+            for k, v in value.items()
+        ]
+
+
+def render() -> str:
+    """All registered metrics in Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Hot-path metrics
+
+RENDER_STAGE = Histogram(
+    "openhowl_render_stage_seconds",
+    "Time spent in each stage of rendering a sound (store lookup, decode, effects, encode)",
+    labels=("stage",),
+)
+PLAY_FIRST_FRAME = Histogram(
+    "openhowl_play_first_frame_seconds",
+    "Time from a play request to its first 20ms frame being handed to Discord",
+)
+SUBPROCESS_SPAWN = Histogram(
+    "openhowl_subprocess_spawn_seconds",
+    "Time to spawn helper processes (ffmpeg, ffplay, yt-dlp)",
+    labels=("command",),
+)
+JOB_DURATION = Histogram(
+    "openhowl_job_duration_seconds",
+    "Duration of background jobs (uploads, YouTube ingests) by outcome",
+    labels=("kind", "state"),
+    buckets=JOB_BUCKETS,
+)
+
+
+# Timings named spawn:<command> are helper process starts rather than render stages
+SPAWN_PREFIX = "spawn:"
+
+
+@contextmanager
+def stage(name: str):
+    """Time one render stage into RENDER_STAGE and, if enabled, the request's Server-Timing."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+@contextmanager
+def spawn(command: str):
+    """Time starting a helper process into SUBPROCESS_SPAWN and, if enabled, the request's Server-Timing."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(SPAWN_PREFIX + command, time.perf_counter() - start)
+
+
+def record(name: str, elapsed: float):
+    """
+    Record an already measured render stage, e.g. one summed over streamed blocks,
+    or a helper process start named spawn:<command>.
+    """
+    if name.startswith(SPAWN_PREFIX):
+        SUBPROCESS_SPAWN.observe(elapsed, command=name[len(SPAWN_PREFIX):])
+    else:
+        RENDER_STAGE.observe(elapsed, stage=name)
+    timings = _server_timings.get()
+    if timings is not None:
+        timings.append((name, elapsed))
+
+
+def start_server_timing():
+    """Start collecting stage timings for the current request."""
+    _server_timings.set([])
+
+
+def collected_timings() -> List[Tuple[str, float]]:
+    """The stage timings collected so far for the current request."""
+    return list(_server_timings.get() or [])
+
+
+def server_timing_header() -> str:
+    """Format the collected timings as a Server-Timing header value."""
+    timings = _server_timings.get() or []
+    return ", ".join(f"{name.replace(':', '-')};dur={elapsed * 1000:.2f}" for name, elapsed in timings)
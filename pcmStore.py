@@ -0,0 +1,68 @@
+import os
+import mmap
+import struct
+import numpy as np
+
+MAGIC = b"OHPC"
+VERSION = 1
+SAMPLE_WIDTH = 2
+# magic, version, channels, sample rate, frame count; padded so samples start 32-byte aligned
+HEADER = struct.Struct("<4sBBIQ")
+HEADER_SIZE = 32
+
+
+def pcm_path(file_path: str) -> str:
+    """Canonical PCM file that sits next to a library mp3."""
+    return os.path.splitext(file_path)[0] + ".pcm"
+
+
+def write_pcm(path: str, samples: np.ndarray, sample_rate: int, channels: int = 1):
+    """Write interleaved int16 samples with a header, atomically."""
+    samples = np.ascontiguousarray(samples, dtype=np.int16)
+    header = HEADER.pack(MAGIC, VERSION, channels, sample_rate, samples.size // channels)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(samples.tobytes())
+    os.replace(temp_path, path)
+
+
+class PCMClip:
+    """
+    A window of a canonical PCM file, backed directly by a read-only memory map.
+    It has the AudioSegment attributes the render path reads (raw_data, frame_rate,
+    channels, sample_width, frame_width), so it can be rendered without a decode.
+    """
+    sample_width = SAMPLE_WIDTH
+
+    def __init__(self, raw_data: memoryview, frame_rate: int, channels: int):
+        self.raw_data = raw_data
+        self.frame_rate = frame_rate
+        self.channels = channels
+
+    @property
+    def frame_width(self) -> int:
+        return self.channels * SAMPLE_WIDTH
+
+    def frame_count(self) -> int:
+        return len(self.raw_data) // self.frame_width
+
+    def __len__(self) -> int:
+        """Length in milliseconds, like AudioSegment."""
+        return round(1000 * self.frame_count() / self.frame_rate)
+
+
+def open_clip(path: str, start_ms: int = 0, end_ms: int = None) -> PCMClip:
+    """Map a PCM file and return the [start_ms, end_ms) window as a zero-copy PCMClip."""
+    with open(path, "rb") as f:
+        magic, version, channels, sample_rate, frames = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a canonical PCM file: {path}")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # Same millisecond-to-frame rounding as slicing an AudioSegment
+    start = min(max(int(start_ms * sample_rate / 1000), 0), frames)
+    end = frames if end_ms is None else min(max(int(end_ms * sample_rate / 1000), start), frames)
+    frame_width = channels * SAMPLE_WIDTH
+    view = memoryview(mapped)[HEADER_SIZE + start * frame_width:HEADER_SIZE + end * frame_width]
+    return PCMClip(view, sample_rate, channels)
@@ -0,0 +1,101 @@
+import os
+import struct
+import numpy as np
+
+# Finest level: one min/max pair per 256 samples (~5ms at 48kHz), each
+# coarser level covers 4x as many samples
+BASE_SAMPLES_PER_PEAK = 256
+LEVEL_FACTOR = 4
+MAX_LEVELS = 6
+
+MAGIC = b"OHPK"
+VERSION = 1
+# magic, version, sample rate, level count
+HEADER = struct.Struct("<4sBIB")
+# samples per peak, peak count
+LEVEL_HEADER = struct.Struct("<II")
+# sample rate, samples per peak, first peak index, peak count
+SLICE_HEADER = struct.Struct("<IIII")
+
+
+def build_pyramid(samples: np.ndarray) -> list:
+    """
+    Build min/max peak levels from mono int16 samples.
+    Returns a list of (samples_per_peak, int8 array of interleaved min/max).
+    """
+    levels = []
+    n = len(samples)
+    if n == 0:
+        return [(BASE_SAMPLES_PER_PEAK, np.zeros(0, dtype=np.int8))]
+
+    # Pad with the last sample so the final partial window doesn't invent a zero crossing
+    padded_len = -(-n // BASE_SAMPLES_PER_PEAK) * BASE_SAMPLES_PER_PEAK
+    windows = np.pad(samples, (0, padded_len - n), mode="edge").reshape(-1, BASE_SAMPLES_PER_PEAK)
+    mins = windows.min(axis=1)
+    maxs = windows.max(axis=1)
+
+    samples_per_peak = BASE_SAMPLES_PER_PEAK
+    while True:
+        pairs = np.empty(len(mins) * 2, dtype=np.int8)
+        pairs[0::2] = mins >> 8
+        pairs[1::2] = maxs >> 8
+        levels.append((samples_per_peak, pairs))
+        if len(mins) <= 1 or len(levels) >= MAX_LEVELS:
+            break
+
+        # Each coarser level is built from the one below it
+        padded_len = -(-len(mins) // LEVEL_FACTOR) * LEVEL_FACTOR
+        mins = np.pad(mins, (0, padded_len - len(mins)), mode="edge").reshape(-1, LEVEL_FACTOR).min(axis=1)
+        maxs = np.pad(maxs, (0, padded_len - len(maxs)), mode="edge").reshape(-1, LEVEL_FACTOR).max(axis=1)
+        samples_per_peak *= LEVEL_FACTOR
+    return levels
+
+
+def write_peaks(path: str, samples: np.ndarray, sample_rate: int):
+    """Build the peak pyramid for mono int16 samples and write it to `path`."""
+    levels = build_pyramid(samples)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, sample_rate, len(levels)))
+        for samples_per_peak, pairs in levels:
+            f.write(LEVEL_HEADER.pack(samples_per_peak, len(pairs) // 2))
+        for _, pairs in levels:
+            f.write(pairs.tobytes())
+    os.replace(temp_path, path)
+
+
+def read_slice(path: str, zoom: int, start_ms: int = 0, end_ms: int = None) -> bytes:
+    """
+    Read one zoom level (0 = finest) of a peaks file, limited to a time range.
+    Returns a SLICE_HEADER followed by interleaved int8 min/max pairs.
+    Raises ValueError for a file that is corrupt or truncated.
+    """
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"Truncated peaks file: {path}")
+        magic, version, sample_rate, level_count = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION or not level_count:
+            raise ValueError(f"Not a peaks file: {path}")
+
+        level_headers = f.read(LEVEL_HEADER.size * level_count)
+        if len(level_headers) < LEVEL_HEADER.size * level_count:
+            raise ValueError(f"Truncated peaks file: {path}")
+        levels = list(LEVEL_HEADER.iter_unpack(level_headers))
+        data_offset = HEADER.size + len(level_headers)
+        if os.fstat(f.fileno()).st_size < data_offset + sum(c * 2 for _, c in levels):
+            raise ValueError(f"Truncated peaks file: {path}")
+
+        zoom = min(max(zoom, 0), level_count - 1)
+        samples_per_peak, count = levels[zoom]
+
+        first = start_ms * sample_rate // (1000 * samples_per_peak)
+        last = count if end_ms is None else -(-end_ms * sample_rate // (1000 * samples_per_peak))
+        first = min(max(first, 0), count)
+        last = min(max(last, first), count)
+
+        offset = sum(c * 2 for _, c in levels[:zoom]) + first * 2
+        f.seek(data_offset + offset)
+        data = f.read((last - first) * 2)
+
+    return SLICE_HEADER.pack(sample_rate, samples_per_peak, first, last - first) + data
@@ -0,0 +1,327 @@
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+MODES = ("mix", "queue", "preempt")
+
+# Playing entries are considered over this long after their audio should have
+# ended, in case the end of a voice was never reported (e.g. the connection dropped)
+END_SLACK = 5.0
+
+_entry_ids = itertools.count(1)
+
+
+class PlaybackRejected(Exception):
+    """A play request turned away, with the HTTP status to answer with and when to retry."""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Rate limits by key: `rate` requests per second, with bursts of up to `burst`. A rate <= 0 never limits."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # key -> (tokens, updated)
+
+    def wait_time(self, key: str, now: float) -> float:
+        """Seconds until `key` may go again, 0 if it may go now."""
+        if self.rate <= 0:
+            return 0.0
+        tokens = self._tokens(key, now)
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def take(self, key: str, now: float):
+        if self.rate > 0:
+            self._buckets[key] = (self._tokens(key, now) - 1, now)
+            if len(self._buckets) > 4096:
+                self._prune(now)
+
+    def _tokens(self, key: str, now: float) -> float:
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def _prune(self, now: float):
+        # Full buckets are the same as no bucket
+        for key in [k for k in self._buckets if self._tokens(k, now) >= self.burst]:
+            del self._buckets[key]
+
+
+class PlaybackEntry:
+    def __init__(self, sound: dict, guild_id: Optional[int], channel_id: Optional[int], mode: str,
+                 priority: int, requested_at: Optional[float]):
+        self.id = next(_entry_ids)
+        self.sound = sound
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.mode = mode
+        self.priority = priority
+        self.requested_at = requested_at
+        self.requested_wall = time.time()
+        self.state = "queued"  # then "starting", "playing"
+        self.voice_id: Optional[int] = None
+        self.ends_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "sound_id": self.sound["id"],
+            "guild_id": self.guild_id,
+            "mode": self.mode,
+            "priority": self.priority,
+            "state": self.state,
+            "voice_id": self.voice_id,
+            "requested_at": self.requested_wall,
+        }
+
+
+class PlaybackScheduler:
+    """
+    Sits between play requests and the voice mixers, so a storm of clicks can't
+    turn into a storm of renders, voices and events.
+
+    In order, a request is:
+    - debounced: the same sound for the same guild within `debounce` seconds of
+      the last accepted request gets that request's answer back, and costs nothing.
+    - rate limited: per requester (`requester_rate`/`requester_burst`) and overall
+      (`global_rate`/`global_burst`), refused with a 429 and a retry delay.
+    - played according to its mode. "mix" plays right away over whatever is
+      playing. "queue" waits in the guild's queue (highest priority first, then
+      oldest) until nothing is playing there. "preempt" stops what is playing with
+      the same or lower priority and starts right away, or queues behind a
+      higher priority sound.
+
+    `resolve(guild_id, channel_id)` picks the guild a request plays in,
+    `start(entry)` plays it and returns its (voice_id, seconds), or (None, 0) if
+    the entry was ended while it connected or rendered, and
+    `stop(guild_id, voice_ids)` stops voices. The voice service reports voices that
+    end with `finished` (safe from any thread) and ones it stopped itself with
+    `stopped`. `on_queue_change(guild_id)` runs whenever a guild's queue changes.
+    """
+
+    def __init__(self, resolve: Callable[[Optional[int], Optional[int]], Awaitable[int]],
+                 start: Callable[[PlaybackEntry], Awaitable[Tuple[int, float]]],
+                 stop: Callable[[int, List[int]], None], on_queue_change: Callable[[int], None],
+                 debounce: float = 0.3, requester_rate: float = 2, requester_burst: int = 5,
+                 global_rate: float = 10, global_burst: int = 20, max_queue: int = 20):
+        self.resolve = resolve
+        self.start = start
+        self.stop = stop
+        self.on_queue_change = on_queue_change
+        self.debounce = debounce
+        self.max_queue = max_queue
+        self._requesters = TokenBucket(requester_rate, requester_burst)
+        self._global = TokenBucket(global_rate, global_burst)
+        self._recent: Dict[tuple, Tuple[float, dict]] = {}  # (sound_id, guild_id) -> (when, answer)
+        self._queues: Dict[int, list] = {}  # guild_id -> heap of (-priority, id, entry)
+        self._active: Dict[int, Dict[int, PlaybackEntry]] = {}  # guild_id -> entry id -> entry
+        self._by_voice: Dict[int, PlaybackEntry] = {}
+        self._loop = None
+        self._loop_thread = None
+        self.counts = {"started": 0, "queued": 0, "debounced": 0, "rate_limited": 0, "queue_full": 0}
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def submit(self, sound: dict, guild_id: Optional[int] = None, channel_id: Optional[int] = None,
+                     requester: str = "anonymous", mode: str = "mix", priority: int = 0,
+                     requested_at: Optional[float] = None) -> dict:
+        """Play, queue or drop a request, returning what happened. Raises PlaybackRejected."""
+        if mode not in MODES:
+            raise PlaybackRejected(400, f"Unknown playback mode {mode}")
+        now = time.monotonic()
+
+        key = (sound["id"], guild_id)
+        recent = self._recent.get(key)
+        if recent and now - recent[0] < self.debounce:
+            self.counts["debounced"] += 1
+            return {**recent[1], "debounced": True}
+
+        requester_wait = self._requesters.wait_time(requester, now)
+        wait = max(requester_wait, self._global.wait_time("", now))
+        if wait > 0:
+            self.counts["rate_limited"] += 1
+            who = "this client" if requester_wait > 0 else "everyone"
+            raise PlaybackRejected(429, f"Too many plays from {who}, slow down", retry_after=wait)
+        self._requesters.take(requester, now)
+        self._global.take("", now)
+
+        entry = PlaybackEntry(sound, guild_id, channel_id, mode, priority, requested_at)
+        # Repeats that arrive while this one is still starting get this answer
+        self._remember(key, now, {"message": f"Accepted sound {sound['id']}", "entry_id": entry.id})
+        try:
+            answer = await self._admit(entry)
+        except BaseException:
+            if self._recent.get(key, (None, {}))[1].get("entry_id") == entry.id:
+                del self._recent[key]
+            raise
+        self._remember(key, now, {k: v for k, v in answer.items() if k != "position"})
+        return answer
+
+    async def _admit(self, entry: PlaybackEntry) -> dict:
+        entry.guild_id = await self.resolve(entry.guild_id, entry.channel_id)
+        self._expire(entry.guild_id)
+        active = self._active.setdefault(entry.guild_id, {})
+        queue = self._queues.setdefault(entry.guild_id, [])
+        sound_id = entry.sound["id"]
+
+        start = entry.mode == "mix" or (entry.mode == "queue" and not active and not queue)
+        if entry.mode == "preempt" and not any(e.priority > entry.priority for e in active.values()):
+            victims = list(active.values())
+            # Hold the guild before stopping the others, so their ends don't start queued sounds
+            active[entry.id] = entry
+            entry.state = "starting"
+            self._end(victims, stop=True)
+        elif start:
+            active[entry.id] = entry
+            entry.state = "starting"
+
+        if entry.state == "starting":
+            voice_id = await self._start(entry)
+            if entry.state != "playing":
+                return {"message": f"Stopped sound {sound_id}", "entry_id": entry.id, "state": "stopped",
+                        "voice_id": voice_id}
+            return {"message": f"Playing sound {sound_id}", "entry_id": entry.id, "state": "playing",
+                    "voice_id": voice_id}
+
+        if len(queue) >= self.max_queue:
+            self.counts["queue_full"] += 1
+            raise PlaybackRejected(429, "The playback queue is full")
+        item = (-entry.priority, entry.id, entry)
+        heapq.heappush(queue, item)
+        self.counts["queued"] += 1
+        self.on_queue_change(entry.guild_id)
+        return {"message": f"Queued sound {sound_id}", "entry_id": entry.id, "state": "queued",
+                "position": sum(1 for other in queue if other[:2] < item[:2]) + 1}
+
+    def finished(self, entry: PlaybackEntry):
+        """A voice played to the end. Safe from any thread."""
+        if self._loop is not None and threading.get_ident() != self._loop_thread:
+            self._loop.call_soon_threadsafe(self._end, [entry])
+        else:
+            self._end([entry])
+
+    def stopped(self, voice_ids: Iterable[int]):
+        """Voices were stopped outside the scheduler (a stop request)."""
+        self._end([self._by_voice[v] for v in voice_ids if v in self._by_voice])
+
+    def clear(self, guild_id: Optional[int] = None) -> int:
+        """
+        Drop the queued requests of one guild, or every guild, and cancel the ones
+        still starting (connecting or rendering), so nothing asked for before a stop
+        plays after it. Returns how many were dropped.
+        """
+        guilds = [guild_id] if guild_id is not None else list(set(self._queues) | set(self._active))
+        dropped = 0
+        for gid in guilds:
+            queue = self._queues.get(gid)
+            if queue:
+                dropped += len(queue)
+                queue.clear()
+                self.on_queue_change(gid)
+            starting = [e for e in self._active.get(gid, {}).values() if e.state == "starting"]
+            if starting:
+                dropped += len(starting)
+                self._end(starting)
+        return dropped
+
+    def remove(self, entry_id: int) -> bool:
+        """Take a request out of its queue before it plays."""
+        for gid, queue in self._queues.items():
+            for item in queue:
+                if item[1] == entry_id:
+                    queue.remove(item)
+                    heapq.heapify(queue)
+                    self.on_queue_change(gid)
+                    return True
+        return False
+
+    def snapshot(self, guild_id: Optional[int] = None) -> List[dict]:
+        """What is playing and waiting, per guild, queued requests in the order they will play."""
+        guilds = [guild_id] if guild_id is not None else sorted(set(self._active) | set(self._queues))
+        result = []
+        for gid in guilds:
+            playing = [e.to_dict() for e in self._active.get(gid, {}).values()]
+            queued = [item[2].to_dict() for item in sorted(self._queues.get(gid, []))]
+            if playing or queued or guild_id is not None:
+                result.append({"guild_id": gid, "playing": playing, "queued": queued})
+        return result
+
+    def _remember(self, key: tuple, now: float, answer: dict):
+        self._recent[key] = (now, answer)
+        if len(self._recent) > 1024:
+            for stale in [k for k, (when, _) in self._recent.items() if now - when >= self.debounce]:
+                del self._recent[stale]
+
+    async def _start(self, entry: PlaybackEntry) -> Optional[int]:
+        try:
+            entry.voice_id, seconds = await self.start(entry)
+        except BaseException:
+            self._end([entry])
+            raise
+        if entry.state != "starting":
+            # Stopped or preempted while rendering, and started anyway
+            if entry.voice_id is not None:
+                self.stop(entry.guild_id, [entry.voice_id])
+            return entry.voice_id
+        entry.state = "playing"
+        entry.ends_at = time.monotonic() + seconds + END_SLACK
+        self._by_voice[entry.voice_id] = entry
+        self.counts["started"] += 1
+        return entry.voice_id
+
+    def _end(self, entries: List[PlaybackEntry], stop: bool = False):
+        guilds = set()
+        for entry in entries:
+            active = self._active.get(entry.guild_id, {})
+            if active.pop(entry.id, None) is None:
+                continue
+            if entry.voice_id is not None:
+                self._by_voice.pop(entry.voice_id, None)
+            entry.state = "ended"
+            guilds.add(entry.guild_id)
+        if stop:
+            by_guild: Dict[int, List[int]] = {}
+            for entry in entries:
+                if entry.voice_id is not None:
+                    by_guild.setdefault(entry.guild_id, []).append(entry.voice_id)
+            for gid, voice_ids in by_guild.items():
+                self.stop(gid, voice_ids)
+        for gid in guilds:
+            self._pump(gid)
+
+    def _expire(self, guild_id: int):
+        now = time.monotonic()
+        stale = [e for e in self._active.get(guild_id, {}).values() if e.ends_at is not None and e.ends_at < now]
+        if stale:
+            self._end(stale)
+
+    def _pump(self, guild_id: int):
+        """Start the guild's next queued request once nothing is playing there."""
+        queue = self._queues.get(guild_id)
+        if not queue or self._active.get(guild_id):
+            return
+        entry = heapq.heappop(queue)[2]
+        entry.state = "starting"
+        self._active.setdefault(guild_id, {})[entry.id] = entry
+        self.on_queue_change(guild_id)
+        asyncio.ensure_future(self._start_queued(entry))
+
+    async def _start_queued(self, entry: PlaybackEntry):
+        try:
+            await self._start(entry)
+        except Exception as e:
+            print(f"Could not play queued sound {entry.sound['id']}: {getattr(e, 'message', e)}")
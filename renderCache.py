@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+import pcmStore
+
+# Temp files older than this are left over from a crashed write, not one in progress
+TEMP_GRACE_SECONDS = 3600
+
+
+def _file_sig(path: str) -> Optional[list]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class RenderCache:
+    """
+    Two-tier cache for rendered sound output (trimmed, effects applied, encoded).
+    Entries live in an in-memory LRU bounded by a byte budget and are mirrored
+    to disk so renders survive restarts.
+
+    Entries are filed under the content id of the audio they were rendered from
+    (see contentStore.content_id) rather than a sound id, so sounds sharing a file
+    and settings share the render too.
+    """
+
+    def __init__(self, cache_dir: str, max_memory_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self._entries = OrderedDict()  # key -> (content id, bytes)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._memory_bytes
+
+    @staticmethod
+    def make_key(sound: dict, fmt: str = "mp3") -> str:
+        """
+        Build a cache key from everything that affects the rendered output.
+        The source file's size and mtime (and those of its canonical PCM, which
+        is rendered from when present) are included so a replaced file never
+        serves a stale render.
+        """
+        file_path = sound.get("file_path", "")
+        settings = {
+            "file": file_path,
+            "file_sig": _file_sig(file_path),
+            "pcm_sig": _file_sig(pcmStore.pcm_path(file_path)) if file_path else None,
+            "trim_start": sound.get("trim_start", 0),
+            "trim_end": sound.get("trim_end", sound.get("length", 0)),
+            "effects": sound.get("effects", {}),
+            "volume": sound.get("volume", 100),
+            "fmt": fmt,
+        }
+        blob = json.dumps(settings, sort_keys=True).encode("utf-8")
+        return hashlib.sha1(blob).hexdigest()
+
+    def _disk_path(self, content: str, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{content}_{key}")
+
+    def _remember(self, content: str, key: str, data: bytes):
+        """Insert into the memory tier, evicting least recently used entries. Caller holds the lock."""
+        if len(data) > self.max_memory_bytes:
+            return
+        if key in self._entries:
+            self._memory_bytes -= len(self._entries.pop(key)[1])
+        self._entries[key] = (content, data)
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def get(self, content: str, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry[1]
+
+        try:
+            with open(self._disk_path(content, key), "rb") as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(content, key, data)
+        return data
+
+    def load(self, content: str, key: str) -> bool:
+        """
+        Make sure an entry is in the memory tier, reading it from disk if needed.
+        For warming, so it isn't counted as a lookup. False if it isn't cached at all.
+        """
+        with self._lock:
+            if key in self._entries:
+                return True
+        try:
+            with open(self._disk_path(content, key), "rb") as f:
+                data = f.read()
+        except OSError:
+            return False
+        with self._lock:
+            self._remember(content, key, data)
+        return True
+
+    def put(self, content: str, key: str, data: bytes):
+        with self._lock:
+            self._remember(content, key, data)
+
+        # Write to a temp file first so readers never see a partial render
+        path = self._disk_path(content, key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error writing render cache {path}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def invalidate(self, content: str):
+        """Drop every cached render of some content from both tiers."""
+        self.retain((), content)
+
+    def retain(self, keys: Iterable[str], content: Optional[str] = None) -> int:
+        """
+        Drop cached renders whose key isn't in `keys`, only those of `content` if given.
+        Temp files of renders still being written are left alone. Returns the number of files removed.
+        """
+        keys = set(keys)
+        with self._lock:
+            stale = [k for k, (cid, _) in self._entries.items()
+                     if k not in keys and (content is None or cid == content)]
+            for key in stale:
+                self._memory_bytes -= len(self._entries.pop(key)[1])
+
+        prefix = f"{content}_" if content is not None else ""
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return 0
+        removed = 0
+        now = time.time()
+        for name in names:
+            if not name.startswith(prefix):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if name.endswith(".tmp"):
+                    if now - os.path.getmtime(path) < TEMP_GRACE_SECONDS:
+                        continue
+                elif name.rpartition("_")[2] in keys:
+                    continue
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                print(f"Error removing cached render {name}: {e}")
+        return removed
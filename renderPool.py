@@ -0,0 +1,172 @@
+import asyncio
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import metrics
+from audioHandler import ClipStream, open_clip_stream, render_mp3_stream, render_voice_pcm
+
+
+class RenderError(Exception):
+    """A sound whose audio could not be loaded."""
+
+
+def _open(sound: dict) -> ClipStream:
+    try:
+        return open_clip_stream(sound["file_path"], sound.get("trim_start", 0),
+                                sound.get("trim_end", sound.get("length", 0)))
+    except Exception as e:
+        print(f"Error loading audio: {e}")
+        raise RenderError("Error loading audio")
+
+
+def render_mp3(sound: dict) -> bytes:
+    """Trim a sound, apply its effects and encode it as 128k mono 48kHz mp3. Runs in a pool process."""
+    clip = _open(sound)
+    try:
+        return b"".join(render_mp3_stream(clip, sound.get("effects", {}), sound.get("volume", 100)))
+    except RuntimeError as e:
+        raise RenderError(f"Error loading audio: {e}")
+    finally:
+        clip.close()
+
+
+def render_pcm(sound: dict, frame_rate: int, channels: int) -> bytes:
+    """Trim a sound, apply its effects and convert it to raw 16-bit PCM. Runs in a pool process."""
+    clip = _open(sound)
+    try:
+        # Handed back as the bytearray it was built in, a bytes copy would double the peak
+        return render_voice_pcm(clip, sound.get("effects", {}), sound.get("volume", 100), frame_rate, channels)
+    except RuntimeError as e:
+        raise RenderError(f"Error loading audio: {e}")
+    finally:
+        clip.close()
+
+
+def _timed(fn: Callable[..., bytes], *args) -> Tuple[bytes, List[Tuple[str, float]]]:
+    """Run fn in a pool process and hand back the stage timings it recorded with its result."""
+    metrics.start_server_timing()
+    return fn(*args), metrics.collected_timings()
+
+
+class _Flight:
+    def __init__(self, pooled: bool):
+        self.pooled = pooled  # False for renders happening outside the pool
+        self.done: Optional[asyncio.Future] = None
+        self.job: Optional[Future] = None  # set once the render is handed to a process
+        self.waiters = 0
+
+
+class RenderPool:
+    """
+    Runs renders in worker processes, so decoding, effects and encoding use every
+    core instead of taking turns on the GIL.
+
+    Renders are single-flight by cache key: a request for a render that is already
+    in progress waits for that one instead of starting its own. Only as many renders
+    as there are processes are handed to the pool at a time and the rest queue here,
+    so when everyone waiting for a queued render has gone (e.g. the clients
+    disconnected) it is dropped. One already running finishes and is stored, as the
+    next request will want it. The pool processes start on first use.
+    Call from the event loop only, except the callback begin_stream returns.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(workers)
+        self._flights: Dict[str, _Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def busy(self, key: str) -> bool:
+        return key in self._flights
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    async def render(self, key: str, fn: Callable[..., bytes], *args,
+                     store: Optional[Callable[[bytes], None]] = None) -> bytes:
+        """
+        Return fn(*args), computed in the pool or shared with an identical render
+        already in progress. `store(result)` runs once per render, in a thread, before
+        anyone waiting gets the result.
+        """
+        while True:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = _Flight(pooled=True)
+                flight.done = asyncio.ensure_future(self._run(key, flight, fn, args, store))
+                # Failures nobody is left waiting for aren't worth a "never retrieved" warning
+                flight.done.add_done_callback(lambda done: done.cancelled() or done.exception())
+                self._flights[key] = flight
+                self.started += 1
+            else:
+                self.coalesced += 1
+            result = await self._wait(key, flight)
+            if result is not None:
+                return result
+            # The streamed render we were waiting for was abandoned, render it here
+
+    async def _run(self, key: str, flight: _Flight, fn: Callable[..., bytes], args: tuple,
+                   store: Optional[Callable[[bytes], None]]) -> bytes:
+        try:
+            async with self._slots:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                flight.job = self._executor.submit(_timed, fn, *args)
+                result, timings = await asyncio.wrap_future(flight.job)
+            # Stages measured in the worker only count once reported from this process
+            for name, elapsed in timings:
+                metrics.record(name, elapsed)
+            if store:
+                await asyncio.to_thread(store, result)
+            return result
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def _wait(self, key: str, flight: _Flight) -> Optional[bytes]:
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.done)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and flight.pooled and flight.job is None and not flight.done.done():
+                # Nobody wants it any more and it is still queued
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.done.cancel()
+                self.cancelled += 1
+
+    def begin_stream(self, key: str) -> Callable[[Optional[bytes]], None]:
+        """
+        Register a render running outside the pool (a streamed preview), so requests
+        for the same key wait for it. Returns the callback to finish it with: the
+        result, or None if it was abandoned and waiters should render it themselves.
+        The callback is safe from any thread.
+        """
+        loop = asyncio.get_running_loop()
+        flight = _Flight(pooled=False)
+        flight.done = loop.create_future()
+        self._flights[key] = flight
+
+        def resolve(result: Optional[bytes]):
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if not flight.done.done():
+                flight.done.set_result(result)
+
+        def finish(result: Optional[bytes]):
+            try:
+                loop.call_soon_threadsafe(resolve, result)
+            except RuntimeError:
+                pass  # loop closed, nobody is waiting
+
+        return finish
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List
+
+
+class RenderScheduler:
+    """
+    Speculative renders, so the first play after an edit is a cache hit.
+
+    `touch(id)` is called for every created or edited sound. Edits are debounced:
+    the sound is rendered `delay` seconds after its last change, with whatever
+    settings it has by then, and a newer edit drops a render of older settings that
+    is still waiting (or queued in the render pool). On start the `warm_count` most
+    played sounds are rendered or loaded into memory. Speculative renders run one at
+    a time, so plays and previews always find a free render process.
+
+    Plays are counted in memory and added to the store every `flush_interval` seconds.
+    touch, forget and played are safe from any thread.
+    """
+
+    def __init__(self, render: Callable[[str], Awaitable[None]], most_played: Callable[[int], List[str]],
+                 record_plays: Callable[[Dict[str, int]], None], delay: float = 1.0, warm_count: int = 20,
+                 flush_interval: float = 60):
+        self.render = render
+        self.most_played = most_played
+        self.record_plays = record_plays
+        self.delay = delay
+        self.warm_count = warm_count
+        self.flush_interval = flush_interval
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._slot = asyncio.Semaphore(1)
+        self._plays = Counter()
+        self._plays_lock = threading.Lock()
+        self._background = []
+        self._loop = None
+        self._loop_thread = None
+        self.rendered = 0
+        self.superseded = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._timers) + len(self._tasks)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._background = [asyncio.create_task(self._flush_loop())]
+        if self.warm_count > 0:
+            self._background.append(asyncio.create_task(self._warm()))
+
+    async def stop(self):
+        for timer in self._timers.values():
+            timer.cancel()
+        for task in list(self._tasks.values()) + self._background:
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        await asyncio.to_thread(self._flush)
+
+    def _call(self, fn, *args):
+        if self._loop is None:
+            return  # not started (e.g. a maintenance command)
+        if threading.get_ident() != self._loop_thread:
+            self._loop.call_soon_threadsafe(fn, *args)
+        else:
+            fn(*args)
+
+    def touch(self, sound_id: str):
+        """A sound was created or its settings changed."""
+        if self.delay >= 0:
+            self._call(self._schedule, sound_id)
+
+    def forget(self, sound_id: str):
+        """A sound was deleted."""
+        self._call(self._drop, sound_id)
+
+    def played(self, sound_id: str):
+        with self._plays_lock:
+            self._plays[sound_id] += 1
+
+    def _drop(self, sound_id: str) -> bool:
+        dropped = False
+        timer = self._timers.pop(sound_id, None)
+        if timer:
+            timer.cancel()
+            dropped = True
+        task = self._tasks.pop(sound_id, None)
+        if task:
+            # Still waiting for the render slot or a render process, or rendering
+            # settings that are already out of date
+            task.cancel()
+            dropped = True
+        return dropped
+
+    def _schedule(self, sound_id: str):
+        if self._drop(sound_id):
+            self.superseded += 1
+        self._timers[sound_id] = self._loop.call_later(self.delay, self._fire, sound_id)
+
+    def _fire(self, sound_id: str):
+        del self._timers[sound_id]
+        self._tasks[sound_id] = asyncio.create_task(self._run(sound_id))
+
+    async def _run(self, sound_id: str):
+        try:
+            async with self._slot:
+                await self.render(sound_id)
+            self.rendered += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Pre-render of {sound_id} failed: {e}")
+        finally:
+            if self._tasks.get(sound_id) is asyncio.current_task():
+                del self._tasks[sound_id]
+
+    async def _warm(self):
+        try:
+            sound_ids = await asyncio.to_thread(self.most_played, self.warm_count)
+        except Exception as e:
+            print(f"Could not read play counts: {e}")
+            return
+        for sound_id in sound_ids:
+            if sound_id in self._timers or sound_id in self._tasks:
+                continue  # edited since, the edit renders it
+            try:
+                async with self._slot:
+                    await self.render(sound_id)
+            except Exception as e:
+                print(f"Warming {sound_id} failed: {e}")
+        if sound_ids:
+            print(f"Warmed renders of {len(sound_ids)} most played sounds")
+
+    def _flush(self):
+        with self._plays_lock:
+            counts, self._plays = dict(self._plays), Counter()
+        if not counts:
+            return
+        try:
+            self.record_plays(counts)
+        except Exception as e:
+            print(f"Could not save play counts: {e}")
+            with self._plays_lock:
+                self._plays.update(counts)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.to_thread(self._flush)
@@ -0,0 +1,365 @@
+import os
+import json
+import bisect
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from models import Sound
+
+# Deleted ids are remembered for delta queries; older deletions need a full refetch
+TOMBSTONE_LIMIT = 10000
+
+
+class SoundStore:
+    """
+    The sound library, held in memory and indexed by id.
+    Reads never touch disk. Mutations are serialized behind a lock and each one is
+    committed as a single SQLite transaction (WAL, synchronous=FULL) before the
+    in-memory copy changes, so a crash never leaves a half-written library.
+
+    Every mutation bumps the library revision. Sounds remember the revision they
+    last changed in and deleted ids are kept as tombstones, so clients can ask for
+    just the changes since a revision they already have. `on_change(kind, data, previous)`
+    is called after each change is committed, with kind "created", "updated" or
+    "deleted" and, for updates, the sound as it was before. It runs after the
+    store lock is released, so it may read the store; events from concurrent
+    changes can arrive out of order, their revisions tell which is newer.
+
+    Sounds can share an audio file; the store counts the references to each file_path.
+
+    Several processes can share one database. Each mutation first loads whatever the
+    others committed (inside its write transaction, so revisions and positions stay
+    unique), and `catch_up()` does the same for readers when told something changed.
+    """
+
+    def __init__(self, db_path: str, legacy_json_path: Optional[str] = None,
+                 on_change: Optional[Callable[[str, dict, Optional[dict]], None]] = None):
+        self.db_path = db_path
+        self.on_change = on_change
+        self.revision = 0
+        self._lock = threading.RLock()
+        self._sounds: Dict[str, Sound] = {}
+        self._json: Dict[str, str] = {}  # serialized sounds, reused for list responses
+        self._positions: Dict[str, int] = {}
+        self._revisions: Dict[str, int] = {}
+        self._refs: Dict[str, Set[str]] = {}  # file_path -> ids of the sounds using it
+        self._tombstones: Dict[str, int] = {}  # deleted id -> revision
+        self._tombstone_floor = 0  # deletions up to this revision have been forgotten
+        self._ordered: Optional[Tuple[List[str], List[int]]] = None  # ids and positions, for paging
+        self._next_position = 0
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sounds ("
+            " id TEXT PRIMARY KEY,"
+            " position INTEGER NOT NULL,"
+            " data TEXT NOT NULL,"
+            " revision INTEGER NOT NULL DEFAULT 1)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(sounds)")]
+        if "revision" not in columns:
+            self._conn.execute("ALTER TABLE sounds ADD COLUMN revision INTEGER NOT NULL DEFAULT 1")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sounds_revision ON sounds (revision)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS tombstones (id TEXT PRIMARY KEY, revision INTEGER NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS plays (id TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+
+        if legacy_json_path:
+            self._migrate_json(legacy_json_path)
+        self._load()
+
+    def _load(self):
+        rows = self._conn.execute("SELECT id, position, data, revision FROM sounds ORDER BY position").fetchall()
+        for sound_id, position, data, revision in rows:
+            self._sounds[sound_id] = Sound(**json.loads(data))
+            self._ref(self._sounds[sound_id])
+            self._json[sound_id] = data
+            self._positions[sound_id] = position
+            self._revisions[sound_id] = revision
+            self._next_position = position + 1
+        self._tombstones = dict(self._conn.execute("SELECT id, revision FROM tombstones"))
+
+        meta = dict(self._conn.execute("SELECT key, value FROM meta WHERE key IN ('revision', 'tombstone_floor')"))
+        self._tombstone_floor = int(meta.get("tombstone_floor", 0))
+        self.revision = max(
+            [int(meta.get("revision", 0)), self._tombstone_floor]
+            + list(self._revisions.values()) + list(self._tombstones.values())
+        )
+
+    def _migrate_json(self, json_path: str):
+        """One-time import of the old sounds.json library."""
+        migrated = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated_json'").fetchone()
+        if migrated or not os.path.exists(json_path):
+            return
+
+        try:
+            with open(json_path, "r") as f:
+                content = f.read().strip()
+            data = json.loads(content) if content else []
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Could not migrate {json_path}: {e}")
+            return
+
+        with self._transaction() as cur:
+            for position, sound in enumerate(data):
+                sound = Sound(**sound)
+                cur.execute(
+                    "INSERT OR REPLACE INTO sounds (id, position, data) VALUES (?, ?, ?)",
+                    (sound.id, position, json.dumps(sound.dict())),
+                )
+            cur.execute("INSERT INTO meta (key, value) VALUES ('migrated_json', ?)", (json_path,))
+        print(f"Migrated {len(data)} sounds from {json_path} to {self.db_path}")
+
+    def _transaction(self, mode: str = "IMMEDIATE"):
+        return _Transaction(self._conn, mode)
+
+    def catch_up(self) -> bool:
+        """Load changes other processes committed since this copy's revision. Returns True if there were any."""
+        with self._lock:
+            with self._transaction("DEFERRED") as cur:
+                return self._apply_changes(cur)
+
+    def _apply_changes(self, cur: sqlite3.Cursor) -> bool:
+        row = cur.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        stored = int(row[0]) if row else 0
+        if stored <= self.revision:
+            return False
+
+        rows = cur.execute(
+            "SELECT id, position, data, revision FROM sounds WHERE revision > ? ORDER BY position", (self.revision,)
+        ).fetchall()
+        for sound_id, position, data, revision in rows:
+            if sound_id in self._sounds:
+                self._unref(self._sounds[sound_id])
+            self._sounds[sound_id] = Sound(**json.loads(data))
+            self._ref(self._sounds[sound_id])
+            self._json[sound_id] = data
+            self._positions[sound_id] = position
+            self._revisions[sound_id] = revision
+            self._tombstones.pop(sound_id, None)
+            self._next_position = max(self._next_position, position + 1)
+
+        for sound_id, revision in cur.execute("SELECT id, revision FROM tombstones WHERE revision > ?", (self.revision,)):
+            self._tombstones[sound_id] = revision
+            sound = self._sounds.pop(sound_id, None)
+            if sound:
+                self._unref(sound)
+            self._json.pop(sound_id, None)
+            self._positions.pop(sound_id, None)
+            self._revisions.pop(sound_id, None)
+
+        row = cur.execute("SELECT value FROM meta WHERE key = 'tombstone_floor'").fetchone()
+        floor = int(row[0]) if row else 0
+        if floor > self._tombstone_floor:
+            self._tombstones = {i: r for i, r in self._tombstones.items() if r > floor}
+            self._tombstone_floor = floor
+        self.revision = stored
+        self._ordered = None
+        return True
+
+    def _ref(self, sound: Sound):
+        if sound.file_path:
+            self._refs.setdefault(os.path.normpath(sound.file_path), set()).add(sound.id)
+
+    def _unref(self, sound: Sound):
+        if not sound.file_path:
+            return
+        path = os.path.normpath(sound.file_path)
+        users = self._refs.get(path)
+        if users is not None:
+            users.discard(sound.id)
+            if not users:
+                del self._refs[path]
+
+    def _notify(self, kind: str, data: dict, previous: Optional[dict] = None):
+        if self.on_change:
+            self.on_change(kind, data, previous)
+
+    # Reads
+
+    def all(self) -> List[Sound]:
+        with self._lock:
+            return list(self._sounds.values())
+
+    def all_json(self) -> Tuple[int, str]:
+        """The revision and the whole library as a JSON array, without re-validating every sound."""
+        with self._lock:
+            return self.revision, "[" + ",".join(self._json.values()) + "]"
+
+    def page(self, after: Optional[int], limit: int) -> Tuple[int, List[Sound], Optional[int]]:
+        """
+        Up to `limit` sounds in library order, starting after the position cursor `after`.
+        Returns (revision, sounds, cursor for the next page or None at the end).
+        """
+        with self._lock:
+            if self._ordered is None:
+                ids = list(self._sounds)
+                self._ordered = (ids, [self._positions[i] for i in ids])
+            ids, positions = self._ordered
+            start = 0 if after is None else bisect.bisect_right(positions, after)
+            end = start + limit
+            sounds = [self._sounds[i] for i in ids[start:end]]
+            return self.revision, sounds, positions[end - 1] if end < len(ids) else None
+
+    def changes_since(self, revision: int) -> Optional[Tuple[int, List[Sound], List[str]]]:
+        """
+        Sounds created or updated after `revision` and ids deleted after it, as
+        (current revision, sounds, deleted ids). None if deletions that old have
+        been forgotten and the client has to refetch everything.
+        """
+        with self._lock:
+            if revision < self._tombstone_floor:
+                return None
+            sounds = [self._sounds[i] for i, r in self._revisions.items() if r > revision]
+            deleted = [i for i, r in self._tombstones.items() if r > revision]
+            return self.revision, sounds, deleted
+
+    def references(self, file_path: str) -> int:
+        """Number of sounds using an audio file."""
+        with self._lock:
+            return len(self._refs.get(os.path.normpath(file_path), ()))
+
+    def referencing(self, file_path: str) -> List[Sound]:
+        with self._lock:
+            return [self._sounds[i] for i in self._refs.get(os.path.normpath(file_path), ())]
+
+    def referenced_paths(self) -> List[str]:
+        with self._lock:
+            return list(self._refs)
+
+    def most_played(self, limit: int) -> List[str]:
+        """Ids of the `limit` most played sounds still in the library, most played first."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id FROM plays ORDER BY count DESC LIMIT ?", (limit,)).fetchall()
+            return [sound_id for (sound_id,) in rows if sound_id in self._sounds]
+
+    def get(self, sound_id: str) -> Optional[Sound]:
+        return self._sounds.get(sound_id)
+
+    def __len__(self) -> int:
+        return len(self._sounds)
+
+    # Mutations
+
+    def record_plays(self, counts: Dict[str, int]):
+        """Add to the play counts of some sounds. Not a library change, so no revision."""
+        with self._lock:
+            with self._transaction() as cur:
+                cur.executemany(
+                    "INSERT INTO plays (id, count) VALUES (?, ?)"
+                    " ON CONFLICT (id) DO UPDATE SET count = count + excluded.count",
+                    list(counts.items()),
+                )
+
+    def add(self, sound: Sound):
+        self.add_many([sound])
+
+    def add_many(self, sounds: List[Sound]):
+        """Add several sounds in one transaction (and one revision), all or nothing."""
+        if not sounds:
+            return
+        with self._lock:
+            serialized = [json.dumps(s.dict()) for s in sounds]
+            with self._transaction() as cur:
+                self._apply_changes(cur)
+                revision = self.revision + 1
+                positions = range(self._next_position, self._next_position + len(sounds))
+                cur.executemany(
+                    "INSERT INTO sounds (id, position, data, revision) VALUES (?, ?, ?, ?)",
+                    [(s.id, p, data, revision) for s, p, data in zip(sounds, positions, serialized)],
+                )
+                cur.executemany("DELETE FROM tombstones WHERE id = ?", [(s.id,) for s in sounds])
+                _set_revision(cur, revision)
+            self.revision = revision
+            for sound, position, data in zip(sounds, positions, serialized):
+                self._sounds[sound.id] = sound
+                self._ref(sound)
+                self._json[sound.id] = data
+                self._positions[sound.id] = position
+                self._revisions[sound.id] = revision
+                self._tombstones.pop(sound.id, None)
+            self._next_position += len(sounds)
+            self._ordered = None
+        for sound in sounds:
+            self._notify("created", {"id": sound.id, "revision": revision, "sound": sound.dict()})
+
+    def update(self, sound: Sound) -> bool:
+        """Replace an existing sound. Returns False if there is no sound with that id."""
+        with self._lock:
+            data = json.dumps(sound.dict())
+            with self._transaction() as cur:
+                self._apply_changes(cur)
+                if sound.id not in self._sounds:
+                    return False
+                revision = self.revision + 1
+                cur.execute("UPDATE sounds SET data = ?, revision = ? WHERE id = ?", (data, revision, sound.id))
+                _set_revision(cur, revision)
+            self.revision = revision
+            previous = self._sounds[sound.id]
+            self._unref(previous)
+            self._sounds[sound.id] = sound
+            self._ref(sound)
+            self._json[sound.id] = data
+            self._revisions[sound.id] = revision
+        self._notify("updated", {"id": sound.id, "revision": revision, "sound": sound.dict()}, previous.dict())
+        return True
+
+    def delete(self, sound_id: str) -> Optional[Sound]:
+        """Remove a sound, returning it (or None if it didn't exist)."""
+        with self._lock:
+            with self._transaction() as cur:
+                self._apply_changes(cur)
+                if sound_id not in self._sounds:
+                    return None
+                revision = self.revision + 1
+                # Forget the oldest deletions once there are too many to keep
+                expired = sorted(self._tombstones.values())[:max(len(self._tombstones) + 1 - TOMBSTONE_LIMIT, 0)]
+                floor = expired[-1] if expired else self._tombstone_floor
+                cur.execute("DELETE FROM sounds WHERE id = ?", (sound_id,))
+                cur.execute("DELETE FROM plays WHERE id = ?", (sound_id,))
+                cur.execute("INSERT OR REPLACE INTO tombstones (id, revision) VALUES (?, ?)", (sound_id, revision))
+                if expired:
+                    cur.execute("DELETE FROM tombstones WHERE revision <= ?", (floor,))
+                    cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('tombstone_floor', ?)", (str(floor),))
+                _set_revision(cur, revision)
+            self.revision = revision
+            if expired:
+                self._tombstones = {i: r for i, r in self._tombstones.items() if r > floor}
+                self._tombstone_floor = floor
+            self._tombstones[sound_id] = revision
+            self._positions.pop(sound_id, None)
+            self._revisions.pop(sound_id, None)
+            self._json.pop(sound_id, None)
+            self._ordered = None
+            sound = self._sounds.pop(sound_id)
+            self._unref(sound)
+        self._notify("deleted", {"id": sound_id, "revision": revision})
+        return sound
+
+
+def _set_revision(cur: sqlite3.Cursor, revision: int):
+    cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('revision', ?)", (str(revision),))
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT (or DEFERRED, for reads), rolled back if the block raises."""
+
+    def __init__(self, conn: sqlite3.Connection, mode: str = "IMMEDIATE"):
+        self._conn = conn
+        self._mode = mode
+
+    def __enter__(self) -> sqlite3.Cursor:
+        self._cur = self._conn.cursor()
+        self._cur.execute(f"BEGIN {self._mode}")
+        return self._cur
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._cur.execute("COMMIT")
+        else:
+            self._cur.execute("ROLLBACK")
+        self._cur.close()
+        return False
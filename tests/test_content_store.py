@@ -0,0 +1,25 @@
+import os
+
+from contentStore import ContentStore
+
+
+def test_collect_counts_only_files_it_removed(tmp_path, monkeypatch):
+    sounds, peaks = tmp_path / "sounds", tmp_path / "peaks"
+    sounds.mkdir()
+    peaks.mkdir()
+    for path in (sounds / "temp_upload.mp3", sounds / "old.tmp", peaks / "gone.peaks"):
+        path.write_bytes(b"x")
+    blobs = ContentStore(str(sounds), str(peaks), references=lambda file_path: 0, grace_seconds=-1)
+
+    remove = os.remove
+
+    def flaky_remove(path):
+        if path.endswith(".tmp"):
+            raise PermissionError("read-only")
+        remove(path)
+
+    monkeypatch.setattr(os, "remove", flaky_remove)
+    removed = blobs.collect(lambda: [])
+
+    assert removed == {"blobs": 0, "derived": 1, "temp": 1}
+    assert (sounds / "old.tmp").exists()
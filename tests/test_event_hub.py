@@ -0,0 +1,29 @@
+import asyncio
+
+from eventHub import EventHub
+
+
+def frames_for(hub: EventHub, last_event_id):
+    async def read():
+        client = hub.subscribe(last_event_id)
+        return await client.next_frames(timeout=0)
+    return asyncio.run(read())
+
+
+def test_resume_replays_missed_events():
+    hub = EventHub()
+    hub.publish({"n": 1})
+    first = hub.last_event_id
+    hub.publish({"n": 2})
+
+    frames = frames_for(hub, str(first))
+    assert len(frames) == 1 and '"n": 2' in frames[0]
+
+
+def test_reconnect_with_future_id_resyncs():
+    hub = EventHub()
+    hub.publish({"n": 1})
+
+    frames = frames_for(hub, str(hub.last_event_id + 1000))
+    assert len(frames) == 1 and "event: resync" in frames[0]
+
@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+import peaks
+
+
+def test_truncated_peaks_file_is_rejected(tmp_path):
+    path = str(tmp_path / "tone.peaks")
+    samples = (np.sin(np.arange(48000) / 10) * 8000).astype(np.int16)
+    peaks.write_peaks(path, samples, 48000)
+    whole = open(path, "rb").read()
+    assert peaks.read_slice(path, 0)
+
+    for size in (len(whole) - 1, 20, 3):
+        with open(path, "wb") as f:
+            f.write(whole[:size])
+        with pytest.raises(ValueError):
+            peaks.read_slice(path, 0)
@@ -0,0 +1,149 @@
+import asyncio
+import itertools
+
+import pytest
+
+from playbackScheduler import PlaybackRejected, PlaybackScheduler
+
+
+class Voices:
+    """Stands in for the voice service: records what was mixed and stopped."""
+
+    def __init__(self, render_gate: asyncio.Event = None, check_state: bool = True):
+        self.render_gate = render_gate
+        self.check_state = check_state
+        self.mixed = []  # entries, in the order they started
+        self.stopped = []
+        self._ids = itertools.count(1)
+
+    async def resolve(self, guild_id, channel_id):
+        return guild_id or 1
+
+    async def start(self, entry):
+        if self.render_gate is not None:
+            await self.render_gate.wait()
+        if self.check_state and entry.state != "starting":
+            return None, 0.0
+        self.mixed.append(entry)
+        return next(self._ids), 1.0
+
+    def stop(self, guild_id, voice_ids):
+        self.stopped.extend(voice_ids)
+
+
+def scheduler(voices: Voices, **limits) -> PlaybackScheduler:
+    settings = {"debounce": 0, "requester_rate": 0, "global_rate": 0}
+    settings.update(limits)
+    return PlaybackScheduler(voices.resolve, voices.start, voices.stop, lambda guild_id: None, **settings)
+
+
+def sound(sound_id: str) -> dict:
+    return {"id": sound_id}
+
+
+def test_stop_while_rendering_never_plays():
+    async def run():
+        gate = asyncio.Event()
+        voices = Voices(gate)
+        playback = scheduler(voices)
+        play = asyncio.ensure_future(playback.submit(sound("a"), 1))
+        await asyncio.sleep(0)  # now rendering
+        assert playback.clear(1) == 1
+        gate.set()
+        return voices, playback, await play
+
+    voices, playback, answer = asyncio.run(run())
+    assert voices.mixed == []
+    assert answer["state"] == "stopped"
+    assert playback.snapshot(1)[0]["playing"] == []
+    assert playback.counts["started"] == 0
+
+
+def test_stop_while_rendering_stops_a_voice_started_anyway():
+    async def run():
+        gate = asyncio.Event()
+        voices = Voices(gate, check_state=False)
+        playback = scheduler(voices)
+        play = asyncio.ensure_future(playback.submit(sound("a"), 1))
+        await asyncio.sleep(0)
+        playback.clear()
+        gate.set()
+        return voices, await play
+
+    voices, answer = asyncio.run(run())
+    assert voices.stopped == [answer["voice_id"]]
+
+
+def test_rate_limits_refuse_with_retry_after():
+    async def run():
+        playback = scheduler(Voices(), requester_rate=1, requester_burst=2)
+        await playback.submit(sound("a"), requester="alice")
+        await playback.submit(sound("b"), requester="alice")
+        with pytest.raises(PlaybackRejected) as refused:
+            await playback.submit(sound("c"), requester="alice")
+        await playback.submit(sound("c"), requester="bob")
+        return playback, refused.value
+
+    playback, refused = asyncio.run(run())
+    assert refused.status == 429 and refused.retry_after > 0
+    assert playback.counts["rate_limited"] == 1
+
+
+def test_global_rate_limit_covers_every_requester():
+    async def run():
+        playback = scheduler(Voices(), global_rate=1, global_burst=1)
+        await playback.submit(sound("a"), requester="alice")
+        with pytest.raises(PlaybackRejected) as refused:
+            await playback.submit(sound("b"), requester="bob")
+        return refused.value
+
+    assert asyncio.run(run()).message == "Too many plays from everyone, slow down"
+
+
+def test_repeats_within_the_debounce_get_the_first_answer():
+    async def run():
+        voices = Voices()
+        playback = scheduler(voices, debounce=60)
+        first = await playback.submit(sound("a"), 1)
+        repeat = await playback.submit(sound("a"), 1)
+        other = await playback.submit(sound("a"), 2)
+        return voices, first, repeat, other
+
+    voices, first, repeat, other = asyncio.run(run())
+    assert repeat["debounced"] and repeat["entry_id"] == first["entry_id"]
+    assert not other.get("debounced")
+    assert len(voices.mixed) == 2
+
+
+def test_queue_plays_by_priority_then_arrival():
+    async def run():
+        voices = Voices()
+        playback = scheduler(voices)
+        await playback.submit(sound("playing"), 1, mode="queue")
+        await playback.submit(sound("low"), 1, mode="queue")
+        await playback.submit(sound("high"), 1, mode="queue", priority=5)
+        await playback.submit(sound("low2"), 1, mode="queue")
+        order = [e["sound_id"] for e in playback.snapshot(1)[0]["queued"]]
+        for _ in range(3):
+            playback.finished(voices.mixed[-1])
+            await asyncio.sleep(0)
+        return order, [e.sound["id"] for e in voices.mixed]
+
+    order, played = asyncio.run(run())
+    assert order == ["high", "low", "low2"]
+    assert played == ["playing", "high", "low", "low2"]
+
+
+def test_preempt_stops_lower_priority_and_queues_behind_higher():
+    async def run():
+        voices = Voices()
+        playback = scheduler(voices)
+        low = await playback.submit(sound("low"), 1)
+        preempt = await playback.submit(sound("preempt"), 1, mode="preempt", priority=1)
+        blocked = await playback.submit(sound("blocked"), 1, mode="preempt")
+        return voices, low, preempt, blocked
+
+    voices, low, preempt, blocked = asyncio.run(run())
+    assert voices.stopped == [low["voice_id"]]
+    assert preempt["state"] == "playing"
+    assert blocked["state"] == "queued"
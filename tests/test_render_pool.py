@@ -0,0 +1,61 @@
+import shutil
+import asyncio
+
+import numpy as np
+import pytest
+
+import metrics
+import pcmStore
+import renderPool
+from renderPool import RenderPool
+
+
+def scraped_count(metric: str, **labels) -> int:
+    """A histogram's observation count, as /metrics reports it."""
+    selector = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    prefix = f"{metric}_count{{{selector}}} "
+    for line in metrics.render().splitlines():
+        if line.startswith(prefix):
+            return int(line[len(prefix):])
+    return 0
+
+
+@pytest.fixture
+def sound(tmp_path):
+    """A one second tone stored as canonical PCM only, so rendering it to PCM needs no ffmpeg."""
+    file_path = str(tmp_path / "tone.mp3")
+    tone = (np.sin(np.arange(48000) * 2 * np.pi * 440 / 48000) * 8000).astype(np.int16)
+    pcmStore.write_pcm(pcmStore.pcm_path(file_path), tone, 48000)
+    return {"file_path": file_path, "trim_start": 0, "trim_end": 1000, "effects": {}, "volume": 100}
+
+
+def test_pool_renders_report_worker_stages(sound):
+    async def render():
+        metrics.start_server_timing()
+        pool = RenderPool(1)
+        try:
+            data = await pool.render("tone", renderPool.render_pcm, sound, 48000, 2)
+        finally:
+            pool.shutdown()
+        return data, metrics.collected_timings()
+
+    before = scraped_count("openhowl_render_stage_seconds", stage="map_pcm")
+    data, timings = asyncio.run(render())
+
+    assert len(data) == 48000 * 2 * 2
+    assert scraped_count("openhowl_render_stage_seconds", stage="map_pcm") == before + 1
+    assert "map_pcm" in [name for name, _ in timings]
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+def test_pool_renders_report_ffmpeg_spawns(sound):
+    async def render():
+        pool = RenderPool(1)
+        try:
+            return await pool.render("tone.mp3", renderPool.render_mp3, sound)
+        finally:
+            pool.shutdown()
+
+    before = scraped_count("openhowl_subprocess_spawn_seconds", command="ffmpeg")
+    assert asyncio.run(render())
+    assert scraped_count("openhowl_subprocess_spawn_seconds", command="ffmpeg") == before + 1
@@ -0,0 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from models import Sound
+from soundStore import SoundStore
+
+
+def test_change_callbacks_run_outside_the_store_lock(tmp_path):
+    readers = ThreadPoolExecutor(1)
+    seen = []
+
+    def on_change(kind, data, previous):
+        # Another thread reading the store would wait forever if the lock were still held
+        seen.append((kind, readers.submit(lambda: len(store.all())).result(timeout=5)))
+
+    store = SoundStore(str(tmp_path / "sounds.db"), on_change=on_change)
+    store.add(Sound(id="a", name="a"))
+    store.update(Sound(id="a", name="b"))
+    store.delete("a")
+    readers.shutdown()
+
+    assert seen == [("created", 1), ("updated", 1), ("deleted", 0)]
@@ -0,0 +1,156 @@
+import os
+import asyncio
+from typing import Callable, Dict, List, Optional
+
+from fastapi import HTTPException, Request
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:  # older python-multipart releases
+    import multipart
+    from multipart.multipart import parse_options_header
+
+
+class ReceivedFile:
+    def __init__(self, field: str, filename: str, path: str):
+        self.field = field
+        self.filename = filename
+        self.path = path
+        self.size = 0
+
+
+class ReceivedForm:
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self.files: List[ReceivedFile] = []
+
+    def cleanup(self):
+        """Remove every temp file written for this form."""
+        for received in self.files:
+            if os.path.exists(received.path):
+                os.remove(received.path)
+
+
+async def receive_form(
+    request: Request,
+    dest_dir: str,
+    prefix: str,
+    max_file_bytes: int,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> ReceivedForm:
+    """
+    Stream a multipart/form-data body straight to temp files in `dest_dir`.
+    Only one network chunk is held in memory at a time, and the upload is
+    aborted with 413 as soon as any file passes `max_file_bytes`.
+    `on_progress` gets the fraction of the body received, when the size is known.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected multipart/form-data")
+
+    total = int(request.headers.get("content-length", 0) or 0)
+    form = ReceivedForm()
+
+    # Parser callbacks only record events; file writes happen off the event loop below
+    events = []
+    header = {"field": b"", "value": b""}
+    part = {}
+
+    def on_part_begin():
+        part.clear()
+        part["headers"] = {}
+
+    def on_header_field(data, start, end):
+        header["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][header["field"].lower()] = header["value"]
+        header["field"] = b""
+        header["value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        events.append(("begin", options))
+
+    def on_part_data(data, start, end):
+        events.append(("data", bytes(data[start:end])))
+
+    def on_part_end():
+        events.append(("end", None))
+
+    parser = multipart.MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    current_file = None
+    current_handle = None
+    current_field = None
+    field_value = b""
+    received = 0
+
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            parser.write(chunk)
+
+            for kind, payload in events:
+                if kind == "begin":
+                    name = payload.get(b"name", b"").decode("utf-8", "replace")
+                    filename = payload.get(b"filename")
+                    if filename is not None:
+                        filename = os.path.basename(filename.decode("utf-8", "replace"))
+                        _, ext = os.path.splitext(filename)
+                        path = os.path.join(dest_dir, f"{prefix}_{len(form.files)}{ext}")
+                        current_file = ReceivedFile(name, filename, path)
+                        form.files.append(current_file)
+                        current_handle = await asyncio.to_thread(open, path, "wb")
+                    else:
+                        current_field = name
+                        field_value = b""
+                elif kind == "data":
+                    if current_file is not None:
+                        current_file.size += len(payload)
+                        if current_file.size > max_file_bytes:
+                            raise HTTPException(status_code=413, detail="File too large")
+                        await asyncio.to_thread(current_handle.write, payload)
+                    else:
+                        field_value += payload
+                        if len(field_value) > 64 * 1024:
+                            raise HTTPException(status_code=413, detail="Form field too large")
+                elif kind == "end":
+                    if current_file is not None:
+                        await asyncio.to_thread(current_handle.close)
+                        current_file = None
+                        current_handle = None
+                    elif current_field is not None:
+                        form.fields[current_field] = field_value.decode("utf-8", "replace")
+                        current_field = None
+            events.clear()
+
+            if on_progress and total:
+                on_progress(min(received / total, 1.0))
+
+        parser.finalize()
+    except ValueError as e:
+        # python-multipart parse errors subclass ValueError
+        if current_handle is not None:
+            current_handle.close()
+        form.cleanup()
+        raise HTTPException(status_code=400, detail=f"Malformed upload: {e}")
+    except BaseException:
+        if current_handle is not None:
+            current_handle.close()
+        form.cleanup()
+        raise
+
+    return form
@@ -0,0 +1,112 @@
+import time
+import itertools
+import threading
+from typing import Callable, Optional
+
+import numpy as np
+import discord
+
+# discord.py expects 20ms frames of 16-bit stereo PCM at 48kHz
+SAMPLE_RATE = discord.opus.Encoder.SAMPLING_RATE
+CHANNELS = discord.opus.Encoder.CHANNELS
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+FRAME_SAMPLES = FRAME_SIZE // 2  # interleaved int16 samples per frame
+
+# Voice ids are unique across every guild's mixer
+_voice_ids = itertools.count(1)
+
+
+class _Voice:
+    def __init__(self, pcm: bytes, sound_id: Optional[str], after: Optional[Callable], requested_at: Optional[float]):
+        self.samples = np.frombuffer(pcm, dtype=np.int16)
+        self.pos = 0
+        self.sound_id = sound_id
+        self.after = after
+        self.requested_at = requested_at
+
+
+class MixerSource(discord.AudioSource):
+    """
+    Persistent per-guild source that sums any number of active voices frame by frame.
+    Voices are mixed in 32-bit and clipped back to 16-bit, so overlapping sounds
+    never wrap around. Returns no data once the last voice ends so discord.py
+    stops sending silence; the caller restarts it when a new voice arrives.
+    """
+
+    def __init__(self, on_first_frame: Optional[Callable[[float], None]] = None):
+        self._voices = {}  # voice_id -> _Voice
+        self._lock = threading.Lock()
+        self.on_first_frame = on_first_frame
+
+    def add(self, pcm: bytes, sound_id: Optional[str] = None, after: Optional[Callable] = None,
+            requested_at: Optional[float] = None) -> int:
+        """
+        Start mixing in a new voice. `after` is called from the voice thread
+        when the voice plays to the end (not when it is stopped).
+        `requested_at` (a time.perf_counter() value) is used to report the delay
+        until the voice's first frame through `on_first_frame`.
+        """
+        voice_id = next(_voice_ids)
+        with self._lock:
+            self._voices[voice_id] = _Voice(pcm, sound_id, after, requested_at)
+        return voice_id
+
+    def has_voices(self) -> bool:
+        with self._lock:
+            return bool(self._voices)
+
+    def active_voices(self) -> dict:
+        """Map of voice_id -> sound_id for voices still playing."""
+        with self._lock:
+            return {vid: v.sound_id for vid, v in self._voices.items()}
+
+    def stop_voice(self, voice_id: int) -> Optional[str]:
+        """Stop a single voice, returning its sound id (or None if it wasn't playing)."""
+        with self._lock:
+            voice = self._voices.pop(voice_id, None)
+        return voice.sound_id if voice else None
+
+    def stop_all(self) -> dict:
+        """Stop every voice, returning the voice_id -> sound_id map of what was playing."""
+        with self._lock:
+            stopped = {vid: v.sound_id for vid, v in self._voices.items()}
+            self._voices.clear()
+        return stopped
+
+    def read(self) -> bytes:
+        finished = []
+        started = []
+        with self._lock:
+            if not self._voices:
+                return b""
+
+            mix = np.zeros(FRAME_SAMPLES, dtype=np.int32)
+            for voice_id, voice in self._voices.items():
+                if voice.pos == 0 and voice.requested_at is not None:
+                    started.append(voice.requested_at)
+                frame = voice.samples[voice.pos:voice.pos + FRAME_SAMPLES]
+                mix[:len(frame)] += frame
+                voice.pos += FRAME_SAMPLES
+                if voice.pos >= len(voice.samples):
+                    finished.append(voice_id)
+
+            finished = [self._voices.pop(voice_id) for voice_id in finished]
+
+        if self.on_first_frame:
+            now = time.perf_counter()
+            for requested_at in started:
+                self.on_first_frame(now - requested_at)
+
+        # Run end-of-voice callbacks outside the lock, they may add new voices
+        for voice in finished:
+            if voice.after:
+                try:
+                    voice.after()
+                except Exception as e:
+                    print(f"Error in voice callback for {voice.sound_id}: {e}")
+
+        np.clip(mix, -32768, 32767, out=mix)
+        return mix.astype(np.int16).tobytes()
+
+    def is_opus(self) -> bool:
+        return False
@@ -0,0 +1,170 @@
+import time
+import asyncio
+from typing import Callable, Dict, Optional, Tuple
+
+import discord
+
+
+class VoicePool:
+    """
+    Keeps one warm voice connection per guild.
+    Connections are opened ahead of time (on startup and when people join voice),
+    re-established with exponential backoff if they drop, and closed after sitting
+    idle for `idle_timeout` seconds.
+    """
+
+    def __init__(self, bot, idle_timeout: float = 900, max_backoff: float = 60,
+                 is_busy: Callable[[int], bool] = lambda guild_id: False):
+        self.bot = bot
+        self.idle_timeout = idle_timeout
+        self.max_backoff = max_backoff
+        self.is_busy = is_busy
+        self.clients: Dict[int, discord.VoiceClient] = {}
+        self._wanted: Dict[int, int] = {}  # guild id -> channel id we should be in
+        self._last_used: Dict[int, float] = {}
+        self._backoff: Dict[int, Tuple[float, float]] = {}  # guild id -> (delay, retry at)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._watchdog = None
+
+    def start(self):
+        self._watchdog = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._watchdog:
+            self._watchdog.cancel()
+        for guild_id in list(self.clients):
+            await self.disconnect(guild_id)
+
+    def touch(self, guild_id: int):
+        self._last_used[guild_id] = time.monotonic()
+
+    @staticmethod
+    def _busiest_channel(guild: discord.Guild) -> Optional[discord.VoiceChannel]:
+        """The voice channel with the most non-bot members, if anyone is in voice."""
+        best, best_count = None, 0
+        for channel in guild.voice_channels:
+            count = sum(1 for m in channel.members if not m.bot)
+            if count > best_count:
+                best, best_count = channel, count
+        return best
+
+    def _resolve_channel(self, guild_id: int, channel_id: Optional[int]) -> discord.VoiceChannel:
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            raise LookupError(f"Bot is not in guild {guild_id}")
+        if channel_id is not None:
+            channel = guild.get_channel(channel_id)
+            if not isinstance(channel, discord.VoiceChannel):
+                raise LookupError(f"No voice channel {channel_id} in guild {guild_id}")
+            return channel
+        if guild_id in self._wanted:
+            channel = guild.get_channel(self._wanted[guild_id])
+            if isinstance(channel, discord.VoiceChannel):
+                return channel
+        channel = self._busiest_channel(guild)
+        if channel is None:
+            raise LookupError("No voice channel to join")
+        return channel
+
+    async def connect(self, guild_id: int, channel_id: Optional[int] = None, attempts: int = 3) -> discord.VoiceClient:
+        """Return a connected voice client for the guild, joining or moving as needed."""
+        lock = self._locks.setdefault(guild_id, asyncio.Lock())
+        async with lock:
+            channel = None
+            voice_client = self.clients.get(guild_id)
+            if voice_client is None:
+                # Pick up a connection discord.py already has (e.g. made before a restart of the pool)
+                guild = self.bot.get_guild(guild_id)
+                voice_client = guild.voice_client if guild else None
+            if voice_client and voice_client.is_connected():
+                if channel_id is not None and voice_client.channel.id != channel_id:
+                    channel = self._resolve_channel(guild_id, channel_id)
+                    await voice_client.move_to(channel)
+                self._wanted[guild_id] = voice_client.channel.id
+                self.touch(guild_id)
+                return voice_client
+
+            channel = self._resolve_channel(guild_id, channel_id)
+            delay = 1
+            for attempt in range(attempts):
+                try:
+                    if voice_client:
+                        # Drop the stale client before dialling again
+                        await voice_client.disconnect(force=True)
+                    voice_client = await channel.connect(reconnect=True)
+                    break
+                except (discord.ClientException, asyncio.TimeoutError, discord.errors.ConnectionClosed) as e:
+                    voice_client = None
+                    if attempt == attempts - 1:
+                        raise ConnectionError(f"Could not connect to {channel.name}: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.max_backoff)
+
+            self.clients[guild_id] = voice_client
+            self._wanted[guild_id] = channel.id
+            self._backoff.pop(guild_id, None)
+            self.touch(guild_id)
+            return voice_client
+
+    async def get(self, guild_id: Optional[int] = None, channel_id: Optional[int] = None) -> Tuple[int, discord.VoiceClient]:
+        """
+        Pick the connection to play on. With an explicit guild (and optional channel)
+        target that guild; otherwise reuse any live connection, or join the busiest
+        channel of the first guild that has people in voice.
+        """
+        if guild_id is not None:
+            return guild_id, await self.connect(guild_id, channel_id)
+
+        for gid, voice_client in self.clients.items():
+            if voice_client.is_connected():
+                self.touch(gid)
+                return gid, voice_client
+
+        for guild in self.bot.guilds:
+            if self._busiest_channel(guild):
+                return guild.id, await self.connect(guild.id)
+        raise LookupError("No voice channel to join")
+
+    async def disconnect(self, guild_id: int):
+        self._wanted.pop(guild_id, None)
+        self._backoff.pop(guild_id, None)
+        voice_client = self.clients.pop(guild_id, None)
+        if voice_client and voice_client.is_connected():
+            await voice_client.disconnect()
+
+    async def prewarm(self, guild: Optional[discord.Guild] = None):
+        """Connect ahead of the first click to every guild (or one guild) with people in voice."""
+        for g in ([guild] if guild else self.bot.guilds):
+            if g.id in self.clients and self.clients[g.id].is_connected():
+                continue
+            if self._busiest_channel(g) is None:
+                continue
+            try:
+                await self.connect(g.id)
+            except (LookupError, ConnectionError) as e:
+                print(f"Could not pre-warm voice in {g.name}: {e}")
+
+    async def _watch(self):
+        """Reconnect dropped connections with backoff and close idle ones."""
+        while True:
+            await asyncio.sleep(5)
+            now = time.monotonic()
+            for guild_id, channel_id in list(self._wanted.items()):
+                idle_for = now - self._last_used.get(guild_id, now)
+                if idle_for > self.idle_timeout and not self.is_busy(guild_id):
+                    print(f"Closing idle voice connection in guild {guild_id}")
+                    await self.disconnect(guild_id)
+                    continue
+
+                voice_client = self.clients.get(guild_id)
+                if voice_client and voice_client.is_connected():
+                    continue
+                delay, retry_at = self._backoff.get(guild_id, (1, now))
+                if now < retry_at:
+                    continue
+                try:
+                    await self.connect(guild_id, channel_id, attempts=1)
+                    print(f"Reconnected voice in guild {guild_id}")
+                except (LookupError, ConnectionError) as e:
+                    self._backoff[guild_id] = (min(delay * 2, self.max_backoff), now + delay)
+                    print(f"Voice reconnect in guild {guild_id} failed, retrying in {delay}s: {e}")